@@ -0,0 +1,211 @@
+import numpy
+
+from indicators import ema_series
+from market_data import candle_columns
+
+# Причины выхода из позиции
+EXIT_STOP = 'stop'
+EXIT_REVERSAL = 'reversal'
+EXIT_END = 'end'
+
+TRADE_DTYPE = numpy.dtype([
+    ('side', 'U4'),
+    ('entry_index', numpy.int64),
+    ('exit_index', numpy.int64),
+    ('entry_time', numpy.int64),
+    ('exit_time', numpy.int64),
+    ('entry_price', float),
+    ('exit_price', float),
+    ('reason', 'U8'),
+    ('pnl', float),
+])
+
+
+def run_lengths(mask: numpy.ndarray) -> numpy.ndarray:
+    """
+    Возвращает для каждого элемента количество подряд идущих истинных значений, заканчивающихся на нем
+
+    :param mask: булев массив
+
+    :return: :class:`numpy.ndarray`
+    """
+    indexes = numpy.arange(mask.shape[0])
+    last_false = numpy.maximum.accumulate(numpy.where(mask, -1, indexes))
+    return indexes - last_false
+
+
+def cross_signals(short_values: numpy.ndarray, long_values: numpy.ndarray, confirmation: int):
+    """
+    Рассчитывает маски сигналов на покупку и продажу по логике :meth:`EmaCrossOver.check_signal`.
+
+    Сигнал на покупку возникает, когда короткая скользящая пересекает длинную снизу после ``confirmation``
+    значений подряд ниже нее (:meth:`EmaCrossOver.is_down`), на продажу - наоборот.
+
+    :param short_values: ряд значений короткой скользящей
+    :param long_values: ряд значений длинной скользящей
+    :param confirmation: количество значений, подтверждающих направление до пересечения
+
+    :return: :class:`tuple` (маска покупок, маска продаж)
+    """
+    down_run = run_lengths(short_values < long_values)
+    up_run = run_lengths(short_values > long_values)
+    buy = numpy.zeros(short_values.shape[0], dtype=bool)
+    sell = numpy.zeros(short_values.shape[0], dtype=bool)
+    buy[1:] = (down_run[:-1] >= confirmation) & (short_values[1:] > long_values[1:])
+    sell[1:] = (up_run[:-1] >= confirmation) & (short_values[1:] < long_values[1:])
+    return buy, sell
+
+
+def trailing_stop_exit(highs: numpy.ndarray, lows: numpy.ndarray, entry_price: float, direction: int,
+                       callback: float):
+    """
+    Ищет первую свечу, на которой срабатывает скользящий стоп (аналог `callbackRate` стопа
+    :meth:`EmaCrossOverState.enter_position`)
+
+    .. Note:: Экстремум отслеживается по максимумам (минимумам) свечей включительно с текущей, стоп исполняется
+    по расчетной цене стопа.
+
+    :param highs: максимумы свечей после входа
+    :param lows: минимумы свечей после входа
+    :param entry_price: цена входа
+    :param direction: 1 для длинной позиции, -1 для короткой
+    :param callback: отступ стопа в долях
+
+    :return: :class:`tuple` (индекс свечи в переданном срезе или None, цена исполнения)
+    """
+    if direction > 0:
+        stops = numpy.maximum.accumulate(numpy.maximum(highs, entry_price)) * (1 - callback)
+        hits = lows <= stops
+    else:
+        stops = numpy.minimum.accumulate(numpy.minimum(lows, entry_price)) * (1 + callback)
+        hits = highs >= stops
+    if not hits.any():
+        return None, None
+    index = int(hits.argmax())
+    return index, float(stops[index])
+
+
+def _next_event(events: numpy.ndarray, start: int):
+    # Первое событие с индексом не меньше start
+    position = numpy.searchsorted(events, start)
+    return int(events[position]) if position < events.shape[0] else None
+
+
+def run_backtest(klines, short_ema: int, long_ema: int, quantity: float, confirmation: int = 120,
+                 trailing_delta: float = 0.1, commission: float = 0.0, signals=None) -> dict:
+    """
+    Прогоняет стратегию :class:`EmaCrossOver` по истории свечей.
+
+    .. Note:: Каждая свеча считается одним значением реального времени: скользящие берутся по цене закрытия, поэтому
+    окно подтверждения ``confirmation`` измеряется в свечах. Сигналы и экстремумы стопов считаются векторно по всей
+    истории, цикл выполняется только по сделкам. Разворот исполняется по цене закрытия свечи сигнала
+    (закрытие старой позиции и открытие новой, как двойной объем в :meth:`EmaCrossOverState.enter_position`).
+
+    :param klines: свечи в формате :meth:`Binance.get_candles`, массив :func:`klines_to_array` или колонки кэша
+    :param short_ema: период короткой скользящей
+    :param long_ema: период длинной скользящей
+    :param quantity: объем позиции
+    :param confirmation: количество значений, подтверждающих направление до пересечения
+    :param trailing_delta: отступ скользящего стопа в процентах
+    :param commission: комиссия в долях от объема сделки на каждую сторону
+    :param signals: заранее рассчитанные маски сигналов (покупки, продажи)
+
+    :return: :class:`dict` со сделками `(trades)`, кривой капитала `(equity)` и статистикой `(stats)`
+    """
+    candles = candle_columns(klines)
+    closes = candles['close']
+    highs = candles['high']
+    lows = candles['low']
+    times = candles['open_time'].astype(numpy.int64)
+    length = closes.shape[0]
+    if signals is None:
+        short_values, long_values = ema_series(closes, [short_ema, long_ema])
+        signals = cross_signals(short_values, long_values, confirmation)
+    buys, sells = (numpy.flatnonzero(mask) for mask in signals)
+    callback = trailing_delta / 100
+
+    trades = []
+    side = None
+    start = 0
+    while True:
+        # Поиск сигнала на вход с учетом текущей позиции
+        if side is None:
+            next_buy, next_sell = _next_event(buys, start), _next_event(sells, start)
+            if next_buy is None and next_sell is None:
+                break
+            if next_sell is None or (next_buy is not None and next_buy < next_sell):
+                side, entry = 'BUY', next_buy
+            else:
+                side, entry = 'SELL', next_sell
+        direction = 1 if side == 'BUY' else -1
+        entry_price = closes[entry]
+        # Позиция живет до противоположного сигнала (разворот) или срабатывания стопа
+        opposite = _next_event(sells if direction > 0 else buys, entry + 1)
+        end = opposite if opposite is not None else length - 1
+        stop_index, stop_price = trailing_stop_exit(highs[entry + 1:end + 1], lows[entry + 1:end + 1],
+                                                    entry_price, direction, callback)
+        if stop_index is not None:
+            exit_index, exit_price, reason = entry + 1 + stop_index, stop_price, EXIT_STOP
+        elif opposite is not None:
+            exit_index, exit_price, reason = opposite, closes[opposite], EXIT_REVERSAL
+        else:
+            exit_index, exit_price, reason = end, closes[end], EXIT_END
+        pnl = direction * (exit_price - entry_price) * quantity - (entry_price + exit_price) * quantity * commission
+        trades.append((side, entry, exit_index, times[entry], times[exit_index],
+                       entry_price, exit_price, reason, pnl))
+        if reason == EXIT_REVERSAL:
+            side, entry = ('SELL' if direction > 0 else 'BUY'), exit_index
+        else:
+            # Стоп срабатывает внутри свечи, поэтому сигнал на ее закрытии уже учитывается
+            side, start = None, exit_index
+            if reason == EXIT_END:
+                break
+
+    trades = numpy.array(trades, dtype=TRADE_DTYPE)
+    equity = equity_curve(trades, closes, quantity)
+    return {'trades': trades, 'equity': equity, 'stats': summary_stats(trades, equity)}
+
+
+def equity_curve(trades: numpy.ndarray, closes: numpy.ndarray, quantity: float) -> numpy.ndarray:
+    """
+    Строит кривую капитала: зафиксированный результат плюс переоценка открытой позиции по цене закрытия
+
+    :param trades: сделки :data:`TRADE_DTYPE`
+    :param closes: цены закрытия
+    :param quantity: объем позиции
+
+    :return: :class:`numpy.ndarray`
+    """
+    realized = numpy.zeros(closes.shape[0])
+    numpy.add.at(realized, trades['exit_index'], trades['pnl'])
+    equity = numpy.cumsum(realized)
+    for trade in trades:
+        span = slice(trade['entry_index'], trade['exit_index'])
+        direction = 1 if trade['side'] == 'BUY' else -1
+        equity[span] += direction * (closes[span] - trade['entry_price']) * quantity
+    return equity
+
+
+def summary_stats(trades: numpy.ndarray, equity: numpy.ndarray) -> dict:
+    """
+    Рассчитывает итоговую статистику прогона
+
+    :param trades: сделки :data:`TRADE_DTYPE`
+    :param equity: кривая капитала
+
+    :return: :class:`dict`
+    """
+    pnl = trades['pnl']
+    profit = pnl[pnl > 0].sum()
+    loss = -pnl[pnl < 0].sum()
+    drawdown = numpy.maximum.accumulate(equity) - equity if equity.shape[0] else numpy.zeros(1)
+    return {
+        'trades': int(pnl.shape[0]),
+        'total_pnl': float(pnl.sum()),
+        'average_pnl': float(pnl.mean()) if pnl.shape[0] else 0.0,
+        'win_rate': float((pnl > 0).mean()) if pnl.shape[0] else 0.0,
+        'profit_factor': float(profit / loss) if loss else float('inf') if profit else 0.0,
+        'max_drawdown': float(drawdown.max()),
+        'stops': int((trades['reason'] == EXIT_STOP).sum()),
+        'reversals': int((trades['reason'] == EXIT_REVERSAL).sum()),
+    }
@@ -0,0 +1,170 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import itertools
+import logging
+from multiprocessing import shared_memory
+import os
+
+import numpy
+
+from indicators import ema_series
+from market_data import CLOSE, klines_to_array
+from .engine import cross_signals, run_backtest
+
+logger = logging.getLogger('app.backtest.sweep')
+
+# Массив свечей процесса-исполнителя, подключенный к общей памяти
+_worker_memory = None
+_worker_candles = None
+
+
+def parameter_grid(short_emas, long_emas, confirmations, trailing_deltas) -> list[dict]:
+    """
+    Формирует полный перебор параметров, отбрасывая комбинации, где короткая скользящая не короче длинной
+
+    :return: :class:`list`
+    """
+    return [{'short_ema': short_ema, 'long_ema': long_ema, 'confirmation': confirmation,
+             'trailing_delta': trailing_delta}
+            for short_ema, long_ema, confirmation, trailing_delta
+            in itertools.product(short_emas, long_emas, confirmations, trailing_deltas)
+            if short_ema < long_ema]
+
+
+def random_parameters(count: int, short_emas: tuple, long_emas: tuple, confirmations: tuple,
+                      trailing_deltas: tuple, seed: int = None) -> list[dict]:
+    """
+    Формирует случайную выборку параметров из диапазонов `(минимум, максимум)`.
+    Периоды и окно подтверждения - целые числа включительно, отступ стопа - равномерно распределенное число.
+    Если диапазон пуст или в нем нет короткого периода меньше длинного, вызывается :class:`ValueError`
+
+    :return: :class:`list`
+    """
+    for name, (minimum, maximum) in (('short_emas', short_emas), ('long_emas', long_emas),
+                                     ('confirmations', confirmations), ('trailing_deltas', trailing_deltas)):
+        if minimum > maximum:
+            raise ValueError(f"{name}: минимум {minimum} больше максимума {maximum}")
+    if short_emas[0] >= long_emas[1]:
+        raise ValueError(f"Нет периодов короткой скользящей {short_emas} меньше длинной {long_emas}")
+    generator = numpy.random.default_rng(seed)
+    parameters = []
+    # Короткий период выбирается только из тех, для которых есть более длинный
+    short_maximum = min(short_emas[1], long_emas[1] - 1)
+    while len(parameters) < count:
+        short_ema = int(generator.integers(short_emas[0], short_maximum + 1))
+        long_ema = int(generator.integers(max(long_emas[0], short_ema + 1), long_emas[1] + 1))
+        parameters.append({'short_ema': short_ema,
+                           'long_ema': long_ema,
+                           'confirmation': int(generator.integers(confirmations[0], confirmations[1] + 1)),
+                           'trailing_delta': round(float(generator.uniform(*trailing_deltas)), 4)})
+    return parameters
+
+
+def _init_worker(name: str, shape: tuple, dtype: str):
+    # Подключение к общей памяти без копирования массива свечей в процесс
+    global _worker_memory, _worker_candles
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    _worker_candles = numpy.ndarray(shape, dtype=dtype, buffer=_worker_memory.buf)
+
+
+def _run_group(short_ema: int, long_ema: int, variants: list[dict], quantity: float, commission: float) -> list[dict]:
+    # Скользящие считаются один раз на пару периодов, затем перебираются окна подтверждения и стопы
+    short_values, long_values = ema_series(_worker_candles[:, CLOSE], [short_ema, long_ema])
+    signals = {}
+    results = []
+    for variant in variants:
+        confirmation = variant['confirmation']
+        if confirmation not in signals:
+            signals[confirmation] = cross_signals(short_values, long_values, confirmation)
+        report = run_backtest(_worker_candles, short_ema=short_ema, long_ema=long_ema, quantity=quantity,
+                              confirmation=confirmation, trailing_delta=variant['trailing_delta'],
+                              commission=commission, signals=signals[confirmation])
+        results.append({**variant, **report['stats']})
+    return results
+
+
+def format_table(results: list[dict], limit: int = 20) -> str:
+    """
+    Возвращает текстовую таблицу лучших результатов
+
+    :param results: отсортированные результаты
+    :param limit: количество строк
+
+    :return: :class:`str`
+    """
+    columns = ('short_ema', 'long_ema', 'confirmation', 'trailing_delta', 'trades', 'total_pnl', 'win_rate',
+               'profit_factor', 'max_drawdown')
+    lines = ['\t'.join(columns)]
+    for result in results[:limit]:
+        lines.append('\t'.join(f"{result[column]:.4g}" if isinstance(result[column], float) else str(result[column])
+                               for column in columns))
+    return '\n'.join(lines)
+
+
+class ParameterSweep:
+    """
+    Параллельный перебор параметров стратегии на истории свечей
+    """
+    def __init__(self, klines, quantity: float, commission: float = 0.0, workers: int = None,
+                 rank_by: str = 'total_pnl', tasks_per_worker: int = 4):
+        """
+        Создает объект класса :class:`ParameterSweep`
+
+        .. Note:: Массив свечей один раз копируется в общую память (:mod:`multiprocessing.shared_memory`),
+        процессы-исполнители читают его без сериализации. Задачи группируются по паре периодов скользящих, большие
+        группы делятся на части так, чтобы на процесс приходилось около ``tasks_per_worker`` задач: скользящие
+        пересчитываются в каждой части, но процессы не простаивают, когда пар периодов меньше, чем процессов.
+
+        :param klines: свечи в формате :meth:`Binance.get_candles`, числовой массив или отображенный в память файл
+        :param quantity: объем позиции
+        :param commission: комиссия в долях от объема сделки
+        :param workers: количество процессов, по умолчанию по числу ядер
+        :param rank_by: показатель статистики для ранжирования (по убыванию)
+        :param tasks_per_worker: примерное количество задач на процесс
+        """
+        self.candles = klines_to_array(klines)
+        self.quantity = quantity
+        self.commission = commission
+        self.workers = workers or os.cpu_count()
+        self.rank_by = rank_by
+        self.tasks_per_worker = tasks_per_worker
+        self.results: list[dict] = []
+
+    def run(self, parameters: list[dict], on_result=None) -> list[dict]:
+        """
+        Запускает перебор и возвращает результаты, отсортированные по :attr:`rank_by`. Результаты предыдущего
+        запуска сбрасываются
+
+        :param parameters: комбинации параметров (:func:`parameter_grid`, :func:`random_parameters`)
+        :param on_result: функция, вызываемая с текущей таблицей после завершения каждой задачи
+
+        :return: :class:`list`
+        """
+        self.results = []
+        groups: dict[tuple, list[dict]] = {}
+        for variant in parameters:
+            groups.setdefault((variant['short_ema'], variant['long_ema']), []).append(variant)
+        # Группы делятся на части, чтобы задач было больше, чем процессов, даже при нескольких парах периодов
+        size = max(1, -(-len(parameters) // (self.workers * self.tasks_per_worker)))
+        tasks = []
+        for (short_ema, long_ema), variants in groups.items():
+            variants.sort(key=lambda variant: variant['confirmation'])
+            tasks.extend((short_ema, long_ema, variants[start:start + size])
+                         for start in range(0, len(variants), size))
+        candles = numpy.ascontiguousarray(self.candles)
+        memory = shared_memory.SharedMemory(create=True, size=max(candles.nbytes, 1))
+        try:
+            numpy.ndarray(candles.shape, dtype=candles.dtype, buffer=memory.buf)[:] = candles
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=(memory.name, candles.shape, candles.dtype.str)) as executor:
+                futures = [executor.submit(_run_group, short_ema, long_ema, variants, self.quantity, self.commission)
+                           for short_ema, long_ema, variants in tasks]
+                for future in as_completed(futures):
+                    self.results.extend(future.result())
+                    self.results.sort(key=lambda result: result[self.rank_by], reverse=True)
+                    logger.info(f"Проверено комбинаций: {len(self.results)} из {len(parameters)}")
+                    if on_result:
+                        on_result(self.results)
+        finally:
+            memory.close()
+            memory.unlink()
+        return self.results
@@ -0,0 +1 @@
+from .stubs import *
@@ -0,0 +1,94 @@
+import argparse
+import json
+import sys
+
+from events import WARMUP_SUFFIX, StreamIngest, read_frames, replay, stream_name
+from monitoring import metrics
+from .run import make_state
+from .stubs import InlinePipeline, StubBinance, start_loop
+
+# Параметры стратегии по умолчанию для потоков без записанного стартового архива
+DEFAULT_PARAMETERS = {'accuracy': 150, 'short_ema': 6, 'long_ema': 12, 'confirmation': 120, 'quantity': 0.005}
+
+
+def scan_streams(path: str) -> tuple[dict[str, float], str, dict[str, dict]]:
+    """
+    Находит потоки свечей журнала с первой ценой закрытия, ключ потока пользовательских данных и записанные
+    стартовые архивы свечей (:meth:`FrameRecorder.append_warmup`)
+
+    :param path: файл журнала
+
+    :return: :class:`tuple` (первая цена закрытия по потоку свечей, ключ потока пользовательских данных, стартовый
+        архив по потоку свечей: ``klines`` и ``parameters``)
+    """
+    streams = {}
+    warmups = {}
+    listen_key = None
+    for _, frame in read_frames(path):
+        message = json.loads(frame)
+        name = message.get('stream')
+        if not name:
+            continue
+        if name.endswith(WARMUP_SUFFIX):
+            warmups[name[:-len(WARMUP_SUFFIX)]] = message['data']
+        elif '@kline_' in name:
+            if name not in streams:
+                streams[name] = float(message['data']['k']['c'])
+        elif listen_key is None:
+            listen_key = name
+    return streams, listen_key, warmups
+
+
+def market_frames(path: str):
+    # Кадры журнала без кадров стартовых архивов
+    for received, frame in read_frames(path):
+        if not stream_name(frame).endswith(WARMUP_SUFFIX):
+            yield received, frame
+
+
+def main(arguments: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Воспроизведение журнала кадров через обработку сообщений стратегии')
+    parser.add_argument('path', help='файл журнала FrameRecorder')
+    parser.add_argument('--speed', type=float, default=0, help='множитель скорости, 0 - без пауз')
+    # Параметры стратегии по умолчанию берутся из записанного стартового архива потока
+    parser.add_argument('--accuracy', type=int, default=None)
+    parser.add_argument('--short-ema', type=int, default=None)
+    parser.add_argument('--long-ema', type=int, default=None)
+    parser.add_argument('--confirmation', type=int, default=None)
+    parser.add_argument('--quantity', type=float, default=None)
+    arguments = parser.parse_args(arguments)
+
+    streams, listen_key, warmups = scan_streams(arguments.path)
+    # Стратегии инициализируются записанным стартовым архивом, а для потоков без него - случайным архивом заглушки,
+    # который заканчивается первой записанной ценой, чтобы скользящие были близки к реальным
+    client = StubBinance(base_prices={name.split('@')[0].upper(): price for name, price in streams.items()},
+                         klines={(name.split('@kline_')[0].upper(), name.split('@kline_')[1]): warmup['klines']
+                                 for name, warmup in warmups.items()})
+    overrides = {name: value for name in DEFAULT_PARAMETERS
+                 if (value := getattr(arguments, name)) is not None}
+    loop = start_loop()
+    states = {}
+    for name in streams:
+        ticker, interval = name.split('@kline_')
+        recorded = warmups.get(name, {}).get('parameters', {})
+        parameters = {key: recorded.get(key, value) for key, value in DEFAULT_PARAMETERS.items()}
+        states[name] = make_state(ticker.upper(), client, loop, interval=interval, **{**parameters, **overrides})
+
+    def route_order_update(order: dict):
+        for state in states.values():
+            if state.ticker == order['s']:
+                state.handle_order_update(order=order)
+
+    ingest = StreamIngest(pipeline=InlinePipeline(), listen_key=listen_key,
+                          on_order_update=route_order_update,
+                          kline_handlers={name: [state.handle_kline] for name, state in states.items()})
+    result = replay(market_frames(arguments.path), ingest.on_frame, speed=arguments.speed)
+    print(json.dumps({'replay': result, 'ingest': ingest.stats(), 'latency': metrics.summary(),
+                      'seeded': sorted(name for name in states if name in warmups),
+                      'positions': {state.ticker: dict(state.position) for state in states.values()}},
+                     indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
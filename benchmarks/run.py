@@ -0,0 +1,239 @@
+import argparse
+from itertools import cycle
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy
+
+from events import StreamIngest
+from indicators import BatchCrossSignals, StreamingEma, ema, ema_series
+from market_data import klines_from_json, klines_to_array, synthetic_klines
+from strategies import BatchSignals, EmaCrossOverState
+from .stubs import InlinePipeline, StubAsyncBinance, StubBinance, start_loop
+
+# Каталог результатов по умолчанию
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def measure(function, calls: int, batches: int) -> dict[str, float]:
+    """
+    Измеряет задержку одного вызова и пропускную способность.
+    Время измеряется пачками по ``calls`` вызовов, чтобы накладные расходы таймера не искажали короткие вызовы
+
+    :param function: функция без аргументов
+    :param calls: количество вызовов в пачке
+    :param batches: количество пачек
+
+    :return: :class:`dict`
+    """
+    for _ in range(calls):
+        function()
+    durations = numpy.empty(batches)
+    for batch in range(batches):
+        start = time.perf_counter_ns()
+        for _ in range(calls):
+            function()
+        durations[batch] = (time.perf_counter_ns() - start) / calls / 1000
+    return {'calls': calls * batches,
+            'p50_us': float(numpy.percentile(durations, 50)),
+            'p99_us': float(numpy.percentile(durations, 99)),
+            'mean_us': float(durations.mean()),
+            'throughput_per_s': float(1e6 / durations.mean())}
+
+
+def kline_frames(ticker: str, interval: str, length: int, closed_every: int = 60, seed: int = 1) -> list[str]:
+    """
+    Формирует кадры объединенного потока свечей: цена меняется каждый тик, каждый ``closed_every`` тик закрывает свечу
+    """
+    generator = numpy.random.default_rng(seed)
+    closes = numpy.cumsum(generator.normal(0, 0.2, length)) + 3000
+    stream = f"{ticker.lower()}@kline_{interval}"
+    event_time = int(time.time() * 1000)
+    frames = []
+    for index, close in enumerate(closes):
+        kline = {'t': event_time, 'T': event_time + 59999, 's': ticker, 'i': interval, 'o': f"{close - 1:.2f}",
+                 'c': f"{close:.2f}", 'h': f"{close + 1:.2f}", 'l': f"{close - 2:.2f}", 'v': '12.5', 'n': 100,
+                 'x': index % closed_every == closed_every - 1, 'q': '37500.0'}
+        frames.append(json.dumps({'stream': stream, 'data': {'e': 'kline', 'E': event_time, 's': ticker, 'k': kline}},
+                                 separators=(',', ':')))
+    return frames
+
+
+def order_update_frames(listen_key: str, ticker: str, length: int) -> list[str]:
+    """
+    Формирует кадры `ORDER_TRADE_UPDATE` потока пользовательских данных
+    """
+    event_time = int(time.time() * 1000)
+    return [json.dumps({'stream': listen_key,
+                        'data': {'e': 'ORDER_TRADE_UPDATE', 'E': event_time, 'T': event_time,
+                                 'o': {'s': ticker, 'c': f"client-{index}", 'S': 'BUY', 'o': 'MARKET', 'q': '0.005',
+                                       'p': '0', 'ap': '3000.1', 'x': 'TRADE', 'X': 'NEW' if index % 2 else 'FILLED',
+                                       'i': 10_000 + index, 'ot': 'MARKET'}}},
+                       separators=(',', ':'))
+            for index in range(length)]
+
+
+def make_state(ticker: str, client: StubBinance, loop, interval: str = '1m', accuracy: int = 150,
+               short_ema: int = 6, long_ema: int = 12, quantity: float = 0.005,
+               confirmation: int = 120) -> EmaCrossOverState:
+    # Состояние стратегии с клиентами-заглушками и обработкой событий в вызывающем потоке
+    return EmaCrossOverState(ticker=ticker, interval=interval, accuracy=accuracy, short_ema=short_ema,
+                             long_ema=long_ema, quantity=quantity, client=client,
+                             async_client=StubAsyncBinance(client), loop=loop, pipeline=InlinePipeline(),
+                             confirmation=confirmation)
+
+
+def run_benchmarks(quick: bool = False) -> dict[str, dict]:
+    """
+    Выполняет все замеры
+
+    :param quick: уменьшенное количество вызовов
+
+    :return: :class:`dict` название замера - результаты :func:`measure`
+    """
+    scale = 10 if quick else 1
+    results = {}
+    closes = numpy.array([float(kline[4]) for kline in synthetic_klines(100_000)])
+
+    # Индикаторы
+    for window in (50, 150, 1000):
+        prices = closes[:window]
+        results[f"ema_full_window_{window}"] = measure(lambda: ema(prices, 12), calls=100, batches=200 // scale)
+    streaming = StreamingEma(period=12)
+    streaming.seed(closes[:150])
+    results['streaming_ema_preview'] = measure(lambda: streaming.preview(3000.5), calls=10_000,
+                                               batches=200 // scale)
+    results['ema_series_100k_period_12'] = measure(lambda: ema_series(closes, 12), calls=1, batches=50 // scale)
+    periods = numpy.arange(2, 201)
+    history = closes[:10_000]
+    results['ema_series_10k_periods_2_200'] = measure(lambda: ema_series(history, periods), calls=1,
+                                                      batches=20 // scale)
+
+    # Разбор ответа klines (1000 свечей): через JSON и сразу в массив
+    body = json.dumps(synthetic_klines(1000), separators=(',', ':')).encode('utf-8')
+    results['klines_decode_json_1000'] = measure(lambda: klines_to_array(json.loads(body)), calls=1,
+                                                 batches=200 // scale)
+    results['klines_decode_array_1000'] = measure(lambda: klines_from_json(body), calls=1, batches=200 // scale)
+
+    # Обработка сообщений потока
+    client = StubBinance()
+    loop = start_loop()
+    state = make_state('ETHUSDT', client, loop)
+    pipeline = InlinePipeline()
+    ingest = StreamIngest(pipeline=pipeline, listen_key='stub-listen-key', on_order_update=state.handle_order_update,
+                          kline_handlers={state.candles_stream: [state.handle_kline]})
+    frames = cycle(kline_frames('ETHUSDT', '1m', 10_000))
+    results['on_message_kline'] = measure(lambda: ingest.on_frame(next(frames)), calls=1000, batches=100 // scale)
+    orders = cycle(order_update_frames('stub-listen-key', 'ETHUSDT', 1000))
+    results['on_message_order_update'] = measure(lambda: ingest.on_frame(next(orders)), calls=1000,
+                                                 batches=100 // scale)
+    closed = {'t': 0, 'o': '3000.0', 'h': '3001.0', 'l': '2999.0', 'c': '3000.5', 'v': '10.0', 'x': True}
+    results['candle_close_update'] = measure(lambda: state.edit_data_arrays(data=closed), calls=1000,
+                                             batches=100 // scale)
+
+    # Проверка сигналов по многим торговым парам
+    for symbols in (10, 100):
+        states = [make_state(f"SYM{index}USDT", client, loop) for index in range(symbols)]
+        prices = cycle(closes[-1000:])
+
+        def evaluate():
+            price = next(prices)
+            for symbol_state in states:
+                symbol_state.check_signal(close_price=price)
+
+        results[f"signal_eval_{symbols}_symbols"] = measure(evaluate, calls=100, batches=100 // scale)
+
+    # Пакетная проверка сигналов и закрытие свечей по многим торговым парам
+    for symbols in (10, 100, 500):
+        batch = BatchCrossSignals(short_periods=numpy.full(symbols, 6), long_periods=numpy.full(symbols, 12),
+                                  confirmation=120)
+        for row in range(symbols):
+            batch.seed(row, closes[row:row + 150])
+        ticks = cycle(closes[-1000:, None] + numpy.zeros(symbols))
+        results[f"batch_signal_eval_{symbols}_symbols"] = measure(lambda: batch.evaluate(next(ticks)), calls=100,
+                                                                  batches=100 // scale)
+        results[f"batch_close_{symbols}_symbols"] = measure(lambda: batch.close(next(ticks)), calls=100,
+                                                            batches=100 // scale)
+
+    # Закрытие свечи интервала по всем торговым парам подключения: каждое состояние отдельно и одним пакетом
+    # (:class:`BatchSignals`, как в :class:`MultiSymbolRunner`)
+    for symbols in (10, 100, 500):
+        tickers = [f"SYM{index}USDT" for index in range(symbols)]
+        bars = [{**closed, 's': ticker} for ticker in tickers]
+        states = [make_state(ticker, client, loop) for ticker in tickers]
+
+        def close_states():
+            for symbol_state, bar in zip(states, bars):
+                symbol_state.handle_kline(bar)
+
+        results[f"runner_close_{symbols}_symbols"] = measure(close_states, calls=10, batches=50 // scale)
+        signals = BatchSignals(states=[make_state(ticker, client, loop) for ticker in tickers])
+        handlers = [signals.handler(ticker) for ticker in tickers]
+
+        def close_batch():
+            for handler, bar in zip(handlers, bars):
+                handler(bar)
+
+        results[f"runner_batch_close_{symbols}_symbols"] = measure(close_batch, calls=10, batches=50 // scale)
+    loop.call_soon_threadsafe(loop.stop)
+    return results
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Сравнивает медианные задержки с базовым прогоном
+
+    :param current: результаты текущего прогона
+    :param baseline: результаты базового прогона
+    :param threshold: допустимое относительное замедление
+
+    :return: :class:`list` названия замеров с замедлением больше порога
+    """
+    regressions = []
+    print(f"{'замер':<32}{'база p50':>12}{'p50':>12}{'доля':>8}")
+    for name, values in current.items():
+        if name not in baseline:
+            continue
+        ratio = values['p50_us'] / baseline[name]['p50_us']
+        mark = 'ЗАМЕДЛЕНИЕ' if ratio > 1 + threshold else ''
+        print(f"{name:<32}{baseline[name]['p50_us']:>12.2f}{values['p50_us']:>12.2f}{ratio:>8.2f}  {mark}")
+        if mark:
+            regressions.append(name)
+    return regressions
+
+
+def main(arguments: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Замеры производительности индикаторов, приема потока и стратегии')
+    parser.add_argument('--output', help='файл результатов (JSON), по умолчанию benchmarks/results/<время>.json')
+    parser.add_argument('--compare', help='файл результатов базового прогона')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустимое относительное замедление p50')
+    parser.add_argument('--quick', action='store_true', help='уменьшенное количество вызовов')
+    arguments = parser.parse_args(arguments)
+
+    results = run_benchmarks(quick=arguments.quick)
+    report = {'timestamp': int(time.time()),
+              'python': platform.python_version(),
+              'numpy': numpy.__version__,
+              'machine': platform.machine(),
+              'results': results}
+    output = arguments.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    for name, values in results.items():
+        print(f"{name:<32}p50={values['p50_us']:>10.2f}мкс  p99={values['p99_us']:>10.2f}мкс  "
+              f"{values['throughput_per_s']:>12.0f}/с")
+    print(f"Результаты сохранены: {output}")
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)['results']
+        if compare(results, baseline, arguments.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
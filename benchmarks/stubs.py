@@ -0,0 +1,123 @@
+import asyncio
+from itertools import count
+from threading import Thread
+
+from market_data import synthetic_klines
+
+
+class StubBinance:
+    """
+    Клиент с интерфейсом :class:`Binance` без сетевых запросов
+    """
+    def __init__(self, is_future: bool = True, base_prices: dict[str, float] = None,
+                 klines: dict[tuple[str, str], list[list]] = None):
+        """
+        :param is_future: фьючерсный рынок
+        :param base_prices: цена последней исторической свечи по тикеру, по умолчанию 3000
+        :param klines: исторические свечи по `(тикер, интервал)` вместо случайных (например, записанный стартовый
+            архив)
+        """
+        self.exchange = 'Binance'
+        self.is_future = is_future
+        self.base_prices = base_prices or {}
+        self.klines = klines or {}
+        self.order_ids = count(1)
+
+    def get_candles(self, ticker: str, start_time: int = None, end_time: int = None,
+                    interval: str = None, limit: int = None) -> list:
+        klines = self.klines.get((ticker.upper(), interval))
+        if klines:
+            return [list(kline) for kline in klines[-(limit or 500):]]
+        return synthetic_klines(length=limit or 500, end_time=end_time,
+                                base_price=self.base_prices.get(ticker.upper(), 3000))
+
+    def new_client_order_id(self) -> str:
+        return f"stub-{next(self.order_ids)}"
+
+    def market_order(self, ticker: str, side: str, quantity: float, client_order_id: str = None) -> dict:
+        return {'orderId': next(self.order_ids), 'symbol': ticker, 'side': side, 'status': 'FILLED',
+                'clientOrderId': client_order_id}
+
+    def get_order(self, ticker: str, order_id: int = None, client_order_id: str = None) -> dict:
+        return {'code': -2013, 'msg': 'Order does not exist.'}
+
+    def cancel_order(self, ticker: str, order_id: int) -> bool:
+        return True
+
+    def trailing_stop_order(self, ticker: str, side: str, quantity: float, trailing_delta: float,
+                            activation_price: float = None, client_order_id: str = None) -> dict:
+        return {'orderId': next(self.order_ids), 'symbol': ticker, 'side': side, 'status': 'NEW',
+                'clientOrderId': client_order_id}
+
+    def protected_market_order(self, ticker: str, side: str, quantity: float, stop_side: str, stop_quantity: float,
+                               trailing_delta: float, client_order_id: str = None,
+                               stop_client_order_id: str = None) -> tuple[dict, dict]:
+        return (self.market_order(ticker=ticker, side=side, quantity=quantity, client_order_id=client_order_id),
+                self.trailing_stop_order(ticker=ticker, side=stop_side, quantity=stop_quantity,
+                                         trailing_delta=trailing_delta, client_order_id=stop_client_order_id))
+
+    def get_listen_key(self) -> dict:
+        return {'listenKey': 'stub-listen-key'}
+
+    def keep_alive_listen_key(self, listen_key: str) -> dict:
+        return {}
+
+    def close_listen_key(self, listen_key: str) -> dict:
+        return {}
+
+
+class StubAsyncBinance:
+    """
+    Клиент с интерфейсом :class:`AsyncBinance` без сетевых запросов
+    """
+    def __init__(self, client: StubBinance = None):
+        self.client = client or StubBinance()
+
+    def new_client_order_id(self) -> str:
+        return self.client.new_client_order_id()
+
+    async def market_order(self, **kwargs) -> dict:
+        return self.client.market_order(**kwargs)
+
+    async def get_order(self, **kwargs) -> dict:
+        return self.client.get_order(**kwargs)
+
+    async def protected_market_order(self, **kwargs) -> tuple[dict, dict]:
+        return self.client.protected_market_order(**kwargs)
+
+    async def cancel_order(self, **kwargs) -> bool:
+        return self.client.cancel_order(**kwargs)
+
+    async def trailing_stop_order(self, **kwargs) -> dict:
+        return self.client.trailing_stop_order(**kwargs)
+
+    async def close(self):
+        pass
+
+
+class InlinePipeline:
+    """
+    Конвейер с интерфейсом :class:`EventPipeline`, выполняющий события сразу в вызывающем потоке
+    """
+    dropped = 0
+
+    def submit_signal(self, handler, *args, critical: bool = False) -> bool:
+        handler(*args)
+        return True
+
+    def submit_execution(self, handler, *args):
+        handler(*args)
+
+    def depth(self) -> dict[str, int]:
+        return {'signal': 0, 'execution': 0, 'dropped': 0}
+
+
+def start_loop() -> asyncio.AbstractEventLoop:
+    """
+    Запускает цикл событий в отдельном потоке
+
+    :return: :class:`asyncio.AbstractEventLoop`
+    """
+    loop = asyncio.new_event_loop()
+    Thread(target=loop.run_forever, daemon=True).start()
+    return loop
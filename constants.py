@@ -1,3 +1,25 @@
-# Binance base url link
-BINANCE_BASE_SPOT_URL = "https://api.binance.com"
-BINANCE_BASE_FUTURES_URL = "https://fapi.binance.com"
+import os
+
+# Binance base url link (переопределяются переменными окружения, например для локальной имитации площадки)
+BINANCE_BASE_SPOT_URL = os.environ.get('BINANCE_BASE_SPOT_URL', "https://api.binance.com")
+BINANCE_BASE_FUTURES_URL = os.environ.get('BINANCE_BASE_FUTURES_URL', "https://fapi.binance.com")
+# Binance stream url link
+BINANCE_SPOT_STREAM_URL = os.environ.get('BINANCE_SPOT_STREAM_URL', "wss://stream.binance.com:9443")
+BINANCE_FUTURES_STREAM_URL = os.environ.get('BINANCE_FUTURES_STREAM_URL', "wss://fstream-auth.binance.com")
+
+# Каталог локального кэша исторических свечей
+KLINES_CACHE_DIR = "cache/klines"
+# Каталог снимков состояния стратегий
+STATE_SNAPSHOT_DIR = "cache/state"
+
+# Лимиты запросов Binance: (тип счетчика, окно) - максимальное значение
+BINANCE_SPOT_RATE_LIMITS = {
+    ('used-weight', '1m'): 6000,
+    ('order-count', '10s'): 100,
+    ('order-count', '1d'): 200000,
+}
+BINANCE_FUTURES_RATE_LIMITS = {
+    ('used-weight', '1m'): 2400,
+    ('order-count', '10s'): 300,
+    ('order-count', '1m'): 1200,
+}
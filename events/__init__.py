@@ -0,0 +1,5 @@
+from .ingest import *
+from .journal import *
+from .pipeline import *
+from .recorder import *
+from .replay import *
@@ -0,0 +1,161 @@
+import json
+import logging
+from threading import Lock
+import time
+
+from monitoring import metrics
+
+from .pipeline import EventPipeline
+
+logger = logging.getLogger('app.events.ingest')
+
+# Начало кадра объединенного потока Binance
+STREAM_PREFIX = '{"stream":"'
+
+
+def frame_field(frame: str, key: str) -> str:
+    """
+    Возвращает строковое значение поля кадра без разбора JSON
+
+    :param frame: кадр потока
+    :param key: ключ вместе с открывающей кавычкой значения, например ``'"c":"'``
+
+    :return: :class:`str` или None, если поле не найдено
+    """
+    start = frame.find(key)
+    if start < 0:
+        return None
+    start += len(key)
+    return frame[start:frame.find('"', start)]
+
+
+def stream_name(frame: str) -> str:
+    """
+    Возвращает имя потока кадра объединенного потока, разбирая JSON только для кадров нестандартного вида
+
+    :param frame: кадр потока
+
+    :return: :class:`str`
+    """
+    if frame.startswith(STREAM_PREFIX):
+        return frame_field(frame, STREAM_PREFIX)
+    return json.loads(frame).get('stream')
+
+
+class StreamIngest:
+    """
+    Быстрый прием кадров объединенного потока
+    """
+    def __init__(self, pipeline: EventPipeline, listen_key: str, on_order_update,
+                 kline_handlers: dict[str, list]):
+        """
+        Создает объект класса :class:`StreamIngest`, передающий кадры потока в :class:`EventPipeline`.
+
+        .. Note:: Кадр направляется по имени потока до разбора JSON, кадры неизвестных потоков отбрасываются.
+        Тик незакрытой свечи с неизменной ценой закрытия отбрасывается без разбора. Если стадия сигналов не успела
+        обработать предыдущий тик потока, новый тик заменяет его, поэтому при отставании обрабатывается только
+        последний тик. Закрытие свечи (`k.x`) и `ORDER_TRADE_UPDATE` доставляются всегда.
+
+        :param pipeline: конвейер событий
+        :param listen_key: ключ (имя) потока пользовательских данных
+        :param on_order_update: обработчик обновления ордера
+        :param kline_handlers: обработчики свечей по имени потока
+        """
+        self.pipeline = pipeline
+        self.listen_key = listen_key
+        self.on_order_update = on_order_update
+        self.kline_handlers = kline_handlers
+        # Последняя цена закрытия по потоку (строка кадра)
+        self.last_close: dict[str, str] = {}
+        # Ожидающий обработки тик по потоку
+        self.pending: dict[str, dict] = {}
+        self.lock = Lock()
+        # Счетчики кадров
+        self.frames = 0
+        self.ignored = 0
+        self.unchanged = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        Возвращает счетчики принятых, отброшенных и объединенных кадров
+
+        :return: :class:`dict`
+        """
+        return {'frames': self.frames,
+                'ignored': self.ignored,
+                'unchanged': self.unchanged,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'pending': len(self.pending)}
+
+    def on_frame(self, frame: str):
+        """
+        Принимает кадр потока (вызывается в потоке чтения подключения)
+
+        :param frame: кадр потока
+        """
+        received = metrics.now()
+        self.frames += 1
+        metrics.count('frames')
+        name = stream_name(frame)
+        # Поток пользовательских данных
+        if name == self.listen_key:
+            data = json.loads(frame)['data']
+            metrics.since('decode', received)
+            if data['e'] == 'ORDER_TRADE_UPDATE':
+                self.pipeline.submit_signal(self.on_order_update, data['o'], critical=True)
+            return
+        if name not in self.kline_handlers:
+            self.ignored += 1
+            return
+        # Потоки свечей
+        closed = '"x":true' in frame
+        if not closed:
+            close = frame_field(frame, '"c":"')
+            if close == self.last_close.get(name):
+                self.unchanged += 1
+                return
+            self.last_close[name] = close
+        data = json.loads(frame)['data']
+        metrics.since('decode', received)
+        # Задержка от времени события на площадке (часы площадки и локальные часы не синхронизированы точно)
+        metrics.record('exchange_to_receive', time.time_ns() - data['E'] * 1_000_000)
+        kline = data['k']
+        # Отметка приема кадра для измерения следующих стадий
+        kline['received_ns'] = received
+        if closed:
+            self.last_close[name] = kline['c']
+        self.submit_kline(name=name, kline=kline, closed=closed)
+
+    def submit_kline(self, name: str, kline: dict, closed: bool):
+        with self.lock:
+            slot = self.pending.get(name)
+            # Необработанный тик незакрытой свечи заменяется более свежим
+            if slot is not None and not slot['x']:
+                self.pending[name] = kline
+                self.coalesced += 1
+                return
+            if slot is None:
+                self.pending[name] = kline
+        # Ожидающее закрытие свечи не заменяется, тик передается отдельно
+        if slot is not None:
+            accepted = self.pipeline.submit_signal(self.deliver, name, kline, critical=closed)
+        else:
+            accepted = self.pipeline.submit_signal(self.drain, name, critical=closed)
+            if not accepted:
+                with self.lock:
+                    self.pending.pop(name, None)
+        if not accepted:
+            self.dropped += 1
+
+    def drain(self, name: str):
+        # Обработка последнего тика потока (вызывается в стадии сигналов)
+        with self.lock:
+            kline = self.pending.pop(name)
+        self.deliver(name, kline)
+
+    def deliver(self, name: str, kline: dict):
+        for handler in self.kline_handlers[name]:
+            handler(kline)
@@ -0,0 +1,217 @@
+from collections import deque
+import logging
+import os
+import struct
+from threading import Condition, Thread
+import time
+
+import numpy
+
+logger = logging.getLogger('app.events.journal')
+
+# Типы событий журнала
+EVENT_SIGNAL = 1
+EVENT_ORDER = 2
+EVENT_FILL = 3
+EVENT_CANCEL = 4
+EVENT_POSITION_RESET = 5
+
+# Коды типов и статусов ордеров (индекс в кортеже), неизвестные значения записываются как 0
+ORDER_TYPES = ('', 'MARKET', 'LIMIT', 'STOP_MARKET', 'TRAILING_STOP_MARKET', 'STOP_LOSS_LIMIT', 'STOP', 'TAKE_PROFIT',
+               'TAKE_PROFIT_MARKET')
+ORDER_STATUSES = ('', 'NEW', 'PARTIALLY_FILLED', 'FILLED', 'CANCELED', 'EXPIRED', 'REJECTED')
+ORDER_TYPE_CODES = {name: code for code, name in enumerate(ORDER_TYPES)}
+ORDER_STATUS_CODES = {name: code for code, name in enumerate(ORDER_STATUSES)}
+SIDES = {'BUY': 1, 'SELL': -1}
+
+# Заголовок файла: сигнатура, размер записи
+JOURNAL_HEADER = struct.Struct('<8sI')
+JOURNAL_MAGIC = b'EVJOURN1'
+# Запись: время (нс UTC), время события площадки (мс), идентификатор ордера, цена, объем, цена сигнала, тикер,
+# тип события, направление, тип ордера, статус ордера
+RECORD = struct.Struct('<qqqddd16sBbBB')
+JOURNAL_DTYPE = numpy.dtype([
+    ('time', '<i8'),
+    ('event_time', '<i8'),
+    ('order_id', '<i8'),
+    ('price', '<f8'),
+    ('quantity', '<f8'),
+    ('reference', '<f8'),
+    ('symbol', 'S16'),
+    ('kind', 'u1'),
+    ('side', 'i1'),
+    ('order_type', 'u1'),
+    ('status', 'u1'),
+])
+
+
+class EventJournal:
+    """
+    Журнал торговых событий из записей фиксированной длины
+    """
+    def __init__(self, path: str, flush_records: int = 1000, flush_interval: float = 1.0, max_pending: int = 100_000):
+        """
+        Создает объект класса :class:`EventJournal`, дописывающий записи в файл ``path``.
+
+        .. Note:: Каждое событие (сигнал, ордер, исполнение, отмена стопа, сброс позиции) - одна запись
+        :data:`RECORD`. В потоке обработки событий :meth:`append` только упаковывает запись и добавляет ее в очередь,
+        запись в файл выполняет фоновый поток по накоплению ``flush_records`` записей или по таймеру, как в
+        :class:`FrameRecorder`. Записи не сжимаются, поэтому журнал читается целиком в структурированный массив
+        (:func:`read_journal`). При открытии существующего файла проверяется заголовок, а незавершенная последняя
+        запись аварийной остановки отбрасывается, поэтому новые записи дописываются с границы записи.
+
+        :param path: файл журнала
+        :param flush_records: количество записей, при накоплении которых выполняется запись в файл
+        :param flush_interval: максимальное время ожидания записи в секундах
+        :param max_pending: максимальное количество записей в памяти
+        """
+        self.path = path
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending: deque[bytes] = deque()
+        self.condition = Condition()
+        self.running = True
+        self.recorded = 0
+        self.dropped = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        try:
+            self.check_tail()
+        except ValueError:
+            self.file.close()
+            raise
+        self.thread = Thread(target=self.work, name='event-journal', daemon=True)
+        self.thread.start()
+
+    def check_tail(self):
+        # Проверка заголовка и отбрасывание незавершенной последней записи, чтобы новые записи не сместились
+        header = self.file.read(JOURNAL_HEADER.size)
+        if len(header) < JOURNAL_HEADER.size:
+            self.file.seek(0)
+            self.file.truncate()
+            self.file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, RECORD.size))
+            self.file.flush()
+            return
+        magic, size = JOURNAL_HEADER.unpack(header)
+        if magic != JOURNAL_MAGIC or size != RECORD.size:
+            raise ValueError(f"Файл {self.path} не является журналом событий")
+        length = os.fstat(self.file.fileno()).st_size
+        end = length - (length - JOURNAL_HEADER.size) % RECORD.size
+        if end != length:
+            logger.info(f"Журнал {self.path}: отброшена незавершенная запись ({length - end} байт)")
+            self.file.truncate(end)
+        self.file.seek(end)
+
+    def append(self, kind: int, symbol: bytes, side: int = 0, order_id: int = 0, price: float = 0.0,
+               quantity: float = 0.0, reference: float = 0.0, event_time: int = 0, order_type: int = 0,
+               status: int = 0):
+        """
+        Добавляет запись с текущим временем
+
+        :param kind: тип события (``EVENT_*``)
+        :param symbol: тикер в байтах (до 16 символов)
+        :param side: направление: 1 - покупка, -1 - продажа, 0 - нет
+        :param order_id: идентификатор ордера
+        :param price: цена сигнала или исполнения
+        :param quantity: объем
+        :param reference: цена сигнала, к которому относится ордер (для расчета проскальзывания)
+        :param event_time: время события площадки в миллисекундах
+        :param order_type: код типа ордера (:data:`ORDER_TYPES`)
+        :param status: код статуса ордера (:data:`ORDER_STATUSES`)
+        """
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append(RECORD.pack(time.time_ns(), event_time, order_id, price, quantity, reference, symbol,
+                                        kind, side, order_type, status))
+        if len(self.pending) == self.flush_records:
+            with self.condition:
+                self.condition.notify()
+
+    def append_order(self, kind: int, order: dict, reference: float = 0.0):
+        """
+        Добавляет запись по данным обновления ордера потока пользовательских данных (`o` события
+        `ORDER_TRADE_UPDATE`). Для исполнения записываются цена и объем последней сделки
+
+        :param kind: тип события (``EVENT_*``)
+        :param order: данные ордера
+        :param reference: цена сигнала
+        """
+        self.append(kind=kind, symbol=order['s'].encode(), side=SIDES.get(order['S'], 0), order_id=order['i'],
+                    price=float(order['L']), quantity=float(order['l']), reference=reference,
+                    event_time=order['T'], order_type=ORDER_TYPE_CODES.get(order['ot'], 0),
+                    status=ORDER_STATUS_CODES.get(order['X'], 0))
+
+    def close(self):
+        """
+        Записывает оставшиеся записи и закрывает журнал
+        """
+        if not self.running:
+            return
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        self.thread.join()
+        self.file.close()
+
+    def work(self):
+        while True:
+            with self.condition:
+                if self.running and len(self.pending) < self.flush_records:
+                    self.condition.wait(timeout=self.flush_interval)
+            records = [self.pending.popleft() for _ in range(len(self.pending))]
+            if records:
+                self.file.write(b''.join(records))
+                self.file.flush()
+                self.recorded += len(records)
+            if not self.running and not self.pending:
+                return
+
+
+def read_journal(path: str) -> numpy.ndarray:
+    """
+    Загружает журнал :class:`EventJournal`
+
+    :param path: файл журнала
+
+    :return: :class:`numpy.ndarray` записей :data:`JOURNAL_DTYPE`
+    """
+    with open(path, 'rb') as file:
+        header = file.read(JOURNAL_HEADER.size)
+    if len(header) < JOURNAL_HEADER.size:
+        return numpy.empty(0, dtype=JOURNAL_DTYPE)
+    magic, size = JOURNAL_HEADER.unpack(header)
+    if magic != JOURNAL_MAGIC or size != JOURNAL_DTYPE.itemsize:
+        raise ValueError(f"Файл {path} не является журналом событий")
+    count = (os.path.getsize(path) - JOURNAL_HEADER.size) // size
+    return numpy.fromfile(path, dtype=JOURNAL_DTYPE, count=count, offset=JOURNAL_HEADER.size)
+
+
+def fill_slippage(records: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Рассчитывает проскальзывание исполнений относительно цены сигнала
+
+    :param records: записи журнала (:func:`read_journal`)
+
+    :return: :class:`tuple` (записи исполнений с ценой сигнала, проскальзывание в долях цены сигнала: положительное -
+        исполнение хуже цены сигнала)
+    """
+    fills = records[(records['kind'] == EVENT_FILL) & (records['reference'] > 0)]
+    return fills, fills['side'] * (fills['price'] - fills['reference']) / fills['reference']
+
+
+def realized_pnl(records: numpy.ndarray, symbol: str) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """
+    Рассчитывает результат торговли тикера по исполнениям
+
+    :param records: записи журнала (:func:`read_journal`)
+    :param symbol: тикер
+
+    :return: :class:`tuple` (время исполнений в нс, позиция после исполнения, результат с переоценкой открытой
+        позиции по цене исполнения; при нулевой позиции - зафиксированный результат)
+    """
+    fills = records[(records['kind'] == EVENT_FILL) & (records['symbol'] == symbol.upper().encode())]
+    signed = fills['side'] * fills['quantity']
+    position = numpy.cumsum(signed)
+    return fills['time'], position, numpy.cumsum(-signed * fills['price']) + position * fills['price']
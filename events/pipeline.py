@@ -0,0 +1,97 @@
+import logging
+from queue import Full, Queue
+from threading import Thread
+import traceback
+
+logger = logging.getLogger('app.events.pipeline')
+
+# Признак остановки обработчика очереди
+STOP = object()
+
+
+class EventPipeline:
+    """
+    Конвейер обработки событий потока
+    """
+    def __init__(self, signal_queue_size: int = 10000, execution_queue_size: int = 100, put_timeout: float = 0.05):
+        """
+        Создает объект класса :class:`EventPipeline` из двух стадий, каждая со своей ограниченной очередью и потоком.
+
+        .. Note:: Поток чтения подключения только помещает разобранные события в очередь сигналов
+        (:meth:`submit_signal`): расчет индикаторов и проверка сигналов выполняются в потоке сигналов, запросы ордеров -
+        в потоке исполнения (:meth:`submit_execution`). При заполненной очереди сигналов некритичное событие (тик
+        незакрытой свечи) ожидает не дольше ``put_timeout`` и отбрасывается, критичные события (закрытие свечи,
+        обновление ордера) и запросы ордеров ожидают освобождения места, замедляя чтение подключения.
+
+        :param signal_queue_size: размер очереди стадии сигналов
+        :param execution_queue_size: размер очереди стадии исполнения
+        :param put_timeout: время ожидания места в очереди для некритичного события в секундах
+        """
+        self.signal_queue = Queue(maxsize=signal_queue_size)
+        self.execution_queue = Queue(maxsize=execution_queue_size)
+        self.put_timeout = put_timeout
+        # Количество отброшенных некритичных событий
+        self.dropped = 0
+        self.threads = [Thread(target=self.work, args=(self.signal_queue,), name='signal-stage', daemon=True),
+                        Thread(target=self.work, args=(self.execution_queue,), name='execution-stage', daemon=True)]
+        for thread in self.threads:
+            thread.start()
+
+    def submit_signal(self, handler, *args, critical: bool = False) -> bool:
+        """
+        Помещает событие в очередь стадии сигналов
+
+        :param handler: обработчик события
+        :param args: аргументы обработчика
+        :param critical: событие не может быть отброшено
+
+        :return: :class:`bool` событие принято
+        """
+        try:
+            self.signal_queue.put((handler, args), timeout=None if critical else self.put_timeout)
+            return True
+        except Full:
+            self.dropped += 1
+            return False
+
+    def submit_execution(self, handler, *args):
+        """
+        Помещает запрос в очередь стадии исполнения, ожидая освобождения места
+
+        :param handler: обработчик запроса
+        :param args: аргументы обработчика
+        """
+        self.execution_queue.put((handler, args))
+
+    def depth(self) -> dict[str, int]:
+        """
+        Возвращает глубину очередей и количество отброшенных событий
+
+        :return: :class:`dict`
+        """
+        return {'signal': self.signal_queue.qsize(),
+                'execution': self.execution_queue.qsize(),
+                'dropped': self.dropped}
+
+    def stop(self, timeout: float = None):
+        """
+        Останавливает стадии после обработки уже принятых событий
+        """
+        for queue in (self.signal_queue, self.execution_queue):
+            queue.put(STOP)
+        for thread in self.threads:
+            thread.join(timeout)
+
+    @staticmethod
+    def work(queue: Queue):
+        while True:
+            item = queue.get()
+            try:
+                if item is STOP:
+                    return
+                handler, args = item
+                handler(*args)
+            except Exception:
+                logger.info(traceback.format_exc())
+            finally:
+                queue.task_done()
@@ -0,0 +1,141 @@
+from collections import deque
+import json
+import logging
+import struct
+from threading import Condition, Thread
+import time
+import zlib
+
+logger = logging.getLogger('app.events.recorder')
+
+# Заголовок блока: длина сжатых данных, количество записей
+BLOCK_HEADER = struct.Struct('<II')
+# Заголовок записи: время приема кадра (нс UTC), длина кадра
+RECORD_HEADER = struct.Struct('<qI')
+# Суффикс имени потока кадра стартового архива свечей (:meth:`FrameRecorder.append_warmup`)
+WARMUP_SUFFIX = '@warmup'
+
+
+class FrameRecorder:
+    """
+    Запись сырых кадров потока в сжатый журнал
+    """
+    def __init__(self, path: str, block_records: int = 1000, flush_interval: float = 1.0, max_pending: int = 100_000,
+                 level: int = 1):
+        """
+        Создает объект класса :class:`FrameRecorder`, дописывающий кадры в файл ``path``.
+
+        .. Note:: Журнал состоит из независимых блоков, сжатых :mod:`zlib`: заголовок блока и записи
+        `(время приема, длина, кадр)`. В потоке чтения подключения :meth:`append` только добавляет кадр в очередь,
+        сжатие и запись выполняет фоновый поток по заполнению блока или по таймеру. Если фоновый поток не успевает и в
+        памяти накопилось ``max_pending`` кадров, новые кадры не записываются и учитываются в :attr:`dropped`.
+        Незавершенный последний блок (при аварийной остановке) при чтении пропускается.
+
+        :param path: файл журнала
+        :param block_records: количество записей в блоке
+        :param flush_interval: максимальное время ожидания записи в секундах
+        :param max_pending: максимальное количество кадров в памяти
+        :param level: уровень сжатия zlib
+        """
+        self.path = path
+        self.block_records = block_records
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.level = level
+        self.pending: deque[tuple[int, str]] = deque()
+        self.condition = Condition()
+        self.running = True
+        self.recorded = 0
+        self.dropped = 0
+        self.file = open(path, 'ab')
+        self.thread = Thread(target=self.work, name='frame-recorder', daemon=True)
+        self.thread.start()
+
+    def append(self, frame: str):
+        """
+        Добавляет кадр с текущим временем приема
+
+        :param frame: кадр потока
+        """
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self.pending.append((time.time_ns(), frame))
+        # Фоновый поток не ожидает, пока в очереди не меньше блока, поэтому достаточно одного уведомления
+        if len(self.pending) == self.block_records:
+            with self.condition:
+                self.condition.notify()
+
+    def append_warmup(self, stream: str, klines: list[list], parameters: dict = None):
+        """
+        Добавляет кадр `<stream>@warmup` со стартовым архивом свечей потока, по которому стратегия инициализирована
+        до приема кадров, чтобы воспроизведение начиналось с того же окна свечей
+
+        :param stream: имя потока свечей
+        :param klines: закрытые свечи в формате :meth:`Binance.get_candles`
+        :param parameters: параметры стратегии потока
+        """
+        self.append(json.dumps({'stream': stream + WARMUP_SUFFIX,
+                                'data': {'klines': klines, 'parameters': parameters or {}}}))
+
+    def close(self):
+        """
+        Записывает оставшиеся кадры и закрывает журнал
+        """
+        if not self.running:
+            return
+        self.running = False
+        with self.condition:
+            self.condition.notify()
+        self.thread.join()
+        self.file.close()
+
+    def work(self):
+        while True:
+            with self.condition:
+                if self.running and len(self.pending) < self.block_records:
+                    self.condition.wait(timeout=self.flush_interval)
+            # Добавление и извлечение из deque потокобезопасны, поэтому поток чтения подключения не блокируется
+            records = [self.pending.popleft() for _ in range(min(len(self.pending), self.block_records))]
+            if records:
+                self.write_block(records)
+            if not self.running and not self.pending:
+                return
+
+    def write_block(self, records: list[tuple[int, str]]):
+        payload = bytearray()
+        for received, frame in records:
+            data = frame.encode('utf-8') if isinstance(frame, str) else frame
+            payload += RECORD_HEADER.pack(received, len(data))
+            payload += data
+        compressed = zlib.compress(payload, self.level)
+        self.file.write(BLOCK_HEADER.pack(len(compressed), len(records)) + compressed)
+        self.file.flush()
+        self.recorded += len(records)
+
+
+def read_frames(path: str):
+    """
+    Последовательно читает кадры журнала :class:`FrameRecorder`
+
+    :param path: файл журнала
+
+    :return: генератор `(время приема в нс UTC, кадр)`
+    """
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(BLOCK_HEADER.size)
+            if len(header) < BLOCK_HEADER.size:
+                return
+            length, count = BLOCK_HEADER.unpack(header)
+            compressed = file.read(length)
+            if len(compressed) < length:
+                logger.info(f"Журнал {path}: незавершенный последний блок пропущен")
+                return
+            payload = memoryview(zlib.decompress(compressed))
+            offset = 0
+            for _ in range(count):
+                received, size = RECORD_HEADER.unpack_from(payload, offset)
+                offset += RECORD_HEADER.size
+                yield received, str(payload[offset:offset + size], 'utf-8')
+                offset += size
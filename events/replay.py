@@ -0,0 +1,29 @@
+import time
+
+
+def replay(frames, on_frame, speed: float = None) -> dict[str, float]:
+    """
+    Передает записанные кадры в обработчик
+
+    :param frames: последовательность `(время приема в нс, кадр)`, например :func:`read_frames`
+    :param on_frame: обработчик кадра (например, :meth:`StreamIngest.on_frame`)
+    :param speed: множитель скорости относительно записи: 1 - исходный темп, 10 - в 10 раз быстрее,
+        None или 0 - без пауз
+
+    :return: :class:`dict` количество кадров, время прогона и пропускная способность
+    """
+    count = 0
+    first_received = None
+    started = time.perf_counter()
+    for received, frame in frames:
+        if speed:
+            if first_received is None:
+                first_received = received
+            # Ожидание момента, соответствующего времени приема кадра при записи
+            delay = (received - first_received) / 1e9 / speed - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+        on_frame(frame)
+        count += 1
+    elapsed = time.perf_counter() - started
+    return {'frames': count, 'elapsed': elapsed, 'frames_per_s': count / elapsed if elapsed else 0.0}
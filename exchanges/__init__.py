@@ -1 +1,3 @@
+from .async_binance import *
 from .binance import *
+from .rate_limit import *
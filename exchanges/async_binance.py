@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import hmac
+from itertools import count
+import os
+import time
+
+import aiohttp
+import numpy
+from yarl import URL
+
+from constants import (BINANCE_BASE_FUTURES_URL, BINANCE_BASE_SPOT_URL, BINANCE_FUTURES_RATE_LIMITS,
+                       BINANCE_SPOT_RATE_LIMITS)
+from market_data import klines_from_json
+from monitoring import metrics
+from .binance import Binance
+from .rate_limit import RequestBudget
+
+
+class AsyncBinance:
+    """
+    Асинхронный класс Binance
+    """
+    def __init__(self, api_key: str = None, secret_key: str = None, is_future: bool = None, pool_size: int = 10,
+                 timeout: tuple[float, float] = (3.05, 10), throttle: bool = True):
+        """
+        Создает объект (клиент) класса :class:`AsyncBinance` - асинхронный аналог :class:`Binance` с теми же методами.
+
+        .. Note:: Сессия :mod:`aiohttp` с пулом постоянных соединений создается при первом запросе внутри
+        работающего цикла событий. Независимые запросы (например, отмена старого стопа и ордер разворота) можно
+        отправлять одновременно через :func:`asyncio.gather`.
+
+        :param api_key: открытый ключ
+        :param secret_key: приватный ключ
+        :param is_future: флаг выбора URL для фьючерсного рынка
+        :param pool_size: количество постоянных соединений в пуле
+        :param timeout: таймауты (подключение, чтение) в секундах
+        :param throttle: ожидать перед запросом, если он превысит лимит площадки
+        """
+        self.exchange = 'Binance'
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.is_future = is_future
+        # Определение базовой ссылки
+        if self.is_future:
+            self.base_link = BINANCE_BASE_FUTURES_URL
+        else:
+            self.base_link = BINANCE_BASE_SPOT_URL
+        # Формирование заголовка запроса
+        self.headers = {'X-MBX-APIKEY': self.api_key}
+        # Состояние HMAC с уже обработанным ключом и идентификаторы ордеров клиента (:class:`Binance`)
+        self.signer = hmac.new(self.secret_key.encode('utf-8'), digestmod=hashlib.sha256) \
+            if self.secret_key is not None else None
+        self.order_prefix = f"{os.getpid():x}{int(time.time()):x}a"
+        self.order_numbers = count(1)
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self.session: aiohttp.ClientSession = None
+        # Учет лимитов запросов
+        self.throttle = throttle
+        self.budget = RequestBudget(BINANCE_FUTURES_RATE_LIMITS if self.is_future else BINANCE_SPOT_RATE_LIMITS)
+
+    # Подпись, вес и параметры запросов совпадают с синхронным клиентом
+    sign_query = Binance.sign_query
+    new_client_order_id = Binance.new_client_order_id
+    candles_weight = Binance.candles_weight
+    market_order_params = Binance.market_order_params
+    trailing_stop_params = Binance.trailing_stop_params
+    batch_orders_params = Binance.batch_orders_params
+
+    async def close(self):
+        """
+        Закрывает сессию и соединения пула
+        """
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def http_request(self, endpoint: str, method_type: str, params: dict[str, any] = None, weight: int = 1,
+                           order: bool = False, signed: bool = False, raw: bool = False) -> tuple[int, any]:
+        """
+        Отправляет http запрос на сервер торговой площадки
+
+        :param endpoint: url адрес запроса
+        :param method_type: тип запроса `(GET`, `POST`, `DELETE`, `PUT)`
+        :param params: тело запроса `(params)`
+        :param weight: вес запроса в лимите площадки
+        :param order: запрос выставляет ордер (учитывается в лимите количества ордеров)
+        :param signed: подписать запрос (:meth:`Binance.sign_query`) после ожидания лимита
+        :param raw: вернуть тело ответа без разбора JSON (:class:`bytes`)
+
+        :return: :class:`tuple` (код ответа, тело ответа)
+        """
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size)
+            self.session = aiohttp.ClientSession(headers=self.headers, connector=connector, timeout=self.timeout)
+        if self.throttle:
+            while delay := self.budget.try_acquire(weight=weight, order=order):
+                await asyncio.sleep(delay)
+        if signed:
+            # Подписанная строка отправляется без повторного кодирования
+            url, params = URL(f"{self.base_link}{endpoint}?{self.sign_query(params)}", encoded=True), None
+        else:
+            # Значения параметров в aiohttp должны быть строками
+            url, params = self.base_link + endpoint, {key: str(value) for key, value in (params or {}).items()}
+        start = metrics.now()
+        async with self.session.request(method=method_type, url=url, params=params) as response:
+            self.budget.update(headers=response.headers, status_code=response.status)
+            body = await response.read() if raw else await response.json(content_type=None)
+        metrics.since(f"http_{method_type.lower()}", start)
+        metrics.count('requests')
+        return response.status, body
+
+    async def get_candles(self, ticker: str, start_time: int = None, end_time: int = None,
+                          interval: str = None, limit: int = None) -> list:
+        """
+        Возвращает список исторических свечей по торговой паре (:meth:`Binance.get_candles`)
+
+        :return: :class:`list`
+        """
+        endpoint = '/fapi/v1/klines' if self.is_future else '/api/v3/klines'
+        params = {
+            'symbol': ticker,
+            'interval': interval,
+        }
+        if start_time:
+            params['startTime'] = start_time
+        if end_time:
+            params['endTime'] = end_time
+        if limit:
+            params['limit'] = limit
+
+        _, candles = await self.http_request(endpoint=endpoint, method_type='GET', params=params,
+                                             weight=self.candles_weight(limit))
+        return candles
+
+    async def get_candles_array(self, ticker: str, start_time: int = None, end_time: int = None,
+                                interval: str = None, limit: int = None) -> numpy.ndarray:
+        """
+        Возвращает исторические свечи по торговой паре в виде массива чисел, разбирая ответ без JSON
+        (:func:`klines_from_json`)
+
+        :return: :class:`numpy.ndarray` ``(количество, 7)``
+        """
+        endpoint = '/fapi/v1/klines' if self.is_future else '/api/v3/klines'
+        params = {
+            'symbol': ticker,
+            'interval': interval,
+        }
+        if start_time:
+            params['startTime'] = start_time
+        if end_time:
+            params['endTime'] = end_time
+        if limit:
+            params['limit'] = limit
+
+        status, body = await self.http_request(endpoint=endpoint, method_type='GET', params=params,
+                                               weight=self.candles_weight(limit), raw=True)
+        if status != 200:
+            raise ValueError(f"Ошибка запроса свечей {ticker} {interval}: {status} {body[:200]!r}")
+        return klines_from_json(body)
+
+    async def new_order(self, params: dict[str, any]) -> dict:
+        """
+        Выставляет ордер с готовыми параметрами (:meth:`Binance.new_order`)
+
+        :return: :class:`dict`
+        """
+        endpoint = '/fapi/v1/order' if self.is_future else '/api/v3/order'
+        _, order = await self.http_request(endpoint=endpoint, method_type='POST', params=params, order=True,
+                                           signed=True)
+        return order
+
+    async def market_order(self, ticker: str, side: str, quantity: float, client_order_id: str = None) -> dict:
+        """
+        Выставляет рыночный ордер (:meth:`Binance.market_order`)
+
+        :return: :class:`dict`
+        """
+        return await self.new_order(self.market_order_params(ticker=ticker, side=side, quantity=quantity,
+                                                             client_order_id=client_order_id))
+
+    async def get_order(self, ticker: str, order_id: int = None, client_order_id: str = None) -> dict:
+        """
+        Возвращает состояние ордера по идентификатору площадки или клиента (:meth:`Binance.get_order`)
+
+        :return: :class:`dict`
+        """
+        endpoint = '/fapi/v1/order' if self.is_future else '/api/v3/order'
+        params = {'symbol': ticker}
+        if order_id:
+            params['orderId'] = order_id
+        if client_order_id:
+            params['origClientOrderId'] = client_order_id
+        _, order = await self.http_request(endpoint=endpoint, method_type='GET', params=params,
+                                           weight=1 if self.is_future else 4, signed=True)
+        return order
+
+    async def cancel_order(self, ticker: str, order_id: int) -> bool:
+        """
+        Отменяет ордер по указанному тикеру и идентификатору (:meth:`Binance.cancel_order`)
+
+        :return: :class:`bool`
+        """
+        endpoint = '/fapi/v1/order' if self.is_future else '/api/v3/order'
+        params = {
+            'symbol': ticker,
+            'orderId': order_id,
+        }
+        status, _ = await self.http_request(endpoint=endpoint, method_type='DELETE', params=params, signed=True)
+        return status == 200
+
+    async def trailing_stop_order(self, ticker: str, side: str, quantity: float, trailing_delta: float,
+                                  activation_price: float = None, client_order_id: str = None) -> dict:
+        """
+        Выставляет переменяющийся стоп (:meth:`Binance.trailing_stop_order`)
+
+        :return: :class:`dict`
+        """
+        return await self.new_order(self.trailing_stop_params(ticker=ticker, side=side, quantity=quantity,
+                                                              trailing_delta=trailing_delta,
+                                                              activation_price=activation_price,
+                                                              client_order_id=client_order_id))
+
+    async def batch_orders(self, orders: list[dict]) -> list:
+        """
+        Выставляет до 5 ордеров одним запросом (:meth:`Binance.batch_orders`)
+
+        :return: :class:`list`
+        """
+        _, response = await self.http_request(endpoint='/fapi/v1/batchOrders', method_type='POST',
+                                              params=self.batch_orders_params(orders), weight=5, order=True,
+                                              signed=True)
+        return response
+
+    async def protected_market_order(self, ticker: str, side: str, quantity: float, stop_side: str,
+                                     stop_quantity: float, trailing_delta: float, client_order_id: str = None,
+                                     stop_client_order_id: str = None) -> tuple[dict, dict]:
+        """
+        Выставляет рыночный ордер входа и защищающий его переменяющийся стоп (:meth:`Binance.protected_market_order`)
+
+        :return: :class:`tuple` (ответ ордера входа, ответ стопа)
+        """
+        entry = self.market_order_params(ticker=ticker, side=side, quantity=quantity, client_order_id=client_order_id)
+        stop = self.trailing_stop_params(ticker=ticker, side=stop_side, quantity=stop_quantity,
+                                         trailing_delta=trailing_delta, client_order_id=stop_client_order_id)
+        if self.is_future:
+            response = await self.batch_orders([entry, stop])
+            if isinstance(response, list) and len(response) == 2:
+                return response[0], response[1]
+            return response, response
+        return await self.new_order(entry), await self.new_order(stop)
+
+    async def get_listen_key(self) -> dict:
+        """
+        Отправляет запрос на получение ключа потока пользовательских данных
+
+        :return: :class:`dict`
+        """
+        endpoint = '/fapi/v1/listenKey' if self.is_future else '/api/v3/userDataStream'
+        _, response = await self.http_request(endpoint=endpoint, method_type='POST')
+        return response
+
+    async def keep_alive_listen_key(self, listen_key: str) -> dict:
+        """
+        Отправляет запрос на продление ключа потока пользовательских данных
+
+        :return: :class:`dict`
+        """
+        endpoint = '/fapi/v1/listenKey' if self.is_future else '/api/v3/userDataStream'
+        _, response = await self.http_request(endpoint=endpoint, method_type='PUT', params={'listenKey': listen_key})
+        return response
+
+    async def close_listen_key(self, listen_key: str) -> dict:
+        """
+        Отправляет запрос на отключение от потока пользовательских данных
+
+        :return: :class:`dict`
+        """
+        endpoint = '/fapi/v1/listenKey' if self.is_future else '/api/v3/userDataStream'
+        _, response = await self.http_request(endpoint=endpoint, method_type='DELETE',
+                                              params={'listenKey': listen_key})
+        return response
@@ -1,27 +1,46 @@
 import hashlib
 import hmac
+from itertools import count
+import json
+import os
+import re
 import time
+from urllib.parse import quote
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
 
-from constants import BINANCE_BASE_FUTURES_URL, BINANCE_BASE_SPOT_URL
+from constants import (BINANCE_BASE_FUTURES_URL, BINANCE_BASE_SPOT_URL, BINANCE_FUTURES_RATE_LIMITS,
+                       BINANCE_SPOT_RATE_LIMITS)
+from monitoring import metrics
+from .rate_limit import RequestBudget
+
+# Символ строкового значения, требующий кодирования в строке запроса
+UNSAFE_QUERY_CHARACTER = re.compile(r'[^A-Za-z0-9._~-]')
 
 
 class Binance:
     """
     Класс Binance
     """
-    def __init__(self, api_key: str = None, secret_key: str = None, is_future: bool = None):
+    def __init__(self, api_key: str = None, secret_key: str = None, is_future: bool = None, pool_size: int = 10,
+                 timeout: tuple[float, float] = (3.05, 10), throttle: bool = True):
         """
         Создает объект (клиент) класса :class:`Binance`
 
         .. Note:: Торговая площадка Binance имеет различные базовые URL для спотовой и фьючерсной торговли. Для
         создания клиента фьючерсного рынка необходимо передать параметр futures = True
 
+        .. Note:: Запросы отправляются через одну сессию с пулом постоянных соединений (keep-alive), поэтому
+        соединение TCP+TLS устанавливается один раз. Использованный вес и количество ордеров читаются из заголовков
+        ответов в :attr:`budget`, при приближении к лимиту запрос ожидает начала нового окна.
+
         :param api_key: открытый ключ
         :param secret_key: приватный ключ
         :param is_future: флаг выбора URL для фьючерсного рынка
-        :param secret_key: приватный ключ
+        :param pool_size: количество постоянных соединений в пуле
+        :param timeout: таймауты (подключение, чтение) в секундах
+        :param throttle: ожидать перед запросом, если он превысит лимит площадки
         """
         self.exchange = 'Binance'
         self.api_key = api_key
@@ -34,38 +53,78 @@ class Binance:
             self.base_link = BINANCE_BASE_SPOT_URL
         # Формирование заголовка запроса
         self.headers = {'X-MBX-APIKEY': self.api_key}
+        # Состояние HMAC с уже обработанным ключом копируется для каждой подписи
+        self.signer = hmac.new(self.secret_key.encode('utf-8'), digestmod=hashlib.sha256) \
+            if self.secret_key is not None else None
+        # Уникальные в пределах процесса идентификаторы ордеров клиента
+        self.order_prefix = f"{os.getpid():x}{int(time.time()):x}"
+        self.order_numbers = count(1)
+        # Сессия с пулом постоянных соединений
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # Учет лимитов запросов
+        self.throttle = throttle
+        self.budget = RequestBudget(BINANCE_FUTURES_RATE_LIMITS if self.is_future else BINANCE_SPOT_RATE_LIMITS)
+
+    def sign_query(self, params: dict[str, any]) -> str:
+        """
+        Формирует подписанную строку приватного запроса
 
-    def sign_params(self, params: dict[str, any]) -> dict[str, any]:
+        .. Note:: Строка кодируется один раз и отправляется без изменений, поэтому подпись вычисляется ровно по
+        отправленным байтам (в том числе для значений с JSON, например `batchOrders`). Кодируются только строковые
+        значения с небезопасными символами.
+
+        :param params: параметры запроса
+
+        :return: :class:`str`
         """
-        Генерирует подпись для приватных запросов
+        search = UNSAFE_QUERY_CHARACTER.search
+        query = '&'.join([*(f"{key}={quote(value, safe='') if isinstance(value, str) and search(value) else value}"
+                            for key, value in (params or {}).items()),
+                          f"timestamp={int(time.time() * 1000)}"])
+        sign = self.signer.copy()
+        sign.update(query.encode('utf-8'))
+        return f"{query}&signature={sign.hexdigest()}"
+
+    def new_client_order_id(self) -> str:
+        """
+        Возвращает новый идентификатор ордера клиента (`newClientOrderId`). Повторная отправка ордера с тем же
+        идентификатором не создает второй ордер, а его состояние можно запросить через :meth:`get_order`
 
         :return: :class:`str`
         """
-        params['timestamp'] = int(time.time() * 1000)
-        params_string = '&'.join([f"{key}={volume}" for key, volume in params.items()])
-        sign = hmac.new(bytes(self.secret_key, 'utf-8'), params_string.encode('utf-8'), hashlib.sha256)
-        params['signature'] = sign.hexdigest()
-        return params
+        return f"{self.order_prefix}-{next(self.order_numbers)}"
 
-    def http_request(self, endpoint: str, method_type: str, params: dict[str, any] = None) -> Response:
+    def http_request(self, endpoint: str, method_type: str, params: dict[str, any] = None, weight: int = 1,
+                     order: bool = False, signed: bool = False) -> Response:
         """
         Отправляет http запрос на сервер торговой площадки
 
         :param endpoint: url адрес запроса
-        :param method_type: тип запроса `(GET`, `POST`, `DELETE)`
+        :param method_type: тип запроса `(GET`, `POST`, `DELETE`, `PUT)`
         :param params: тело запроса `(params)`
+        :param weight: вес запроса в лимите площадки
+        :param order: запрос выставляет ордер (учитывается в лимите количества ордеров)
+        :param signed: подписать запрос (:meth:`sign_query`) после ожидания лимита
 
         :return: :class:`Response` (requests.models.Response)
         """
+        if self.throttle:
+            self.budget.acquire(weight=weight, order=order)
+        url = self.base_link + endpoint
+        if signed:
+            url, params = f"{url}?{self.sign_query(params)}", None
         # Отправка запроса
-        if method_type == 'GET':
-            return requests.get(url=self.base_link + endpoint, headers=self.headers, params=params)
-        elif method_type == 'POST':
-            return requests.post(url=self.base_link + endpoint, headers=self.headers, params=params)
-        elif method_type == 'DELETE':
-            return requests.delete(url=self.base_link + endpoint, headers=self.headers, params=params)
-        elif method_type == 'PUT':
-            return requests.put(url=self.base_link + endpoint, headers=self.headers, params=params)
+        start = metrics.now()
+        response = self.session.request(method=method_type, url=url, params=params, timeout=self.timeout)
+        metrics.since(f"http_{method_type.lower()}", start)
+        metrics.count('requests')
+        self.budget.update(headers=response.headers, status_code=response.status_code)
+        return response
 
     def get_candles(self, ticker: str, start_time: int = None, end_time: int = None,
                     interval: str = None, limit: int = None) -> list:
@@ -100,31 +159,94 @@ class Binance:
         if limit:
             params['limit'] = limit
 
-        return self.http_request(endpoint=endpoint, method_type=method_type, params=params).json()
+        return self.http_request(endpoint=endpoint, method_type=method_type, params=params,
+                                 weight=self.candles_weight(limit)).json()
 
-    def market_order(self, ticker: str, side: str, quantity: float) -> dict:
+    def candles_weight(self, limit: int = None) -> int:
         """
-        Выставляет рыночный ордер. Рыночный ордер исполняется мгновенно по лучшей текущей цене
+        Возвращает вес запроса свечей, зависящий от их количества
+
+        :param limit: количество свечей
+
+        :return: :class:`int`
+        """
+        if not self.is_future:
+            return 2
+        size = limit or 500
+        return 1 if size < 100 else 2 if size < 500 else 5 if size <= 1000 else 10
+
+    def market_order_params(self, ticker: str, side: str, quantity: float, client_order_id: str = None) -> dict:
+        """
+        Возвращает параметры рыночного ордера
 
         :param ticker: тикер
         :param side: направление сделки
         :param quantity: количество
+        :param client_order_id: идентификатор ордера клиента
 
         :return: :class:`dict`
         """
-        if self.is_future:
-            endpoint = '/fapi/v1/order'
-        else:
-            endpoint = '/api/v3/order'
-        method_type = 'POST'
         params = {
             'symbol': ticker,
             'side': side,
             'type': 'MARKET',
             'quantity': quantity,
         }
+        if client_order_id:
+            params['newClientOrderId'] = client_order_id
+        return params
+
+    def new_order(self, params: dict[str, any]) -> dict:
+        """
+        Выставляет ордер с готовыми параметрами
+
+        :param params: параметры ордера
+
+        :return: :class:`dict`
+        """
+        if self.is_future:
+            endpoint = '/fapi/v1/order'
+        else:
+            endpoint = '/api/v3/order'
+
+        return self.http_request(method_type='POST', endpoint=endpoint, params=params, order=True, signed=True).json()
+
+    def market_order(self, ticker: str, side: str, quantity: float, client_order_id: str = None) -> dict:
+        """
+        Выставляет рыночный ордер. Рыночный ордер исполняется мгновенно по лучшей текущей цене
+
+        :param ticker: тикер
+        :param side: направление сделки
+        :param quantity: количество
+        :param client_order_id: идентификатор ордера клиента
+
+        :return: :class:`dict`
+        """
+        return self.new_order(self.market_order_params(ticker=ticker, side=side, quantity=quantity,
+                                                       client_order_id=client_order_id))
+
+    def get_order(self, ticker: str, order_id: int = None, client_order_id: str = None) -> dict:
+        """
+        Возвращает состояние ордера по идентификатору площадки или клиента
+
+        :param ticker: тикер
+        :param order_id: идентификатор ордера
+        :param client_order_id: идентификатор ордера клиента
+
+        :return: :class:`dict`
+        """
+        if self.is_future:
+            endpoint = '/fapi/v1/order'
+        else:
+            endpoint = '/api/v3/order'
+        params = {'symbol': ticker}
+        if order_id:
+            params['orderId'] = order_id
+        if client_order_id:
+            params['origClientOrderId'] = client_order_id
 
-        return self.http_request(method_type=method_type, endpoint=endpoint, params=self.sign_params(params)).json()
+        return self.http_request(method_type='GET', endpoint=endpoint, params=params,
+                                 weight=1 if self.is_future else 4, signed=True).json()
 
     def cancel_order(self, ticker: str, order_id: int) -> bool:
         """
@@ -145,27 +267,28 @@ class Binance:
             'orderId': order_id,
         }
         # Отправка запроса
-        response: Response = self.http_request(method_type=method_type, endpoint=endpoint,
-                                               params=self.sign_params(params))
+        response: Response = self.http_request(method_type=method_type, endpoint=endpoint, params=params,
+                                               signed=True)
         # Обработка ответа
         if response.status_code == 200:
             return True
         else:
             return False
 
-    def trailing_stop_order(self, ticker: str, side: str, quantity: float, trailing_delta: float, activation_price: float = None) -> dict:
+    def trailing_stop_params(self, ticker: str, side: str, quantity: float, trailing_delta: float,
+                             activation_price: float = None, client_order_id: str = None) -> dict:
         """
-        Выставляет переменяющийся стоп
+        Возвращает параметры переменяющегося стопа
 
         :param ticker: тикер
         :param side: направление сделки
         :param quantity: количество
-        :param activation_price: цена активации, если не передана то триггером выступает рыночная цена
         :param trailing_delta: размер отступа
+        :param activation_price: цена активации, если не передана то триггером выступает рыночная цена
+        :param client_order_id: идентификатор ордера клиента
 
         :return: :class:`dict`
         """
-        method_type = 'POST'
         params = {
             'symbol': ticker,
             'side': side,
@@ -174,20 +297,129 @@ class Binance:
             'quantity': quantity,
         }
         if self.is_future:
-            endpoint = '/fapi/v1/order'
             params['type'] = 'TRAILING_STOP_MARKET'
             if activation_price:
                 params['activationPrice'] = activation_price
             params['callbackRate'] = trailing_delta
         else:
-            endpoint = '/api/v3/order'
             params['type'] = 'STOP_LOSS_LIMIT'
             if activation_price:
                 params['price'] = activation_price
                 params['stopPrice'] = activation_price
             params['trailingDelta'] = trailing_delta * 100
+        if client_order_id:
+            params['newClientOrderId'] = client_order_id
+        return params
+
+    def trailing_stop_order(self, ticker: str, side: str, quantity: float, trailing_delta: float,
+                            activation_price: float = None, client_order_id: str = None) -> dict:
+        """
+        Выставляет переменяющийся стоп
+
+        :param ticker: тикер
+        :param side: направление сделки
+        :param quantity: количество
+        :param activation_price: цена активации, если не передана то триггером выступает рыночная цена
+        :param trailing_delta: размер отступа
+        :param client_order_id: идентификатор ордера клиента
+
+        :return: :class:`dict`
+        """
+        return self.new_order(self.trailing_stop_params(ticker=ticker, side=side, quantity=quantity,
+                                                        trailing_delta=trailing_delta,
+                                                        activation_price=activation_price,
+                                                        client_order_id=client_order_id))
+
+    def batch_orders_params(self, orders: list[dict]) -> dict:
+        # Список ордеров передается одной строкой JSON, значения - строками
+        return {'batchOrders': json.dumps([{key: str(value) for key, value in order.items()} for order in orders],
+                                          separators=(',', ':'))}
+
+    def batch_orders(self, orders: list[dict]) -> list:
+        """
+        Выставляет до 5 ордеров одним запросом (только фьючерсный рынок)
+
+        :param orders: параметры ордеров (:meth:`market_order_params`, :meth:`trailing_stop_params`)
+
+        :return: :class:`list` ответы по ордерам в том же порядке: ордер или ошибка (`code`, `msg`)
+        """
+        return self.http_request(method_type='POST', endpoint='/fapi/v1/batchOrders',
+                                 params=self.batch_orders_params(orders), weight=5, order=True, signed=True).json()
+
+    def protected_market_order(self, ticker: str, side: str, quantity: float, stop_side: str, stop_quantity: float,
+                               trailing_delta: float, client_order_id: str = None,
+                               stop_client_order_id: str = None) -> tuple[dict, dict]:
+        """
+        Выставляет рыночный ордер входа и защищающий его переменяющийся стоп
+
+        .. Note:: На фьючерсном рынке оба ордера отправляются одним запросом `batchOrders`, поэтому позиция
+        остается без стопа на время одного запроса. На спотовом рынке ордера отправляются последовательно.
+
+        :param ticker: тикер
+        :param side: направление входа
+        :param quantity: количество входа
+        :param stop_side: направление стопа
+        :param stop_quantity: количество стопа
+        :param trailing_delta: размер отступа стопа
+        :param client_order_id: идентификатор ордера входа клиента
+        :param stop_client_order_id: идентификатор стопа клиента
+
+        :return: :class:`tuple` (ответ ордера входа, ответ стопа)
+        """
+        entry = self.market_order_params(ticker=ticker, side=side, quantity=quantity, client_order_id=client_order_id)
+        stop = self.trailing_stop_params(ticker=ticker, side=stop_side, quantity=stop_quantity,
+                                         trailing_delta=trailing_delta, client_order_id=stop_client_order_id)
+        if self.is_future:
+            response = self.batch_orders([entry, stop])
+            if isinstance(response, list) and len(response) == 2:
+                return response[0], response[1]
+            return response, response
+        return self.new_order(entry), self.new_order(stop)
+
+    def get_open_orders(self, ticker: str = None) -> list:
+        """
+        Возвращает открытые ордера по тикеру или по всем тикерам одним запросом
+
+        :param ticker: тикер, если не передан - все открытые ордера аккаунта
+
+        :return: :class:`list`
+        """
+        method_type = 'GET'
+        params = {}
+        if ticker:
+            params['symbol'] = ticker
+        if self.is_future:
+            endpoint = '/fapi/v1/openOrders'
+            weight = 1 if ticker else 40
+        else:
+            endpoint = '/api/v3/openOrders'
+            weight = 6 if ticker else 80
+
+        return self.http_request(method_type=method_type, endpoint=endpoint, params=params, weight=weight,
+                                 signed=True).json()
+
+    def get_server_time(self) -> int:
+        """
+        Возвращает время сервера площадки
 
-        return self.http_request(method_type=method_type, endpoint=endpoint, params=self.sign_params(params)).json()
+        :return: :class:`int` миллисекунды UTC
+        """
+        endpoint = '/fapi/v1/time' if self.is_future else '/api/v3/time'
+        return self.http_request(method_type='GET', endpoint=endpoint).json()['serverTime']
+
+    def get_positions(self, ticker: str = None) -> list:
+        """
+        Возвращает позиции фьючерсного аккаунта по тикеру или по всем тикерам одним запросом
+
+        :param ticker: тикер, если не передан - позиции всех тикеров
+
+        :return: :class:`list` позиций (`symbol`, `positionAmt` - объем со знаком направления, `entryPrice`, ...)
+        """
+        if not self.is_future:
+            raise ValueError('Позиции доступны только на фьючерсном рынке')
+        params = {'symbol': ticker} if ticker else {}
+        return self.http_request(method_type='GET', endpoint='/fapi/v2/positionRisk', params=params, weight=5,
+                                 signed=True).json()
 
     def get_listen_key(self) -> dict:
         """
@@ -199,7 +431,7 @@ class Binance:
         if self.is_future:
             endpoint = '/fapi/v1/listenKey'
         else:
-            endpoint = 'api/v3/userDataStream'
+            endpoint = '/api/v3/userDataStream'
 
         return self.http_request(method_type=method_type, endpoint=endpoint).json()
 
@@ -213,7 +445,7 @@ class Binance:
         if self.is_future:
             endpoint = '/fapi/v1/listenKey'
         else:
-            endpoint = 'api/v3/userDataStream'
+            endpoint = '/api/v3/userDataStream'
 
         params = {'listenKey': listen_key}
         return self.http_request(method_type=method_type, endpoint=endpoint, params=params).json()
@@ -228,7 +460,7 @@ class Binance:
         if self.is_future:
             endpoint = '/fapi/v1/listenKey'
         else:
-            endpoint = 'api/v3/userDataStream'
+            endpoint = '/api/v3/userDataStream'
 
         params = {'listenKey': listen_key}
         return self.http_request(method_type=method_type, endpoint=endpoint, params=params).json()
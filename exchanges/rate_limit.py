@@ -0,0 +1,111 @@
+import re
+from threading import Lock
+import time
+
+# Заголовки ответа Binance со счетчиками использованного лимита, например X-MBX-USED-WEIGHT-1M
+LIMIT_HEADER = re.compile(r'x-mbx-(used-weight|order-count)-(\d+)([smhd])', re.IGNORECASE)
+# Длительность окон счетчиков в секундах
+WINDOW_SECONDS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class RequestBudget:
+    """
+    Локальный учет лимитов запросов торговой площадки
+    """
+    def __init__(self, limits: dict[tuple[str, str], int], reserve: float = 0.1):
+        """
+        Создает объект класса :class:`RequestBudget`.
+
+        .. Note:: Значения счетчиков берутся из заголовков ответов площадки и сбрасываются с началом нового окна.
+        Перед отправкой запроса :meth:`acquire` приостанавливает поток, если запрос выйдет за лимит с учетом резерва,
+        или если площадка вернула 429/418 с заголовком `Retry-After`.
+
+        :param limits: лимиты по счетчикам `(тип, окно)`, например ``('used-weight', '1m'): 2400``
+        :param reserve: доля лимита, которая не расходуется
+        """
+        self.limits = {key: int(limit * (1 - reserve)) for key, limit in limits.items()}
+        # Счетчик - (значение, начало окна)
+        self.counters: dict[tuple[str, str], tuple[int, float]] = {}
+        # Время, до которого запросы запрещены площадкой
+        self.banned_until = 0.0
+        self.lock = Lock()
+
+    @staticmethod
+    def window_start(window: str, now: float) -> float:
+        seconds = int(window[:-1]) * WINDOW_SECONDS[window[-1]]
+        return now - now % seconds
+
+    def used(self, key: tuple[str, str], now: float = None) -> int:
+        """
+        Возвращает значение счетчика в текущем окне
+
+        :return: :class:`int`
+        """
+        now = now or time.time()
+        value, start = self.counters.get(key, (0, 0.0))
+        return value if start == self.window_start(key[1], now) else 0
+
+    def update(self, headers, status_code: int = 200):
+        """
+        Обновляет счетчики по заголовкам ответа
+
+        :param headers: заголовки ответа
+        :param status_code: код ответа
+        """
+        now = time.time()
+        with self.lock:
+            for name, value in headers.items():
+                match = LIMIT_HEADER.fullmatch(name)
+                if match:
+                    window = f"{match.group(2)}{match.group(3).lower()}"
+                    self.counters[(match.group(1).lower(), window)] = (int(value), self.window_start(window, now))
+            if status_code in (418, 429):
+                self.banned_until = max(self.banned_until, now + float(headers.get('Retry-After', 60)))
+
+    def wait_time(self, weight: int = 1, order: bool = False) -> float:
+        """
+        Возвращает время ожидания в секундах до момента, когда запрос уложится в лимиты
+
+        :param weight: вес запроса
+        :param order: запрос выставляет ордер
+
+        :return: :class:`float`
+        """
+        now = time.time()
+        delay = max(self.banned_until - now, 0.0)
+        for key, limit in self.limits.items():
+            cost = weight if key[0] == 'used-weight' else int(order)
+            if cost and self.used(key, now) + cost > limit:
+                window = key[1]
+                seconds = int(window[:-1]) * WINDOW_SECONDS[window[-1]]
+                delay = max(delay, self.window_start(window, now) + seconds - now)
+        return delay
+
+    def try_acquire(self, weight: int = 1, order: bool = False) -> float:
+        """
+        Резервирует стоимость запроса до получения ответа, если он укладывается в лимиты
+
+        :param weight: вес запроса
+        :param order: запрос выставляет ордер
+
+        :return: :class:`float` 0, если запрос можно отправлять, иначе время ожидания в секундах
+        """
+        with self.lock:
+            delay = self.wait_time(weight=weight, order=order)
+            if not delay:
+                now = time.time()
+                for key in self.limits:
+                    cost = weight if key[0] == 'used-weight' else int(order)
+                    if cost:
+                        self.counters[key] = (self.used(key, now) + cost, self.window_start(key[1], now))
+            return delay
+
+    def acquire(self, weight: int = 1, order: bool = False):
+        """
+        Ожидает, пока запрос не уложится в лимиты (:meth:`try_acquire`)
+
+        :param weight: вес запроса
+        :param order: запрос выставляет ордер
+        """
+        while delay := self.try_acquire(weight=weight, order=order):
+            time.sleep(delay)
@@ -1 +1,3 @@
+from .batch import *
 from .ema import*
+from .signal_state import *
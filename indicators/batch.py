@@ -0,0 +1,240 @@
+import numpy
+
+from .ema import StreamingEma, ema_series
+from .signal_state import CrossSignalState
+
+
+class BatchEma:
+    """
+    Потоковые экспоненциальные скользящие многих торговых пар и периодов
+    """
+    def __init__(self, count: int, periods):
+        """
+        Создает объект класса :class:`BatchEma`.
+
+        .. Note:: Значения хранятся в непрерывном массиве ``(count, len(periods))``: строка - торговая пара, колонка -
+        период. Обновление по ценам закрытия всех (или выбранных) пар выполняется одной векторной операцией, поэтому
+        время обновления почти не зависит от количества пар.
+
+        :param count: количество торговых пар
+        :param periods: периоды скользящих
+        """
+        self.periods = numpy.asarray(periods, dtype=numpy.int64)
+        self.multipliers = 2 / (self.periods + 1)
+        # Зафиксированные значения по последней закрытой свече
+        self.values = numpy.full((count, self.periods.shape[0]), numpy.nan)
+
+    def seed(self, row: int, close_prices) -> numpy.ndarray:
+        """
+        Инициализирует значения торговой пары по архиву цен закрытия. Результат совпадает с :func:`ema`
+
+        :param row: индекс торговой пары
+        :param close_prices: массив цен закрытия
+
+        :return: :class:`numpy.ndarray` значения по периодам
+        """
+        self.values[row] = ema_series(close_prices, self.periods)[:, -1]
+        return self.values[row]
+
+    def update(self, close_prices, rows=None) -> numpy.ndarray:
+        """
+        Фиксирует значения по ценам закрытия завершенных свечей
+
+        :param close_prices: цены закрытия по строкам `rows`
+        :param rows: индексы торговых пар, по умолчанию все
+
+        :return: :class:`numpy.ndarray` копия новых значений строк `rows`
+        """
+        if rows is None:
+            self.values += (numpy.asarray(close_prices)[:, None] - self.values) * self.multipliers
+            return self.values.copy()
+        values = self.preview(close_prices, rows)
+        self.values[rows] = values
+        return values
+
+    def preview(self, close_prices, rows=None) -> numpy.ndarray:
+        """
+        Возвращает предварительные значения по текущим ценам, не изменяя зафиксированные значения
+
+        :param close_prices: текущие цены по строкам `rows`
+        :param rows: индексы торговых пар, по умолчанию все
+
+        :return: :class:`numpy.ndarray` ``(len(rows), len(periods))``
+        """
+        values = self.values if rows is None else self.values[rows]
+        return (numpy.asarray(close_prices)[:, None] - values) * self.multipliers + values
+
+
+class BatchCrossSignals:
+    """
+    Сигналы пересечения скользящих многих торговых пар
+    """
+    def __init__(self, short_periods, long_periods, confirmation: int):
+        """
+        Создает объект класса :class:`BatchCrossSignals`.
+
+        .. Note:: Каждая торговая пара (строка) имеет свою пару периодов. Скользящие всех различных периодов хранятся
+        в одном :class:`BatchEma`, строки выбирают свои колонки индексами. Окно подтверждения хранится, как в
+        :class:`CrossSignalState`, счетчиками подряд идущих значений, поэтому проверка всех пар - несколько векторных
+        операций над массивами длины количества пар.
+
+        :param short_periods: период короткой скользящей по торговым парам
+        :param long_periods: период длинной скользящей по торговым парам
+        :param confirmation: количество значений реального времени, подтверждающих направление до пересечения
+        """
+        short_periods = numpy.asarray(short_periods, dtype=numpy.int64)
+        long_periods = numpy.asarray(long_periods, dtype=numpy.int64)
+        periods, columns = numpy.unique(numpy.concatenate((short_periods, long_periods)), return_inverse=True)
+        count = short_periods.shape[0]
+        self.ema = BatchEma(count=count, periods=periods)
+        self.short_columns = columns[:count]
+        self.long_columns = columns[count:]
+        self.rows = numpy.arange(count)
+        self.confirmation = confirmation
+        # Количество подряд идущих значений короткой ниже и выше длинной
+        self.below = numpy.zeros(count, dtype=numpy.int64)
+        self.above = numpy.zeros(count, dtype=numpy.int64)
+
+    def seed(self, row: int, close_prices):
+        """
+        Инициализирует скользящие торговой пары по архиву цен закрытия и заполняет окно подтверждения одинаковыми
+        значениями (:meth:`CrossSignalState.seed`)
+
+        :param row: индекс торговой пары
+        :param close_prices: массив цен закрытия
+        """
+        values = self.ema.seed(row, close_prices)
+        short_value, long_value = values[self.short_columns[row]], values[self.long_columns[row]]
+        self.below[row] = self.confirmation if short_value < long_value else 0
+        self.above[row] = self.confirmation if short_value > long_value else 0
+
+    def pairs(self, values: numpy.ndarray, rows=None) -> tuple[numpy.ndarray, numpy.ndarray]:
+        # Значения короткой и длинной скользящих строк `rows` из значений всех периодов
+        if rows is None:
+            return values[self.rows, self.short_columns], values[self.rows, self.long_columns]
+        positions = numpy.arange(values.shape[0])
+        return values[positions, self.short_columns[rows]], values[positions, self.long_columns[rows]]
+
+    def close(self, close_prices, rows=None):
+        """
+        Фиксирует скользящие по ценам закрытия свечей, закрывшихся одновременно
+
+        :param close_prices: цены закрытия по строкам `rows`
+        :param rows: индексы торговых пар, по умолчанию все
+        """
+        self.ema.update(close_prices, rows)
+
+    def evaluate(self, close_prices, rows=None) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Проверяет сигналы по текущим ценам и добавляет значения реального времени в окна подтверждения
+        (:meth:`EmaCrossOverState.check_signal`)
+
+        :param close_prices: текущие цены по строкам `rows`
+        :param rows: индексы торговых пар, по умолчанию все
+
+        :return: :class:`tuple` (маска сигналов на покупку, маска сигналов на продажу) по строкам `rows`
+        """
+        short_values, long_values = self.pairs(self.ema.preview(close_prices, rows), rows)
+        below = self.below if rows is None else self.below[rows]
+        above = self.above if rows is None else self.above[rows]
+        # Сигнал: все значения окна по одну сторону, текущее - по другую
+        buy = (below >= self.confirmation) & (short_values > long_values)
+        sell = (above >= self.confirmation) & (short_values < long_values)
+        is_below = short_values < long_values
+        is_above = short_values > long_values
+        below = numpy.where(is_below, below + 1, 0)
+        above = numpy.where(is_above, above + 1, 0)
+        # Счетчики изменяются на месте: строки читаются через представления (:class:`BatchSignalState`)
+        if rows is None:
+            self.below[:], self.above[:] = below, above
+        else:
+            self.below[rows], self.above[rows] = below, above
+        return buy, sell
+
+
+class BatchEmaValue:
+    """
+    Скользящая одной торговой пары и периода, хранящаяся в :class:`BatchEma`
+    """
+    def __init__(self, batch: BatchEma, row: int, column: int):
+        """
+        Создает объект класса :class:`BatchEmaValue` с интерфейсом :class:`StreamingEma`.
+
+        .. Note:: Значение не копируется: :attr:`value` читает и изменяет ячейку массива пакета, поэтому потоковые
+        вызовы одной пары и пакетное обновление (:meth:`BatchEma.update`) работают с одним значением. Массив пакета
+        изменяется только на месте, поэтому ячейка адресуется индексом в плоском представлении массива.
+
+        :param batch: скользящие многих торговых пар
+        :param row: индекс торговой пары
+        :param column: индекс периода
+        """
+        self.values = batch.values.reshape(-1)
+        self.index = row * batch.values.shape[1] + column
+        self.period = int(batch.periods[column])
+        self.multiplier = float(batch.multipliers[column])
+
+    @property
+    def value(self) -> float:
+        return self.values.item(self.index)
+
+    @value.setter
+    def value(self, value: float):
+        self.values[self.index] = value
+
+    seed = StreamingEma.seed
+    update = StreamingEma.update
+
+    def preview(self, close_price: float) -> float:
+        # :meth:`StreamingEma.preview` с одним чтением ячейки: вызывается на каждом тике
+        value = self.values.item(self.index)
+        return (close_price - value) * self.multiplier + value
+
+
+class BatchSignalState(CrossSignalState):
+    """
+    Состояние сигнала одной торговой пары, счетчики окна подтверждения которого хранятся в :class:`BatchCrossSignals`
+    """
+    def __init__(self, batch: BatchCrossSignals, row: int, capacity: int):
+        """
+        Создает объект класса :class:`BatchSignalState` с окном подтверждения пакета.
+
+        .. Note:: Счетчики :attr:`below` и :attr:`above` читают и изменяют элементы массивов пакета, поэтому проверка
+        одной пары (:meth:`update`) и пакетная проверка (:meth:`BatchCrossSignals.evaluate`) работают с одним окном.
+        Минимумы и максимумы хранятся, как в :class:`CrossSignalState`. Создание обнуляет счетчики строки, прежнее
+        состояние переносится через :meth:`restore`.
+
+        :param batch: сигналы многих торговых пар
+        :param row: индекс торговой пары
+        :param capacity: количество свечей в окне поиска минимумов и максимумов
+        """
+        self.below_values = batch.below
+        self.above_values = batch.above
+        self.row = row
+        super().__init__(confirmation=batch.confirmation, capacity=capacity)
+
+    @property
+    def below(self) -> int:
+        return self.below_values.item(self.row)
+
+    @below.setter
+    def below(self, value: int):
+        self.below_values[self.row] = value
+
+    @property
+    def above(self) -> int:
+        return self.above_values.item(self.row)
+
+    @above.setter
+    def above(self, value: int):
+        self.above_values[self.row] = value
+
+    # Методы, вызываемые на каждом тике, обращаются к массивам без свойств
+    def update(self, short_value: float, long_value: float):
+        self.below_values[self.row] = self.below_values.item(self.row) + 1 if short_value < long_value else 0
+        self.above_values[self.row] = self.above_values.item(self.row) + 1 if short_value > long_value else 0
+
+    def is_down(self) -> bool:
+        return self.below_values.item(self.row) >= self.confirmation
+
+    def is_up(self) -> bool:
+        return self.above_values.item(self.row) >= self.confirmation
@@ -21,3 +21,94 @@ def ema(close_prices, period):
     # return ema_values
     return ema_values[-1]
 
+
+class StreamingEma:
+    """
+    Потоковая экспоненциальная скользящая средняя
+    """
+    def __init__(self, period: int):
+        """
+        Создает объект класса :class:`StreamingEma`, хранящий текущее значение EMA между вызовами.
+
+        .. Note:: Перед использованием объект необходимо инициализировать историей цен закрытия через
+        :meth:`seed`. Далее каждое обновление выполняется за O(1) вместо полного пересчета :func:`ema`.
+
+        :param period: период скользящей
+        """
+        self.period = period
+        self.multiplier = 2 / (period + 1)
+        # Зафиксированное значение по последней закрытой свече
+        self.value = None
+
+    def seed(self, close_prices) -> float:
+        """
+        Инициализирует значение по архиву цен закрытия. Результат совпадает с :func:`ema`
+
+        :param close_prices: массив цен закрытия
+
+        :return: :class:`float`
+        """
+        self.value = float(ema(close_prices=close_prices, period=self.period))
+        return self.value
+
+    def update(self, close_price: float) -> float:
+        """
+        Фиксирует значение по цене закрытия завершенной свечи
+
+        :param close_price: цена закрытия
+
+        :return: :class:`float`
+        """
+        self.value = (close_price - self.value) * self.multiplier + self.value
+        return self.value
+
+    def preview(self, close_price: float) -> float:
+        """
+        Возвращает предварительное значение по текущей цене незакрытой свечи, не изменяя зафиксированное значение
+
+        :param close_price: текущая цена
+
+        :return: :class:`float`
+        """
+        return (close_price - self.value) * self.multiplier + self.value
+
+
+def ema_series(close_prices, periods):
+    """
+    Векторно рассчитывает полный ряд значений EMA по всей истории цен для одного или нескольких периодов.
+
+    .. Note:: Семантика совпадает с :func:`ema`: значение с индексом ``period - 1`` равно SMA первого периода,
+    значения до него не определены (``nan``). Рекуррентная формула EMA раскрывается параллельным префиксным
+    сканированием: за каждый проход окно суммирования удваивается, поэтому число проходов равно
+    ``log2`` от длины истории и ограничено эффективной памятью самой длинной скользящей.
+
+    :param close_prices: массив цен закрытия
+    :param periods: период скользящей или последовательность периодов
+
+    :return: :class:`numpy.ndarray` одномерный для одного периода, иначе двумерный ``(len(periods), len(close_prices))``
+    """
+    close_prices = numpy.asarray(close_prices, dtype=float)
+    is_scalar = numpy.ndim(periods) == 0
+    periods = numpy.atleast_1d(numpy.asarray(periods, dtype=numpy.int64))
+    length = close_prices.shape[0]
+    if periods.min() < 1 or periods.max() > length:
+        raise ValueError('Период скользящей должен быть в диапазоне от 1 до длины массива цен')
+    multipliers = 2 / (periods + 1)
+    decays = (1 - multipliers)[:, None]
+    indexes = numpy.arange(length)
+    # Слагаемые рекурренты: взвешенная цена после стартового индекса, SMA на стартовом индексе, нули до него
+    values = multipliers[:, None] * close_prices[None, :]
+    seeds = periods - 1
+    values[indexes[None, :] < seeds[:, None]] = 0
+    values[numpy.arange(periods.shape[0]), seeds] = numpy.cumsum(close_prices)[seeds] / periods
+    # Сканирование: после прохода со сдвигом shift каждый элемент содержит сумму 2 * shift последних слагаемых
+    tolerance = numpy.finfo(float).eps / 2
+    shift = 1
+    factors = decays.copy()
+    while shift < length and factors.max() > tolerance:
+        values[:, shift:] += factors * values[:, :-shift]
+        factors *= factors
+        shift *= 2
+    values[indexes[None, :] < seeds[:, None]] = numpy.nan
+
+    return values[0] if is_scalar else values
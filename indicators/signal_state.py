@@ -0,0 +1,108 @@
+# Поля состояния, сохраняемые между запусками
+STATE_FIELDS = ('below', 'above', 'last_low_value', 'low_start', 'low_length', 'last_high_value', 'high_start',
+                'high_length', 'length')
+
+
+class CrossSignalState:
+    """
+    Инкрементальное состояние сигнала пересечения скользящих
+    """
+    def __init__(self, confirmation: int, capacity: int):
+        """
+        Создает объект класса :class:`CrossSignalState`. Все обновления и проверки выполняются за O(1).
+
+        .. Note:: Вместо списка последних ``confirmation`` значений скользящих хранится количество подряд идущих
+        значений, где короткая ниже (выше) длинной: все значения окна ниже тогда и только тогда, когда счетчик не
+        меньше размера окна. Ближайший минимум (максимум) - начало неубывающей (невозрастающей) серии минимумов
+        (максимумов), заканчивающейся на последней свече; серия хранится своим началом и длиной.
+
+        :param confirmation: количество значений, подтверждающих направление до пересечения
+        :param capacity: количество свечей в окне поиска минимумов и максимумов
+        """
+        self.confirmation = confirmation
+        self.capacity = capacity
+        # Количество подряд идущих значений короткой ниже и выше длинной
+        self.below = 0
+        self.above = 0
+        # Последние минимум и максимум, начало и длина их серий
+        self.last_low_value = None
+        self.low_start = None
+        self.low_length = 0
+        self.last_high_value = None
+        self.high_start = None
+        self.high_length = 0
+        # Количество свечей в окне
+        self.length = 0
+
+    def seed(self, short_value: float, long_value: float):
+        """
+        Заполняет окно подтверждения одинаковыми значениями скользящих
+        """
+        self.below = self.confirmation if short_value < long_value else 0
+        self.above = self.confirmation if short_value > long_value else 0
+
+    def state(self) -> dict[str, any]:
+        """
+        Возвращает счетчики и серии для сохранения между запусками
+
+        :return: :class:`dict`
+        """
+        return {name: getattr(self, name) for name in STATE_FIELDS}
+
+    def restore(self, state: dict[str, any]):
+        """
+        Восстанавливает состояние, сохраненное :meth:`state`
+        """
+        for name in STATE_FIELDS:
+            setattr(self, name, state[name])
+
+    def update(self, short_value: float, long_value: float):
+        """
+        Добавляет значения скользящих реального времени в окно подтверждения
+        """
+        self.below = self.below + 1 if short_value < long_value else 0
+        self.above = self.above + 1 if short_value > long_value else 0
+
+    def is_down(self) -> bool:
+        # Все значения окна: короткая ниже длинной
+        return self.below >= self.confirmation
+
+    def is_up(self) -> bool:
+        # Все значения окна: короткая выше длинной
+        return self.above >= self.confirmation
+
+    def push_candle(self, high_price: float, low_price: float):
+        """
+        Добавляет максимум и минимум закрытой свечи
+        """
+        if self.low_length and low_price >= self.last_low_value:
+            self.low_length += 1
+        else:
+            self.low_start, self.low_length = low_price, 1
+        if self.high_length and high_price <= self.last_high_value:
+            self.high_length += 1
+        else:
+            self.high_start, self.high_length = high_price, 1
+        self.last_low_value = low_price
+        self.last_high_value = high_price
+        self.length = min(self.length + 1, self.capacity)
+
+    def extend(self, high_prices, low_prices):
+        for high_price, low_price in zip(high_prices, low_prices):
+            self.push_candle(high_price=float(high_price), low_price=float(low_price))
+
+    def last_low(self) -> float:
+        """
+        Возвращает ближайший минимум или None, если минимумы не убывают на всем окне
+
+        :return: :class:`float`
+        """
+        return self.low_start if self.low_length < self.length else None
+
+    def last_high(self) -> float:
+        """
+        Возвращает ближайший максимум или None, если максимумы не возрастают на всем окне
+
+        :return: :class:`float`
+        """
+        return self.high_start if self.high_length < self.length else None
@@ -0,0 +1,7 @@
+from .aggregation import *
+from .bootstrap import *
+from .clock import *
+from .history import *
+from .klines import *
+from .ring_buffer import *
+from .synthetic import *
@@ -0,0 +1,240 @@
+import logging
+
+import numpy
+
+from .clock import market_clock
+from .history import PAGE_LIMIT, KlineHistory
+from .klines import (CLOSE, CLOSE_TIME, HIGH, INTERVAL_MILLISECONDS, LOW, OPEN, OPEN_TIME, VOLUME, candle_columns,
+                     klines_to_array)
+
+logger = logging.getLogger('app.market_data.aggregation')
+
+# Сдвиг начала интервала относительно 1970-01-01 (четверг): недельные свечи Binance открываются в понедельник
+INTERVAL_OFFSETS = {'1w': 4 * 86_400_000}
+
+
+def interval_ratio(base_interval: str, interval: str) -> int:
+    """
+    Возвращает количество базовых свечей в свече интервала `interval`
+
+    :param base_interval: базовый интервал
+    :param interval: старший интервал
+
+    :return: :class:`int`
+    """
+    step, base_step = INTERVAL_MILLISECONDS[interval], INTERVAL_MILLISECONDS[base_interval]
+    if step % base_step or INTERVAL_OFFSETS.get(interval, 0) % base_step:
+        raise ValueError(f"Интервал {interval} не собирается из свечей {base_interval}")
+    return step // base_step
+
+
+def bucket_open_time(open_time, interval: str):
+    """
+    Возвращает время открытия свечи интервала `interval`, содержащей момент `open_time`
+
+    :param open_time: время в миллисекундах (число или массив)
+    :param interval: интервал
+
+    :return: число или :class:`numpy.ndarray`
+    """
+    step, offset = INTERVAL_MILLISECONDS[interval], INTERVAL_OFFSETS.get(interval, 0)
+    return (open_time - offset) // step * step + offset
+
+
+def aggregate_klines(klines, base_interval: str, interval: str, partial: bool = False) -> numpy.ndarray:
+    """
+    Собирает свечи старшего интервала из закрытых свечей базового интервала
+
+    .. Note:: Границы свечей определяются по времени открытия, поэтому пропуски в базовых свечах не сдвигают
+    последующие свечи. Первая свеча отбрасывается, если базовые свечи начинаются не с ее начала.
+
+    :param klines: базовые свечи (:func:`klines_to_array`)
+    :param base_interval: базовый интервал
+    :param interval: старший интервал
+    :param partial: оставлять последнюю незавершенную свечу
+
+    :return: :class:`numpy.ndarray` ``(количество, 7)``
+    """
+    interval_ratio(base_interval, interval)
+    candles = klines_to_array(klines)
+    if not candles.shape[0]:
+        return numpy.empty((0, CLOSE_TIME + 1))
+    open_times = bucket_open_time(candles[:, OPEN_TIME], interval)
+    starts = numpy.flatnonzero(numpy.diff(open_times, prepend=numpy.nan))
+    ends = numpy.append(starts[1:], candles.shape[0]) - 1
+    result = numpy.empty((starts.shape[0], CLOSE_TIME + 1))
+    result[:, OPEN_TIME] = open_times[starts]
+    result[:, OPEN] = candles[starts, OPEN]
+    result[:, HIGH] = numpy.maximum.reduceat(candles[:, HIGH], starts)
+    result[:, LOW] = numpy.minimum.reduceat(candles[:, LOW], starts)
+    result[:, CLOSE] = candles[ends, CLOSE]
+    result[:, VOLUME] = numpy.add.reduceat(candles[:, VOLUME], starts)
+    result[:, CLOSE_TIME] = result[:, OPEN_TIME] + INTERVAL_MILLISECONDS[interval] - 1
+    if not partial and candles[-1, CLOSE_TIME] < result[-1, CLOSE_TIME]:
+        result = result[:-1]
+    if result.shape[0] and candles[0, OPEN_TIME] != result[0, OPEN_TIME]:
+        result = result[1:]
+    return result
+
+
+class CandleAggregator:
+    """
+    Сборка свечей старших интервалов из потока свечей базового интервала одного тикера
+    """
+    def __init__(self, ticker: str, base_interval: str):
+        """
+        Создает объект класса :class:`CandleAggregator`.
+
+        .. Note:: Для каждого старшего интервала хранится только накопленная по закрытым базовым свечам часть текущей
+        свечи. Каждая базовая свеча (закрытая или текущая) объединяется с ней за O(1) и передается обработчикам
+        интервала в формате данных свечи потока (`k`) с числовыми значениями. Свеча старшего интервала закрывается
+        вместе с последней базовой свечой, а при пропуске базовых свечей - при переходе к следующему интервалу.
+
+        :param ticker: тикер
+        :param base_interval: базовый интервал потока
+        """
+        self.ticker = ticker.upper()
+        self.base_interval = base_interval
+        self.stream = f"{ticker.lower()}@kline_{base_interval}"
+        # Накопленная часть текущей свечи и обработчики по интервалу
+        self.timeframes: dict[str, dict] = {}
+
+    def subscribe(self, interval: str, handler):
+        """
+        Добавляет обработчик свечей интервала `interval`
+
+        :param interval: интервал, кратный базовому
+        :param handler: обработчик данных свечи
+        """
+        if interval not in self.timeframes:
+            interval_ratio(self.base_interval, interval)
+            self.timeframes[interval] = {'handlers': [], 'open_time': None, 'open': None, 'high': -numpy.inf,
+                                         'low': numpy.inf, 'close': None, 'volume': 0.0, 'closed': True}
+        self.timeframes[interval]['handlers'].append(handler)
+
+    def seed(self, klines):
+        """
+        Накапливает закрытые базовые свечи текущих (незавершенных) свечей старших интервалов
+
+        :param klines: последние закрытые базовые свечи (:func:`klines_to_array`)
+        """
+        candles = klines_to_array(klines)
+        if not candles.shape[0]:
+            return
+        for interval, frame in self.timeframes.items():
+            if interval == self.base_interval:
+                continue
+            open_time = bucket_open_time(candles[-1, OPEN_TIME], interval)
+            if candles[-1, CLOSE_TIME] == open_time + INTERVAL_MILLISECONDS[interval] - 1:
+                continue
+            bucket = candles[bucket_open_time(candles[:, OPEN_TIME], interval) == open_time]
+            frame.update(open_time=int(open_time), open=float(bucket[0, OPEN]), high=float(bucket[:, HIGH].max()),
+                         low=float(bucket[:, LOW].min()), close=float(bucket[-1, CLOSE]),
+                         volume=float(bucket[:, VOLUME].sum()), closed=False)
+
+    def handle_kline(self, kline: dict):
+        """
+        Принимает свечу базового потока и передает свечи всех интервалов их обработчикам
+
+        :param kline: данные свечи потока (`k`)
+        """
+        open_time = kline['t']
+        open_price, high_price, low_price = float(kline['o']), float(kline['h']), float(kline['l'])
+        close_price, volume = float(kline['c']), float(kline['v'])
+        for interval, frame in self.timeframes.items():
+            if interval == self.base_interval:
+                for handler in frame['handlers']:
+                    handler(kline)
+                continue
+            step = INTERVAL_MILLISECONDS[interval]
+            bucket = bucket_open_time(open_time, interval)
+            if bucket != frame['open_time']:
+                # Свеча, последняя базовая свеча которой пропущена, закрывается по накопленным значениям
+                if not frame['closed'] and frame['open'] is not None:
+                    self.emit(frame, self.bar(interval, frame['open_time'], frame['open'], frame['high'],
+                                              frame['low'], close=frame['close'], volume=frame['volume'],
+                                              closed=True, kline=kline))
+                frame.update(open_time=bucket, open=None, high=-numpy.inf, low=numpy.inf, volume=0.0, closed=False)
+            bar_open = open_price if frame['open'] is None else frame['open']
+            bar_high = max(frame['high'], high_price)
+            bar_low = min(frame['low'], low_price)
+            closed = kline['x'] and kline['T'] == bucket + step - 1
+            bar = self.bar(interval, bucket, bar_open, bar_high, bar_low, close=close_price,
+                           volume=frame['volume'] + volume, closed=closed, kline=kline)
+            if kline['x']:
+                frame.update(open=bar_open, high=bar_high, low=bar_low, close=close_price,
+                             volume=frame['volume'] + volume, closed=closed)
+            self.emit(frame, bar)
+
+    def bar(self, interval: str, open_time: int, open_price: float, high_price: float,
+            low_price: float, close: float, volume: float, closed: bool, kline: dict) -> dict:
+        bar = {'t': open_time, 'T': open_time + INTERVAL_MILLISECONDS[interval] - 1, 's': self.ticker, 'i': interval,
+               'o': open_price, 'h': high_price, 'l': low_price, 'c': close, 'v': volume, 'x': closed}
+        if 'received_ns' in kline:
+            bar['received_ns'] = kline['received_ns']
+        return bar
+
+    @staticmethod
+    def emit(frame: dict, bar: dict):
+        for handler in frame['handlers']:
+            handler(bar)
+
+
+class AggregatedHistory:
+    """
+    История свечей старших интервалов, собранная из кэша базового интервала
+    """
+    def __init__(self, history: KlineHistory, base_interval: str):
+        """
+        Создает объект класса :class:`AggregatedHistory` с интерфейсом :meth:`KlineHistory.update`.
+
+        .. Note:: Базовые свечи тикера загружаются один раз на глубину самого длинного запрошенного окна и
+        используются всеми интервалами. Недостающие в кэше более ранние свечи загружаются в память без записи в кэш.
+
+        :param history: кэш свечей базового интервала
+        :param base_interval: базовый интервал
+        """
+        self.history = history
+        self.base_interval = base_interval
+        # Загруженные базовые свечи по тикеру
+        self.base: dict[str, numpy.ndarray] = {}
+
+    def base_candles(self, ticker: str, length: int) -> numpy.ndarray:
+        """
+        Возвращает не меньше `length` последних закрытых базовых свечей (если они есть на площадке)
+
+        :param ticker: тикер
+        :param length: количество свечей
+
+        :return: :class:`numpy.ndarray` ``(количество, 7)``
+        """
+        candles = self.base.get(ticker.upper())
+        if candles is not None and candles.shape[0] >= length:
+            return candles
+        candles = klines_to_array(self.history.update(ticker=ticker, interval=self.base_interval, limit=length))
+        if candles.shape[0] < length:
+            step = INTERVAL_MILLISECONDS[self.base_interval]
+            end_time = int(candles[0, OPEN_TIME]) if candles.shape[0] else market_clock.now_ms() // step * step
+            older = self.history.download(ticker, self.base_interval,
+                                          start_time=end_time - (length - candles.shape[0]) * step,
+                                          end_time=end_time - 1)
+            candles = numpy.concatenate((older, candles))
+        self.base[ticker.upper()] = candles
+        return candles
+
+    def update(self, ticker: str, interval: str, limit: int = None, start_time: int = None) -> dict[str, numpy.ndarray]:
+        """
+        Возвращает колонки закрытых свечей интервала `interval` (:meth:`KlineHistory.update`)
+
+        :param ticker: тикер
+        :param interval: интервал, кратный базовому
+        :param limit: минимальное количество свечей
+        :param start_time: не используется, глубина определяется `limit`
+
+        :return: :class:`dict`
+        """
+        ratio = interval_ratio(self.base_interval, interval)
+        candles = self.base_candles(ticker, length=((limit or PAGE_LIMIT) + 1) * ratio)
+        if ratio == 1:
+            return candle_columns(candles)
+        return candle_columns(aggregate_klines(candles, base_interval=self.base_interval, interval=interval))
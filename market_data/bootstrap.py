@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+
+import aiohttp
+import numpy
+
+from .clock import market_clock
+from .history import PAGE_LIMIT, KlineHistory
+from .klines import CLOSE_TIME, INTERVAL_MILLISECONDS, KLINE_COLUMNS, OPEN_TIME, candle_columns
+
+logger = logging.getLogger('app.market_data.bootstrap')
+
+
+class WarmupHistory:
+    """
+    Стартовый архив свечей многих тикеров и интервалов, загруженный одновременными запросами
+    """
+    def __init__(self, history: KlineHistory, cache: bool = False, attempts: int = 3):
+        """
+        Создает объект класса :class:`WarmupHistory` с интерфейсом :meth:`KlineHistory.update`.
+
+        .. Note:: :meth:`fetch` загружает свечи всех пар `(тикер, интервал)` одновременно через асинхронный клиент:
+        страницы одной пары запрашиваются последовательно, разные пары - параллельно, не больше ``concurrency``
+        запросов сразу. Лимит веса запросов соблюдает :class:`RequestBudget` клиента. Ответы разбираются сразу в массивы
+        чисел (:meth:`AsyncBinance.get_candles_array`). При ``cache=True`` загружается только недостающий хвост
+        локального кэша и дописывается в него, иначе свечи хранятся в памяти. Стратегии создаются после загрузки и
+        получают свечи из памяти без запросов.
+
+        :param history: кэш свечей, через клиент которого догружаются пары, отсутствующие в стартовом архиве
+        :param cache: дописывать загруженные свечи в кэш `history`
+        :param attempts: количество попыток запроса страницы
+        """
+        self.history = history
+        self.cache = cache
+        self.attempts = attempts
+        # Колонки загруженных закрытых свечей по (тикер, интервал)
+        self.columns: dict[tuple[str, str], dict[str, numpy.ndarray]] = {}
+
+    async def fetch(self, client, requests: dict[tuple[str, str], int], concurrency: int = 10):
+        """
+        Загружает закрытые свечи всех пар одновременно
+
+        :param client: асинхронный клиент торговой площадки (:class:`AsyncBinance`)
+        :param requests: минимальное количество последних закрытых свечей по `(тикер, интервал)`
+        :param concurrency: максимальное количество одновременных запросов
+        """
+        start = time.monotonic()
+        semaphore = asyncio.Semaphore(concurrency)
+        results = await asyncio.gather(*(self.fetch_one(client, semaphore, ticker, interval, limit)
+                                         for (ticker, interval), limit in requests.items()), return_exceptions=True)
+        # Пары с ошибкой загрузки догружаются при обращении (:meth:`update`)
+        for (ticker, interval), result in zip(requests, results):
+            if isinstance(result, Exception):
+                logger.info(f"{ticker} {interval}: стартовый архив не загружен: {result!r}")
+        logger.info(f"Стартовый архив: пар {len(requests)}, свечей "
+                    f"{sum(columns['open_time'].shape[0] for columns in self.columns.values())} за "
+                    f"{time.monotonic() - start:.2f} с")
+
+    async def fetch_one(self, client, semaphore: asyncio.Semaphore, ticker: str, interval: str, limit: int):
+        step = INTERVAL_MILLISECONDS[interval]
+        cached = self.history.load(ticker, interval) if self.cache else None
+        if cached is not None and cached['open_time'].shape[0]:
+            start_time = int(cached['open_time'][-1]) + step
+        else:
+            # На одну свечу больше: последняя свеча еще не закрыта
+            start_time = (market_clock.now_ms() // step - limit) * step
+        candles = await self.fetch_candles(client, semaphore, ticker, interval, start_time=start_time)
+        if self.cache:
+            self.history.append(ticker, interval, candles)
+            self.columns[(ticker.upper(), interval)] = self.history.load(ticker, interval)
+        else:
+            self.columns[(ticker.upper(), interval)] = candle_columns(candles)
+
+    async def fetch_candles(self, client, semaphore: asyncio.Semaphore, ticker: str, interval: str,
+                            start_time: int) -> numpy.ndarray:
+        # Асинхронный аналог :meth:`KlineHistory.download`
+        now = market_clock.now_ms()
+        pages = []
+        while start_time < now:
+            page = await self.get_page(client, semaphore, ticker, interval, start_time=start_time, end_time=now)
+            if not page.shape[0]:
+                break
+            pages.append(page)
+            start_time = int(page[-1, OPEN_TIME]) + INTERVAL_MILLISECONDS[interval]
+            if page.shape[0] < PAGE_LIMIT:
+                break
+        if not pages:
+            return numpy.empty((0, len(KLINE_COLUMNS)))
+        candles = numpy.concatenate(pages)
+        return candles[candles[:, CLOSE_TIME] < now]
+
+    async def get_page(self, client, semaphore: asyncio.Semaphore, ticker: str, interval: str, start_time: int,
+                       end_time: int) -> numpy.ndarray:
+        for attempt in range(1, self.attempts + 1):
+            try:
+                async with semaphore:
+                    return await client.get_candles_array(ticker=ticker, interval=interval, start_time=start_time,
+                                                          end_time=end_time, limit=PAGE_LIMIT)
+            except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as error:
+                logger.info(f"{ticker} {interval}: ошибка загрузки свечей ({attempt}/{self.attempts}): {error!r}")
+                if attempt == self.attempts:
+                    raise
+                await asyncio.sleep(attempt)
+
+    def update(self, ticker: str, interval: str, limit: int = None, start_time: int = None) -> dict[str, numpy.ndarray]:
+        """
+        Возвращает колонки загруженных свечей (:meth:`KlineHistory.update`). Пары, отсутствующие в стартовом
+        архиве, загружаются через `history`
+
+        :param ticker: тикер
+        :param interval: интервал свечей
+        :param limit: минимальное количество последних свечей
+        :param start_time: начало истории для пустого кэша в миллисекундах UTC
+
+        :return: :class:`dict`
+        """
+        columns = self.columns.get((ticker.upper(), interval))
+        if columns is None:
+            if self.cache:
+                return self.history.update(ticker=ticker, interval=interval, limit=limit, start_time=start_time)
+            step = INTERVAL_MILLISECONDS[interval]
+            columns = candle_columns(self.history.download(ticker, interval, start_time=(
+                market_clock.now_ms() // step - (limit or PAGE_LIMIT)) * step))
+            self.columns[(ticker.upper(), interval)] = columns
+        return columns
+
+    def download(self, ticker: str, interval: str, start_time: int, end_time: int = None) -> numpy.ndarray:
+        """
+        Загружает закрытые свечи за произвольный период (:meth:`KlineHistory.download`)
+
+        :return: :class:`numpy.ndarray` ``(количество, 7)``
+        """
+        return self.history.download(ticker, interval, start_time=start_time, end_time=end_time)
@@ -0,0 +1,48 @@
+import logging
+import time
+
+logger = logging.getLogger('app.market_data.clock')
+
+
+class MarketClock:
+    """
+    Время площадки для отбора закрытых свечей и расчета начала истории
+    """
+    def __init__(self):
+        """
+        Создает объект класса :class:`MarketClock`.
+
+        .. Note:: Время площадки - локальное время со сдвигом, измеренным :meth:`sync` по времени сервера. На площадке
+        сдвиг равен расхождению локальных часов. У локальной имитации (:class:`SimulatedExchange`) свечи проигрываются
+        быстрее реального времени, и сдвиг переносит локальные часы на время имитации в момент синхронизации. Время
+        имитации идет быстрее, поэтому после синхронизации часы отстают от него, и отбор закрытых свечей остается
+        консервативным (незакрытая свеча не считается закрытой). Подключения синхронизируют часы при каждом запуске.
+        """
+        self.offset_ms = 0
+
+    def now_ms(self) -> int:
+        """
+        Возвращает текущее время площадки
+
+        :return: :class:`int` миллисекунды UTC
+        """
+        return int(time.time() * 1000) + self.offset_ms
+
+    def sync(self, client) -> int:
+        """
+        Измеряет сдвиг по времени сервера площадки (середина интервала запроса)
+
+        :param client: клиент торговой площадки (:meth:`Binance.get_server_time`)
+
+        :return: :class:`int` сдвиг в миллисекундах
+        """
+        sent = time.time()
+        server_time = client.get_server_time()
+        received = time.time()
+        self.offset_ms = server_time - int((sent + received) * 500)
+        logger.info(f"Сдвиг часов площадки: {self.offset_ms} мс")
+        return self.offset_ms
+
+
+# Общие часы площадки процесса
+market_clock = MarketClock()
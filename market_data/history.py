@@ -0,0 +1,130 @@
+import logging
+import os
+
+import numpy
+
+from constants import KLINES_CACHE_DIR
+from .clock import market_clock
+from .klines import CLOSE_TIME, INTERVAL_MILLISECONDS, KLINE_COLUMNS, OPEN_TIME, klines_to_array
+
+logger = logging.getLogger('app.market_data.history')
+
+# Максимальное количество свечей в одном запросе
+PAGE_LIMIT = 1000
+# Тип хранения колонок на диске
+COLUMN_DTYPE = numpy.dtype('<f8')
+
+
+class KlineHistory:
+    """
+    Локальный кэш исторических свечей
+    """
+    def __init__(self, client, root: str = KLINES_CACHE_DIR, is_future: bool = None):
+        """
+        Создает объект класса :class:`KlineHistory`.
+
+        .. Note:: Свечи хранятся по тикеру и интервалу в колоночном виде: каждая колонка :data:`KLINE_COLUMNS` - отдельный
+        файл чисел float64, в который только дописываются новые свечи. Файлы читаются через :class:`numpy.memmap`
+        без копирования и преобразования строк.
+
+        :param client: клиент торговой площадки (:class:`Binance`)
+        :param root: корневой каталог кэша
+        :param is_future: рынок кэша без клиента (только чтение через :meth:`load`)
+        """
+        self.client = client
+        if client is not None:
+            is_future = client.is_future
+        self.root = os.path.join(root, 'futures' if is_future else 'spot')
+
+    def path(self, ticker: str, interval: str) -> str:
+        return os.path.join(self.root, ticker.upper(), interval)
+
+    def load(self, ticker: str, interval: str) -> dict[str, numpy.ndarray]:
+        """
+        Возвращает закэшированные свечи в виде отображенных в память колонок
+
+        :param ticker: тикер
+        :param interval: интервал свечей
+
+        :return: :class:`dict` имя колонки - :class:`numpy.ndarray`
+        """
+        path = self.path(ticker, interval)
+        files = [os.path.join(path, f"{name}.f64") for name in KLINE_COLUMNS]
+        # Колонки дописываются по очереди, поэтому при прерванной записи берется общая длина
+        length = min(os.path.getsize(file) if os.path.exists(file) else 0 for file in files) // COLUMN_DTYPE.itemsize
+        if not length:
+            return {name: numpy.empty(0, dtype=COLUMN_DTYPE) for name in KLINE_COLUMNS}
+        return {name: numpy.memmap(file, dtype=COLUMN_DTYPE, mode='r', shape=(length,))
+                for name, file in zip(KLINE_COLUMNS, files)}
+
+    def append(self, ticker: str, interval: str, candles: numpy.ndarray):
+        """
+        Дописывает свечи в конец кэша
+
+        :param ticker: тикер
+        :param interval: интервал свечей
+        :param candles: массив :func:`klines_to_array`
+        """
+        if not candles.shape[0]:
+            return
+        path = self.path(ticker, interval)
+        os.makedirs(path, exist_ok=True)
+        length = self.load(ticker, interval)['open_time'].shape[0]
+        for index, name in enumerate(KLINE_COLUMNS):
+            with open(os.path.join(path, f"{name}.f64"), 'r+b' if length else 'wb') as file:
+                file.seek(length * COLUMN_DTYPE.itemsize)
+                file.truncate()
+                file.write(numpy.ascontiguousarray(candles[:, index], dtype=COLUMN_DTYPE).tobytes())
+
+    def download(self, ticker: str, interval: str, start_time: int, end_time: int = None) -> numpy.ndarray:
+        """
+        Загружает закрытые свечи за произвольный период, постранично сдвигая `startTime`
+
+        :param ticker: тикер
+        :param interval: интервал свечей
+        :param start_time: начало периода в миллисекундах UTC
+        :param end_time: окончание периода в миллисекундах UTC, по умолчанию текущее время
+
+        :return: :class:`numpy.ndarray` ``(количество, 7)``
+        """
+        now = market_clock.now_ms()
+        end_time = min(end_time or now, now)
+        pages = []
+        while start_time < end_time:
+            candles = self.client.get_candles(ticker=ticker, interval=interval, start_time=start_time,
+                                              end_time=end_time, limit=PAGE_LIMIT)
+            if not candles:
+                break
+            page = klines_to_array(candles)
+            pages.append(page)
+            start_time = int(page[-1, OPEN_TIME]) + INTERVAL_MILLISECONDS[interval]
+            if page.shape[0] < PAGE_LIMIT:
+                break
+        if not pages:
+            return numpy.empty((0, len(KLINE_COLUMNS)))
+        candles = numpy.concatenate(pages)
+        # Незакрытая свеча в кэш не попадает
+        return candles[candles[:, CLOSE_TIME] < now]
+
+    def update(self, ticker: str, interval: str, limit: int = None, start_time: int = None) -> dict[str, numpy.ndarray]:
+        """
+        Дозагружает недостающий хвост истории и возвращает колонки кэша.
+        Для пустого кэша загрузка начинается со `start_time` или с ``limit`` свечей назад
+
+        :param ticker: тикер
+        :param interval: интервал свечей
+        :param limit: минимальное количество последних свечей для пустого кэша
+        :param start_time: начало истории для пустого кэша в миллисекундах UTC
+
+        :return: :class:`dict`
+        """
+        cached = self.load(ticker, interval)
+        step = INTERVAL_MILLISECONDS[interval]
+        if cached['open_time'].shape[0]:
+            start_time = int(cached['open_time'][-1]) + step
+        elif start_time is None:
+            start_time = (market_clock.now_ms() // step - (limit or PAGE_LIMIT)) * step
+        candles = self.download(ticker, interval, start_time=start_time)
+        self.append(ticker, interval, candles)
+        logger.info(f"{ticker} {interval}: загружено свечей {candles.shape[0]}")
+        return self.load(ticker, interval)
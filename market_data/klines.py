@@ -0,0 +1,93 @@
+import numpy
+
+# Индексы колонок свечи в формате ответа Binance (klines)
+OPEN_TIME, OPEN, HIGH, LOW, CLOSE, VOLUME, CLOSE_TIME = range(7)
+# Имена колонок свечи в том же порядке
+KLINE_COLUMNS = ('open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time')
+
+# Длительность интервалов свечей в миллисекундах. Месячный интервал Binance '1M' не поддерживается: длительность
+# месяца переменная, а кэш, сборка свечей и проверка пропусков рассчитаны на постоянный шаг (:func:`check_interval`)
+INTERVAL_MILLISECONDS = {
+    '1s': 1000,
+    '1m': 60_000,
+    '3m': 180_000,
+    '5m': 300_000,
+    '15m': 900_000,
+    '30m': 1_800_000,
+    '1h': 3_600_000,
+    '2h': 7_200_000,
+    '4h': 14_400_000,
+    '6h': 21_600_000,
+    '8h': 28_800_000,
+    '12h': 43_200_000,
+    '1d': 86_400_000,
+    '3d': 259_200_000,
+    '1w': 604_800_000,
+}
+
+
+def check_interval(interval: str) -> str:
+    """
+    Проверяет, что интервал свечей поддерживается (:data:`INTERVAL_MILLISECONDS`)
+
+    :param interval: интервал свечей
+
+    :return: :class:`str` интервал
+    """
+    if interval == '1M':
+        raise ValueError('Интервал 1M не поддерживается: длительность месяца переменная')
+    if interval not in INTERVAL_MILLISECONDS:
+        raise ValueError(f"Неизвестный интервал {interval!r}, допустимые: {', '.join(INTERVAL_MILLISECONDS)}")
+    return interval
+
+
+def klines_to_array(klines) -> numpy.ndarray:
+    """
+    Преобразует список свечей в формате :meth:`Binance.get_candles` в массив чисел с плавающей точкой
+
+    :param klines: список свечей, готовый числовой массив или словарь колонок (:func:`candle_columns`)
+
+    :return: :class:`numpy.ndarray` ``(количество, 7)``: время открытия, OHLCV, время закрытия
+    """
+    if isinstance(klines, dict):
+        return numpy.column_stack([klines[name] for name in KLINE_COLUMNS]).astype(float, copy=False)
+    if isinstance(klines, numpy.ndarray) and klines.dtype.kind == 'f':
+        return klines[:, :CLOSE_TIME + 1]
+    return numpy.array([kline[:CLOSE_TIME + 1] for kline in klines], dtype=float)
+
+
+def klines_from_json(body) -> numpy.ndarray:
+    """
+    Разбирает тело ответа klines площадки сразу в массив чисел с плавающей точкой, без создания списков строк
+
+    .. Note:: Все поля свечи Binance числовые (часть передается строками), поэтому после удаления скобок и кавычек
+    тело - последовательность чисел через запятую, которая разбирается :func:`numpy.fromstring` за один вызов.
+
+    :param body: тело ответа (:class:`bytes` или :class:`str`)
+
+    :return: :class:`numpy.ndarray` ``(количество, 7)``: время открытия, OHLCV, время закрытия
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    end = body.find(b']')
+    if end < 0 or not body[:end].strip(b' [\r\n\t'):
+        return numpy.empty((0, CLOSE_TIME + 1))
+    # Количество полей свечи по первой строке
+    width = body[:end].count(b',') + 1
+    values = numpy.fromstring(body.translate(None, b'[]"'), sep=',')
+    return values.reshape(-1, width)[:, :CLOSE_TIME + 1]
+
+
+def candle_columns(klines) -> dict[str, numpy.ndarray]:
+    """
+    Возвращает колонки свечей по именам :data:`KLINE_COLUMNS`. Для числовых массивов и отображенных в память
+    колонок кэша копирование не выполняется
+
+    :param klines: список свечей, числовой массив или словарь колонок
+
+    :return: :class:`dict`
+    """
+    if isinstance(klines, dict):
+        return klines
+    array = klines_to_array(klines)
+    return {name: array[:, index] for index, name in enumerate(KLINE_COLUMNS)}
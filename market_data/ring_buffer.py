@@ -0,0 +1,102 @@
+import numpy
+
+# Порядок колонок в буфере свечей
+CANDLE_COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class CandleBuffer:
+    """
+    Кольцевой буфер свечей фиксированной емкости
+    """
+    def __init__(self, capacity: int):
+        """
+        Создает объект класса :class:`CandleBuffer` с заранее выделенной памятью под ``capacity`` свечей.
+
+        .. Note:: Каждое значение записывается дважды: в ячейку ``i`` и в ее зеркало ``i + capacity``. Благодаря этому
+        упорядоченное окно всегда лежит в памяти непрерывно и возвращается срезом без копирования. Ячейка сразу за
+        окном свободна до следующей записи и используется как слот текущей (незакрытой) свечи.
+
+        :param capacity: количество хранимых свечей
+        """
+        self.capacity = capacity
+        self.columns = {name: index for index, name in enumerate(CANDLE_COLUMNS)}
+        self.storage = numpy.zeros((len(CANDLE_COLUMNS), 2 * capacity), dtype=float)
+        # Общее количество добавленных свечей
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def _end(self) -> int:
+        # Индекс (не включительно) конца упорядоченного окна в зеркальной половине хранилища
+        return self.count % self.capacity + self.capacity
+
+    def push(self, open_price: float, high_price: float, low_price: float, close_price: float, volume: float = 0.0):
+        """
+        Добавляет закрытую свечу, вытесняя самую старую при заполненном буфере
+        """
+        slot = self.count % self.capacity
+        mirror = slot + self.capacity
+        storage = self.storage
+        storage[0, slot] = storage[0, mirror] = open_price
+        storage[1, slot] = storage[1, mirror] = high_price
+        storage[2, slot] = storage[2, mirror] = low_price
+        storage[3, slot] = storage[3, mirror] = close_price
+        storage[4, slot] = storage[4, mirror] = volume
+        self.count += 1
+
+    def extend(self, candles):
+        """
+        Добавляет массив закрытых свечей в порядке колонок :data:`CANDLE_COLUMNS`
+
+        :param candles: двумерный массив ``(количество, колонки)``
+        """
+        candles = numpy.asarray(candles, dtype=float)[-self.capacity:]
+        for candle in candles:
+            self.push(*candle)
+
+    def clear(self):
+        """
+        Удаляет все свечи без освобождения памяти
+        """
+        self.count = 0
+
+    def window(self) -> numpy.ndarray:
+        """
+        Возвращает копию закрытых свечей в порядке колонок :data:`CANDLE_COLUMNS` (для :meth:`extend`)
+
+        :return: :class:`numpy.ndarray` ``(количество, колонки)``
+        """
+        end = self._end()
+        return self.storage[:, end - len(self):end].T.copy()
+
+    def set_live(self, column: str, value: float):
+        """
+        Записывает значение текущей незакрытой свечи в слот за окном, не затрагивая закрытые свечи
+
+        :param column: имя колонки
+        :param value: значение
+        """
+        self.storage[self.columns[column], self._end()] = value
+
+    def view(self, column: str) -> numpy.ndarray:
+        """
+        Возвращает упорядоченное (от старой к новой) окно закрытых свечей без копирования
+
+        :param column: имя колонки
+
+        :return: :class:`numpy.ndarray`
+        """
+        end = self._end()
+        return self.storage[self.columns[column], end - len(self):end]
+
+    def live_view(self, column: str) -> numpy.ndarray:
+        """
+        Возвращает окно закрытых свечей с текущей незакрытой свечой в конце без копирования
+
+        :param column: имя колонки
+
+        :return: :class:`numpy.ndarray`
+        """
+        end = self._end()
+        return self.storage[self.columns[column], end - len(self):end + 1]
@@ -0,0 +1,30 @@
+import time
+
+import numpy
+
+
+def synthetic_klines(length: int, interval_ms: int = 60_000, seed: int = 0, end_time: int = None,
+                     base_price: float = 3000) -> list[list]:
+    """
+    Формирует список закрытых свечей в формате ответа Binance со случайным блужданием цены
+
+    :param length: количество свечей
+    :param interval_ms: длительность свечи в миллисекундах
+    :param seed: начальное значение генератора
+    :param end_time: время открытия последней свечи, по умолчанию последняя закрытая минута
+    :param base_price: цена последней свечи
+
+    :return: :class:`list`
+    """
+    generator = numpy.random.default_rng(seed)
+    end_time = end_time or (int(time.time() * 1000) // interval_ms - 1) * interval_ms
+    closes = numpy.cumsum(generator.normal(0, 1, length))
+    closes += base_price - closes[-1]
+    opens = numpy.concatenate(([closes[0]], closes[:-1]))
+    highs = numpy.maximum(opens, closes) + generator.random(length)
+    lows = numpy.minimum(opens, closes) - generator.random(length)
+    volumes = generator.random(length) * 100
+    start_time = end_time - (length - 1) * interval_ms
+    return [[start_time + index * interval_ms, f"{opens[index]:.2f}", f"{highs[index]:.2f}", f"{lows[index]:.2f}",
+             f"{closes[index]:.2f}", f"{volumes[index]:.3f}", start_time + (index + 1) * interval_ms - 1]
+            for index in range(length)]
@@ -0,0 +1,196 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+from threading import Thread, Timer
+import time
+
+logger = logging.getLogger('app.monitoring.latency')
+
+# Количество бит точности внутри каждой степени двойки (16 интервалов, погрешность не более 6%)
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+# Количество интервалов: значения до 2^63 наносекунд
+BUCKETS = (64 - SUB_BUCKET_BITS) * SUB_BUCKETS
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек с логарифмически-линейными интервалами (по принципу HDR Histogram)
+    """
+    def __init__(self):
+        """
+        Создает объект класса :class:`LatencyHistogram`. Запись значения - вычисление индекса по старшим битам и
+        увеличение счетчика, без блокировок и выделения памяти. При одновременной записи из нескольких потоков
+        отдельные значения могут быть потеряны, что допустимо для статистики.
+        """
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def index(value: int) -> int:
+        if value < 2 * SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return shift * SUB_BUCKETS + (value >> shift)
+
+    @staticmethod
+    def value_at(index: int) -> int:
+        # Середина интервала по его индексу
+        if index < 2 * SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        return ((index - shift * SUB_BUCKETS) << shift) + (1 << shift) // 2
+
+    def record(self, value: int):
+        """
+        Записывает значение задержки в наносекундах
+        """
+        if value < 0:
+            value = 0
+        self.counts[self.index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent: float) -> int:
+        """
+        Возвращает значение перцентиля в наносекундах
+
+        :param percent: перцентиль от 0 до 100
+
+        :return: :class:`int`
+        """
+        if not self.count:
+            return 0
+        threshold = self.count * percent / 100
+        accumulated = 0
+        for index, count in enumerate(self.counts):
+            accumulated += count
+            if count and accumulated >= threshold:
+                return min(self.value_at(index), self.max)
+        return self.max
+
+
+class LatencyMetrics:
+    """
+    Набор гистограмм задержек по стадиям обработки и счетчиков пропускной способности
+    """
+    def __init__(self):
+        self.stages: dict[str, LatencyHistogram] = {}
+        self.counters: dict[str, int] = {}
+        self.enabled = True
+        # Значения счетчиков при предыдущем выводе в лог для расчета пропускной способности
+        self.dumped_counters: dict[str, int] = {}
+        self.dumped_at = time.monotonic()
+
+    @staticmethod
+    def now() -> int:
+        # Монотонная отметка времени в наносекундах
+        return time.perf_counter_ns()
+
+    def record(self, stage: str, value: int):
+        """
+        Записывает задержку стадии в наносекундах
+        """
+        if self.enabled:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = LatencyHistogram()
+            histogram.record(value)
+
+    def since(self, stage: str, start: int):
+        """
+        Записывает задержку стадии от отметки ``start`` (:meth:`now`) до текущего момента
+        """
+        if self.enabled:
+            self.record(stage, time.perf_counter_ns() - start)
+
+    def count(self, name: str, value: int = 1):
+        """
+        Увеличивает счетчик событий
+        """
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        Возвращает p50, p99, максимум (в микросекундах) и количество значений по каждой стадии
+
+        :return: :class:`dict`
+        """
+        return {stage: {'p50': histogram.percentile(50) / 1000,
+                        'p99': histogram.percentile(99) / 1000,
+                        'max': histogram.max / 1000,
+                        'count': histogram.count}
+                for stage, histogram in list(self.stages.items())}
+
+    def render(self) -> str:
+        """
+        Возвращает метрики в текстовом формате Prometheus
+
+        :return: :class:`str`
+        """
+        lines = ['# TYPE ema_latency_microseconds summary']
+        for stage, values in self.summary().items():
+            for quantile, key in (('0.5', 'p50'), ('0.99', 'p99'), ('1', 'max')):
+                lines.append(f'ema_latency_microseconds{{stage="{stage}",quantile="{quantile}"}} {values[key]}')
+            lines.append(f'ema_latency_microseconds_count{{stage="{stage}"}} {values["count"]}')
+        lines.append('# TYPE ema_events_total counter')
+        for name, value in list(self.counters.items()):
+            lines.append(f'ema_events_total{{name="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def dump(self):
+        """
+        Выводит в лог перцентили стадий и пропускную способность с предыдущего вывода
+        """
+        now = time.monotonic()
+        elapsed = max(now - self.dumped_at, 1e-9)
+        for stage, values in self.summary().items():
+            logger.info(f"{stage}: p50={values['p50']:.1f}мкс p99={values['p99']:.1f}мкс max={values['max']:.1f}мкс "
+                        f"n={values['count']}")
+        for name, value in list(self.counters.items()):
+            logger.info(f"{name}: {(value - self.dumped_counters.get(name, 0)) / elapsed:.1f}/с")
+        self.dumped_counters = dict(self.counters)
+        self.dumped_at = now
+
+    def start_dump(self, interval: float = 60):
+        """
+        Запускает периодический вывод метрик в лог
+        """
+        self.dump()
+        timer = Timer(interval=interval, function=self.start_dump, args=(interval,))
+        timer.daemon = True
+        timer.start()
+
+    def start_server(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """
+        Запускает локальный http сервер, отдающий :meth:`render` по любому пути
+
+        :param port: порт
+        :param host: адрес
+
+        :return: :class:`ThreadingHTTPServer`
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Общий набор метрик процесса
+metrics = LatencyMetrics()
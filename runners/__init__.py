@@ -0,0 +1,2 @@
+from .multi_symbol import *
+from .supervisor import *
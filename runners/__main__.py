@@ -0,0 +1,37 @@
+import argparse
+from functools import partial
+import logging
+
+from .supervisor import Supervisor, load_symbols
+
+LOG_FORMAT = '%(asctime)s\t%(processName)s\t%(message)s'
+
+
+def main(arguments: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Запуск стратегий многих торговых пар в нескольких процессах')
+    parser.add_argument('config', help='файл JSON со списком параметров торговых пар')
+    parser.add_argument('--workers', type=int, default=None, help='количество процессов, по умолчанию по ядрам')
+    parser.add_argument('--future', action='store_true', help='торговля на фьючерсном рынке')
+    parser.add_argument('--cache', action='store_true', help='стартовый архив свечей через локальный кэш')
+    parser.add_argument('--snapshot', action='store_true', help='снимки состояния для быстрого перезапуска')
+    parser.add_argument('--base-interval', default=None, help='базовый интервал потока свечей тикера')
+    parser.add_argument('--journal', default=None, help='файл журнала торговых событий (по шардам)')
+    parser.add_argument('--record', default=None, help='файл журнала сырых кадров (по шардам)')
+    parser.add_argument('--metrics-port', type=int, default=None, help='порт метрик первого шарда')
+    parser.add_argument('--report-interval', type=float, default=10.0, help='период отчетов шардов, секунды')
+    parser.add_argument('--restart-delay', type=float, default=5.0, help='задержка перезапуска шарда, секунды')
+    options = parser.parse_args(arguments)
+
+    initializer = partial(logging.basicConfig, level=logging.INFO, format=LOG_FORMAT, datefmt='%H:%M:%S')
+    initializer()
+    supervisor = Supervisor(symbols=load_symbols(options.config), workers=options.workers, future=options.future,
+                            report_interval=options.report_interval, restart_delay=options.restart_delay,
+                            initializer=initializer, cache=options.cache, snapshot=options.snapshot,
+                            base_interval=options.base_interval, journal_path=options.journal,
+                            record_path=options.record, metrics_port=options.metrics_port)
+    supervisor.run()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
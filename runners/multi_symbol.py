@@ -0,0 +1,215 @@
+import asyncio
+import logging
+from threading import Thread
+import traceback
+
+from websocket import WebSocketApp
+
+from events import EventJournal, EventPipeline, FrameRecorder, StreamIngest
+from exchanges import AsyncBinance, Binance
+from keys import API_KEY, SECRET_KEY
+from market_data import (AggregatedHistory, CandleAggregator, KlineHistory, WarmupHistory, check_interval,
+                         interval_ratio, market_clock)
+from monitoring import metrics
+from strategies import (BatchSignals, EmaCrossOverState, ListenKeyMixin, StateSnapshot, close_session, snapshot_path,
+                        snapshot_writer, stream_url)
+
+logger = logging.getLogger('app.runners.multi_symbol')
+
+
+class MultiSymbolRunner(ListenKeyMixin, WebSocketApp):
+    def __init__(self, symbols: list[dict], future: bool = False, cache: bool = False, metrics_port: int = None,
+                 metrics_interval: float = None, record_path: str = None, snapshot: bool = False,
+                 journal_path: str = None, base_interval: str = None, listen_key: str = None):
+        """
+        Запуск стратегии пересечения скользящих по многим торговым парам через одно подключение.
+
+        .. Note:: Все потоки свечей `<symbol>@kline_<interval>` и один поток пользовательских данных передаются в одном
+        объединенном подключении. Клиенты, цикл событий, ключ потока и таймер его продления общие, поэтому количество
+        соединений и потоков не растет с количеством торговых пар. Сообщения направляются в
+        :class:`EmaCrossOverState` по имени потока, обновления ордеров - по тикеру и идентификатору ордера.
+        Стартовые архивы всех пар загружаются одновременно с ключом потока до создания состояний
+        (:class:`WarmupHistory`), поэтому время запуска почти не растет с количеством пар. Свечи всех состояний одного
+        интервала закрываются и проверяются одним пакетом (:class:`BatchSignals`).
+
+        :param symbols: параметры :class:`EmaCrossOverState` по каждой паре `(ticker, interval, accuracy, short_ema,
+            long_ema, quantity)`
+        :param future: торговля на фьючерсном рынке
+        :param cache: загружать стартовый архив свечей через локальный кэш :class:`KlineHistory`
+        :param metrics_port: порт локального http сервера метрик задержек
+        :param metrics_interval: период вывода метрик задержек в лог в секундах
+        :param record_path: файл журнала сырых кадров потока (:class:`FrameRecorder`)
+        :param snapshot: сохранять снимки состояния и восстанавливаться из них при перезапуске (:class:`StateSnapshot`)
+        :param journal_path: файл журнала торговых событий (:class:`EventJournal`)
+        :param base_interval: базовый интервал: по каждому тикеру подписывается один поток свечей этого интервала, а
+            свечи интервалов стратегий собираются из него (:class:`CandleAggregator`). Стартовый архив всех интервалов
+            собирается из кэша базовых свечей (:class:`AggregatedHistory`)
+        :param listen_key: ключ потока пользовательских данных, который получает и продлевает владелец вне
+            подключения (:class:`Supervisor`). Без него ключ получается, продлевается и закрывается подключением
+        """
+        # Журнал сырых кадров для воспроизведения
+        self.recorder = FrameRecorder(path=record_path) if record_path else None
+        # Журнал сигналов, ордеров и исполнений
+        self.journal = EventJournal(path=journal_path) if journal_path else None
+        # Метрики задержек
+        if metrics_port:
+            metrics.start_server(port=metrics_port)
+        if metrics_interval:
+            metrics.start_dump(interval=metrics_interval)
+        # Общие клиенты и цикл событий
+        self.client = Binance(api_key=API_KEY, secret_key=SECRET_KEY, is_future=future)
+        self.async_client = AsyncBinance(api_key=API_KEY, secret_key=SECRET_KEY, is_future=future)
+        # Часы площадки для отбора закрытых свечей стартового архива
+        market_clock.sync(self.client)
+        self.loop = asyncio.new_event_loop()
+        Thread(target=self.loop.run_forever, daemon=True).start()
+        # Стартовый архив всех пар загружается одновременно до создания стратегий, по базовому интервалу - на
+        # глубину самого длинного окна тикера
+        warmup = WarmupHistory(history=KlineHistory(client=self.client), cache=cache or bool(base_interval))
+        depths = {}
+        if base_interval:
+            check_interval(base_interval)
+        for parameters in symbols:
+            ticker = parameters['ticker'].upper()
+            check_interval(parameters['interval'])
+            if base_interval:
+                key = (ticker, base_interval)
+                depth = (parameters['accuracy'] + 1) * interval_ratio(base_interval, parameters['interval'])
+            else:
+                key = (ticker, parameters['interval'])
+                depth = parameters['accuracy'] + 1
+            depths[key] = max(depths.get(key, 0), depth)
+        self.owns_listen_key = listen_key is None
+        self.listen_key = listen_key
+        asyncio.run_coroutine_threadsafe(self.bootstrap(warmup=warmup, depths=depths), self.loop).result()
+        history = warmup
+        if base_interval:
+            history = AggregatedHistory(history=warmup, base_interval=base_interval)
+            for (ticker, _), depth in depths.items():
+                history.base_candles(ticker=ticker, length=depth)
+        # Общий конвейер событий
+        self.pipeline = EventPipeline()
+        # Состояния стратегий по имени потока свечей и по тикеру
+        self.states: list[EmaCrossOverState] = [
+            EmaCrossOverState(**parameters, client=self.client, async_client=self.async_client, loop=self.loop,
+                              history=history, pipeline=self.pipeline, journal=self.journal,
+                              snapshot=StateSnapshot(path=snapshot_path(
+                                  ticker=parameters['ticker'], interval=parameters['interval'],
+                                  short_ema=parameters['short_ema'], long_ema=parameters['long_ema'],
+                                  future=future)) if snapshot else None)
+            for parameters in symbols
+        ]
+        # Сверка восстановленных позиций: открытые ордера и позиции всех тикеров одним запросом
+        if any(state.needs_reconcile for state in self.states):
+            open_orders = self.client.get_open_orders()
+            positions = self.client.get_positions() if future else None
+            for state in self.states:
+                state.reconcile(open_orders=open_orders, positions=positions)
+        # Стартовые архивы записываются перед кадрами, чтобы воспроизведение начиналось с тех же окон
+        if self.recorder:
+            for state, parameters in zip(self.states, symbols):
+                self.recorder.append_warmup(state.candles_stream, state.warmup_klines(), parameters=parameters)
+        self.streams: dict[str, list[EmaCrossOverState]] = {}
+        self.symbols: dict[str, list[EmaCrossOverState]] = {}
+        for state in self.states:
+            self.symbols.setdefault(state.ticker.upper(), []).append(state)
+        # Пакетное закрытие свечей: один пакет на интервал (и окно подтверждения), строка - состояние
+        grouped: dict[tuple[str, int], list[EmaCrossOverState]] = {}
+        for state in self.states:
+            grouped.setdefault((state.interval, state.signal_state.confirmation), []).append(state)
+        self.batches = [BatchSignals(states=states) for states in grouped.values()]
+        # Обработчики тиков по тикеру и интервалу
+        handlers: dict[tuple[str, str], list] = {}
+        for batch in self.batches:
+            interval = batch.states[0].interval
+            for ticker in {state.ticker.upper() for state in batch.states}:
+                handlers.setdefault((ticker, interval), []).append(batch.handler(ticker=ticker))
+        # Обработчики свечей по имени потока
+        kline_handlers = {}
+        if base_interval:
+            # Один базовый поток на тикер, свечи интервалов стратегий собираются локально
+            self.aggregators: dict[str, CandleAggregator] = {}
+            for ticker, states in self.symbols.items():
+                aggregator = CandleAggregator(ticker=ticker, base_interval=base_interval)
+                for interval in {state.interval for state in states}:
+                    for handler in handlers[(ticker, interval)]:
+                        aggregator.subscribe(interval=interval, handler=handler)
+                aggregator.seed(history.base_candles(ticker=ticker, length=0))
+                self.aggregators[ticker] = aggregator
+                self.streams[aggregator.stream] = states
+                kline_handlers[aggregator.stream] = [aggregator.handle_kline]
+        else:
+            for state in self.states:
+                self.streams.setdefault(state.candles_stream, []).append(state)
+            kline_handlers = {stream: handlers[(states[0].ticker.upper(), states[0].interval)]
+                              for stream, states in self.streams.items()}
+        logger.info(self.listen_key)
+        super().__init__(url=stream_url(stream_names=[self.listen_key, *self.streams], listen_key=self.listen_key,
+                                        future=future),
+                         on_open=self.on_open,
+                         on_message=self.on_message,
+                         on_error=self.on_error,
+                         on_close=self.on_close)
+        # Прием кадров: маршрутизация по имени потока и объединение тиков при отставании
+        self.ingest = StreamIngest(pipeline=self.pipeline, listen_key=self.listen_key,
+                                   on_order_update=self.route_order_update,
+                                   kline_handlers=kline_handlers)
+
+    async def bootstrap(self, warmup: WarmupHistory, depths: dict[tuple[str, str], int]):
+        # Ключ потока пользовательских данных запрашивается одновременно со свечами
+        fetch = warmup.fetch(client=self.async_client, requests=depths, concurrency=self.async_client.pool_size)
+        if self.owns_listen_key:
+            _, self.listen_key = await asyncio.gather(fetch, asyncio.to_thread(self.get_listen_key))
+        else:
+            await fetch
+
+    def on_open(self, ws):
+        logger.info(f"Бот запущен, торговых пар: {len(self.symbols)}, потоков свечей: {len(self.streams)}")
+        if self.owns_listen_key:
+            self.keep_alive_listen_key()
+
+    def on_error(self, ws, error):
+        logger.info(traceback.format_exc())
+
+    def on_close(self, ws, close_status_code, close_message):
+        if self.owns_listen_key:
+            self.close_listen_key()
+        # Отложенные закрытые свечи проводятся до сохранения снимков
+        for batch in self.batches:
+            batch.flush()
+        for state in self.states:
+            state.save_snapshot()
+        snapshot_writer.flush()
+        # Запись оставшихся событий и кадров журналов
+        for journal in (self.journal, self.recorder):
+            if journal:
+                journal.close()
+        # Сессия асинхронного клиента закрывается в его цикле событий
+        close_session(self.async_client, self.loop)
+        logger.info('Бот остановлен')
+
+    def on_message(self, ws, message):
+        if self.recorder:
+            self.recorder.append(message)
+        self.ingest.on_frame(message)
+
+    def stats(self) -> dict[str, any]:
+        """
+        Возвращает состояние и счетчики пропускной способности подключения
+
+        :return: :class:`dict`
+        """
+        return {'symbols': len(self.symbols),
+                'states': len(self.states),
+                'positions': sum(1 for state in self.states if state.position['side']),
+                'ingest': self.ingest.stats(),
+                'queue': self.pipeline.depth(),
+                'counters': dict(metrics.counters),
+                'latency': metrics.summary()}
+
+    def route_order_update(self, order: dict):
+        # Обновление получает состояние, которому принадлежит ордер, иначе все состояния по тикеру
+        states = self.symbols.get(order['s'], ())
+        owners = [state for state in states if order['i'] in (state.stop_order_id, state.position['orderId'])]
+        for state in owners or states:
+            state.handle_order_update(order=order)
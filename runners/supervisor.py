@@ -0,0 +1,285 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+from threading import Thread
+import time
+
+from exchanges import Binance
+from keys import API_KEY, SECRET_KEY
+from market_data import check_interval
+from strategies import ListenKeyMixin
+from .multi_symbol import MultiSymbolRunner
+
+logger = logging.getLogger('app.runners.supervisor')
+
+# Обязательные параметры торговой пары в конфигурации
+SYMBOL_FIELDS = ('ticker', 'interval', 'accuracy', 'short_ema', 'long_ema', 'quantity')
+
+
+def load_symbols(path: str) -> list[dict]:
+    """
+    Загружает конфигурацию торговых пар
+
+    :param path: файл JSON: список параметров :class:`EmaCrossOverState` по каждой паре `(ticker, interval, accuracy,
+        short_ema, long_ema, quantity[, confirmation])`
+
+    :return: :class:`list`
+    """
+    with open(path, encoding='utf-8') as file:
+        symbols = json.load(file)
+    for parameters in symbols:
+        missing = [field for field in SYMBOL_FIELDS if field not in parameters]
+        if missing:
+            raise ValueError(f"Конфигурация {path}: у пары {parameters} нет параметров {', '.join(missing)}")
+        check_interval(parameters['interval'])
+    return symbols
+
+
+def shard_symbols(symbols: list[dict], shards: int) -> list[list[dict]]:
+    """
+    Распределяет торговые пары по шардам
+
+    .. Note:: Все стратегии одного тикера попадают в один шард (общий поток свечей и сборка старших интервалов).
+    Тикеры распределяются по убыванию количества стратегий в наименее загруженный шард, поэтому распределение не
+    зависит от порядка пар в конфигурации и не меняется при перезапуске.
+
+    :param symbols: параметры торговых пар
+    :param shards: максимальное количество шардов
+
+    :return: :class:`list` непустых списков параметров
+    """
+    tickers: dict[str, list[dict]] = {}
+    for parameters in symbols:
+        tickers.setdefault(parameters['ticker'].upper(), []).append(parameters)
+    result = [[] for _ in range(max(1, min(shards, len(tickers))))]
+    for ticker in sorted(tickers, key=lambda name: (-len(tickers[name]), name)):
+        min(result, key=len).extend(tickers[ticker])
+    return [shard for shard in result if shard]
+
+
+def shard_path(path: str, shard: int) -> str:
+    # Отдельный файл журнала каждого шарда: <имя>.<шард><расширение>
+    root, extension = os.path.splitext(path)
+    return f"{root}.{shard}{extension}"
+
+
+def run_shard(shard: int, symbols: list[dict], options: dict, listen_key: str, reports, report_interval: float,
+              initializer=None):
+    """
+    Запускает :class:`MultiSymbolRunner` шарда в процессе обработчика и периодически отправляет его состояние
+
+    :param shard: номер шарда
+    :param symbols: параметры торговых пар шарда
+    :param options: параметры :class:`MultiSymbolRunner`
+    :param listen_key: общий ключ потока пользовательских данных
+    :param reports: очередь отчетов супервизору
+    :param report_interval: период отчетов в секундах
+    :param initializer: функция, вызываемая в процессе до запуска (например, настройка логирования)
+    """
+    # Прерывание с клавиатуры получает вся группа процессов, его обрабатывает только супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if initializer:
+        initializer()
+    runner = MultiSymbolRunner(symbols=symbols, listen_key=listen_key, **options)
+    # Остановка по сигналу супервизора: закрытие подключения с сохранением снимков
+    signal.signal(signal.SIGTERM, lambda signum, frame: runner.close())
+
+    def report():
+        while True:
+            time.sleep(report_interval)
+            reports.put({'shard': shard, 'pid': os.getpid(), 'time': time.time(), **runner.stats()})
+
+    Thread(target=report, name=f"shard-{shard}-report", daemon=True).start()
+    try:
+        runner.run_forever(reconnect=10)
+    finally:
+        for journal in (runner.journal, runner.recorder):
+            if journal:
+                journal.close()
+
+
+class Supervisor(ListenKeyMixin):
+    def __init__(self, symbols: list[dict], workers: int = None, future: bool = False, report_interval: float = 10.0,
+                 restart_delay: float = 5.0, initializer=None, **options):
+        """
+        Запуск стратегий многих торговых пар в нескольких процессах с общим ключом потока пользовательских данных.
+
+        .. Note:: Торговые пары распределяются по шардам (:func:`shard_symbols`), каждый шард - отдельный процесс с
+        :class:`MultiSymbolRunner`, поэтому разбор кадров, расчеты и подписание запросов выполняются параллельно на
+        разных ядрах. Ключ потока пользовательских данных один на аккаунт: супервизор получает его, продлевает и
+        закрывает, а процессы только подключаются к нему. Завершившийся процесс перезапускается через
+        ``restart_delay`` секунд с тем же набором пар (состояние восстанавливается из снимков при ``snapshot=True``).
+        Процессы отправляют в общую очередь свое состояние (:meth:`MultiSymbolRunner.stats`), супервизор выводит в
+        лог пропускную способность каждого шарда.
+
+        :param symbols: параметры :class:`EmaCrossOverState` по каждой паре (:func:`load_symbols`)
+        :param workers: количество процессов, по умолчанию количество ядер
+        :param future: торговля на фьючерсном рынке
+        :param report_interval: период отчетов процессов в секундах
+        :param restart_delay: задержка перезапуска завершившегося процесса в секундах
+        :param initializer: функция без аргументов, вызываемая в каждом процессе до запуска (должна сериализоваться
+            :mod:`pickle`)
+        :param options: остальные параметры :class:`MultiSymbolRunner`. Файлы журналов и порт метрик у каждого шарда
+            свои: к имени файла добавляется номер шарда, к порту - номер шарда
+        """
+        self.client = Binance(api_key=API_KEY, secret_key=SECRET_KEY, is_future=future)
+        self.future = future
+        self.shards = shard_symbols(symbols, shards=workers or os.cpu_count() or 1)
+        self.report_interval = report_interval
+        self.restart_delay = restart_delay
+        self.initializer = initializer
+        self.options = options
+        # Процессы запускаются заново (spawn), без копирования потоков и подключений супервизора
+        self.context = multiprocessing.get_context('spawn')
+        self.reports = self.context.Queue()
+        self.processes: list[multiprocessing.Process] = [None] * len(self.shards)
+        self.restarts = [0] * len(self.shards)
+        # Время запланированного перезапуска по шарду
+        self.restart_at: dict[int, float] = {}
+        # Последний и предыдущий отчеты по шарду
+        self.health: dict[int, dict] = {}
+        self.previous: dict[int, dict] = {}
+        self.listen_key = None
+        self.running = False
+
+    def shard_options(self, shard: int) -> dict:
+        options = dict(self.options, future=self.future)
+        for name in ('record_path', 'journal_path'):
+            if options.get(name):
+                options[name] = shard_path(options[name], shard)
+        if options.get('metrics_port'):
+            options['metrics_port'] += shard
+        return options
+
+    def spawn(self, shard: int):
+        # Сигнал остановки обрабатывается между любыми операциями цикла наблюдения: после остановки процессы не
+        # запускаются
+        if not self.running:
+            return
+        process = self.context.Process(target=run_shard, name=f"shard-{shard}",
+                                       args=(shard, self.shards[shard], self.shard_options(shard), self.listen_key,
+                                             self.reports, self.report_interval, self.initializer))
+        process.start()
+        self.processes[shard] = process
+        logger.info(f"Шард {shard}: процесс {process.pid}, торговых пар {len(self.shards[shard])}")
+
+    def start(self):
+        """
+        Получает ключ потока пользовательских данных и запускает процессы всех шардов
+        """
+        self.running = True
+        self.listen_key = self.get_listen_key()
+        self.keep_alive_listen_key()
+        for shard in range(len(self.shards)):
+            self.spawn(shard)
+
+    def run(self):
+        """
+        Запускает шарды и следит за ними до остановки (:meth:`close`, прерывание с клавиатуры или сигнал SIGTERM)
+        """
+        # Остановка по сигналу менеджера процессов: процессы шардов останавливаются, цикл наблюдения завершается
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.close())
+        self.start()
+        reported_at = time.monotonic()
+        try:
+            while self.running:
+                self.collect(timeout=1.0)
+                self.check()
+                if self.running and time.monotonic() - reported_at >= self.report_interval:
+                    self.log_health()
+                    reported_at = time.monotonic()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def collect(self, timeout: float):
+        # Прием отчетов процессов
+        try:
+            report = self.reports.get(timeout=timeout)
+            while True:
+                self.previous[report['shard']] = self.health.get(report['shard'], report)
+                self.health[report['shard']] = report
+                report = self.reports.get_nowait()
+        except queue.Empty:
+            pass
+
+    def check(self):
+        # Перезапуск завершившихся процессов
+        now = time.monotonic()
+        for shard, process in enumerate(self.processes):
+            if not self.running:
+                return
+            if shard in self.restart_at:
+                if now >= self.restart_at[shard]:
+                    del self.restart_at[shard]
+                    self.restarts[shard] += 1
+                    self.spawn(shard)
+            elif not process.is_alive():
+                logger.info(f"Шард {shard}: процесс {process.pid} завершился с кодом {process.exitcode}, "
+                            f"перезапуск через {self.restart_delay} с")
+                self.health.pop(shard, None)
+                self.restart_at[shard] = now + self.restart_delay
+
+    def stats(self) -> dict[int, dict[str, any]]:
+        """
+        Возвращает состояние шардов по последним отчетам
+
+        :return: :class:`dict` по номеру шарда: процесс, количество пар и позиций, кадров и свечей в секунду,
+            глубина очереди сигналов, отброшенные кадры, перезапуски, возраст отчета в секундах
+        """
+        result = {}
+        for shard, process in enumerate(self.processes):
+            report, previous = self.health.get(shard), self.previous.get(shard)
+            if report is None:
+                result[shard] = {'pid': process.pid if process else None, 'alive': bool(process and process.is_alive()),
+                                 'restarts': self.restarts[shard]}
+                continue
+            elapsed = max(report['time'] - previous['time'], 1e-9)
+            result[shard] = {
+                'pid': report['pid'],
+                'alive': process.is_alive(),
+                'symbols': report['symbols'],
+                'positions': report['positions'],
+                'frames_per_second': (report['ingest']['frames'] - previous['ingest']['frames']) / elapsed,
+                'klines_per_second': (report['counters'].get('klines', 0)
+                                      - previous['counters'].get('klines', 0)) / elapsed,
+                'signal_queue': report['queue']['signal'],
+                'dropped': report['ingest']['dropped'] + report['queue']['dropped'],
+                'restarts': self.restarts[shard],
+                'age': time.time() - report['time'],
+            }
+        return result
+
+    def log_health(self):
+        for shard, values in self.stats().items():
+            if 'symbols' not in values:
+                logger.info(f"Шард {shard}: процесс {values['pid']}, нет отчета, перезапусков {values['restarts']}")
+                continue
+            logger.info(f"Шард {shard}: процесс {values['pid']}, пар {values['symbols']}, "
+                        f"позиций {values['positions']}, кадров {values['frames_per_second']:.1f}/с, "
+                        f"свечей {values['klines_per_second']:.1f}/с, очередь {values['signal_queue']}, "
+                        f"отброшено {values['dropped']}, перезапусков {values['restarts']}, "
+                        f"отчет {values['age']:.1f} с назад")
+
+    def close(self):
+        """
+        Останавливает процессы шардов и закрывает ключ потока пользовательских данных
+        """
+        if not self.running:
+            return
+        self.running = False
+        for process in self.processes:
+            if process and process.is_alive():
+                process.terminate()
+        for process in self.processes:
+            if process:
+                process.join(timeout=15)
+                if process.is_alive():
+                    process.kill()
+        if self.listen_key:
+            self.close_listen_key()
+        logger.info('Супервизор остановлен')
@@ -0,0 +1,60 @@
+import argparse
+import logging
+import sys
+import time
+
+from constants import KLINES_CACHE_DIR
+from market_data import INTERVAL_MILLISECONDS, KlineHistory, klines_to_array, synthetic_klines
+from .exchange import SimulatedExchange, SimulatedMarket
+
+logger = logging.getLogger('app.simulator')
+
+
+def main(arguments: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Локальная имитация Binance: REST и объединенный поток')
+    parser.add_argument('symbols', nargs='+', help='тикеры')
+    parser.add_argument('--interval', default='1m', choices=INTERVAL_MILLISECONDS)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--history', nargs='?', const=KLINES_CACHE_DIR, default=None,
+                        help='проигрывать свечи из кэша KlineHistory, иначе случайное блуждание')
+    parser.add_argument('--spot', action='store_true', help='читать спотовый кэш')
+    parser.add_argument('--length', type=int, default=10000, help='количество случайных свечей')
+    parser.add_argument('--warmup', type=int, default=1500, help='закрытых свечей на момент запуска')
+    parser.add_argument('--candle-seconds', type=float, default=1.0, help='длительность проигрывания свечи')
+    parser.add_argument('--ticks', type=int, default=10, help='тиков в свече')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответов и кадров, секунды')
+    parser.add_argument('--jitter', type=float, default=0.0, help='разброс задержки, секунды')
+    parser.add_argument('--seed', type=int, default=None)
+    options = parser.parse_args(arguments)
+    if options.ticks < 2:
+        parser.error('--ticks должно быть не меньше 2')
+
+    logging.basicConfig(level=logging.INFO)
+    history = KlineHistory(None, root=options.history, is_future=not options.spot) if options.history else None
+    start_ms = int(time.time() * 1000)
+    markets = {}
+    for index, symbol in enumerate(symbol.upper() for symbol in options.symbols):
+        if history:
+            columns = history.load(ticker=symbol, interval=options.interval)
+            candles = klines_to_array(columns)
+        else:
+            candles = klines_to_array(synthetic_klines(length=options.length,
+                                                       interval_ms=INTERVAL_MILLISECONDS[options.interval],
+                                                       seed=index if options.seed is None else options.seed + index))
+        markets[symbol] = SimulatedMarket(symbol=symbol, interval=options.interval, candles=candles,
+                                          warmup=min(options.warmup, candles.shape[0] - 1), ticks=options.ticks,
+                                          start_ms=start_ms)
+    exchange = SimulatedExchange(markets=markets, candle_seconds=options.candle_seconds, latency=options.latency,
+                                 jitter=options.jitter, seed=options.seed)
+    # Переменные окружения для подключения стратегий к имитации
+    logger.info(f"BINANCE_BASE_FUTURES_URL=http://{options.host}:{options.port} "
+                f"BINANCE_FUTURES_STREAM_URL=ws://{options.host}:{options.port} "
+                f"BINANCE_BASE_SPOT_URL=http://{options.host}:{options.port} "
+                f"BINANCE_SPOT_STREAM_URL=ws://{options.host}:{options.port}")
+    exchange.run(host=options.host, port=options.port)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
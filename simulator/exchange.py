@@ -0,0 +1,490 @@
+import asyncio
+import json
+import logging
+import random
+import secrets
+import time
+from itertools import count
+
+import numpy
+from aiohttp import WSMsgType, web
+
+from market_data import CLOSE, HIGH, INTERVAL_MILLISECONDS, LOW, OPEN, OPEN_TIME, VOLUME
+
+logger = logging.getLogger('app.simulator.exchange')
+
+# Компактная сериализация кадров: разбор потока ищет поля без пробелов (`"x":true`, `"c":"`)
+SEPARATORS = (',', ':')
+# Максимальное количество свечей в ответе
+KLINES_MAX_LIMIT = 1500
+
+
+def error(code: int, message: str, status: int = 400) -> web.Response:
+    return web.json_response({'code': code, 'msg': message}, status=status)
+
+
+class SimulatedMarket:
+    """
+    Рынок одного тикера, проигрывающий историю свечей
+    """
+    def __init__(self, symbol: str, interval: str, candles: numpy.ndarray, warmup: int, ticks: int, start_ms: int):
+        """
+        Создает объект класса :class:`SimulatedMarket`.
+
+        .. Note:: Первые `warmup` свечей считаются закрытыми к моменту запуска и отдаются запросом свечей, остальные
+        проигрываются в реальном времени. Время открытия свечей сдвигается так, чтобы первая проигрываемая свеча
+        открывалась в начале текущего интервала. Внутри свечи цена проходит `ticks` шагов через open, экстремумы и close.
+
+        :param symbol: тикер
+        :param interval: интервал свечей
+        :param candles: массив :func:`klines_to_array`
+        :param warmup: количество закрытых свечей на момент запуска
+        :param ticks: количество тиков в свече
+        :param start_ms: время запуска в миллисекундах
+        """
+        if candles.shape[0] <= warmup:
+            raise ValueError(f"{symbol}: недостаточно свечей для проигрывания ({candles.shape[0]} <= {warmup})")
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = INTERVAL_MILLISECONDS[interval]
+        self.candles = numpy.array(candles, dtype=numpy.float64)
+        # Время открытия выравнивается по границе интервала, как на площадке
+        start_ms = start_ms // self.interval_ms * self.interval_ms
+        self.candles[:, OPEN_TIME] = start_ms + (numpy.arange(self.candles.shape[0]) - warmup) * self.interval_ms
+        self.ticks = ticks
+        self.stream = f"{symbol.lower()}@kline_{interval}"
+        # Индекс текущей (незакрытой) свечи и номер тика в ней
+        self.index = warmup
+        self.tick = 0
+        self.path = self.tick_path(self.index)
+        self.price = self.path[0]
+        self.high = self.low = self.price
+        self.volume = 0.0
+
+    def tick_path(self, index: int) -> numpy.ndarray:
+        """
+        Возвращает цены тиков свечи: open - ближний к open экстремум - дальний экстремум - close
+
+        :param index: индекс свечи
+
+        :return: :class:`numpy.ndarray`
+        """
+        candle = self.candles[index]
+        open_price, close_price = candle[OPEN], candle[CLOSE]
+        extremes = (candle[LOW], candle[HIGH]) if close_price >= open_price else (candle[HIGH], candle[LOW])
+        points = numpy.array((open_price, *extremes, close_price))
+        return numpy.interp(numpy.linspace(0, 3, self.ticks), numpy.arange(4), points)
+
+    @property
+    def time_ms(self) -> int:
+        # Время имитации: начало текущей свечи и доля проигранных тиков
+        if self.finished:
+            return int(self.candles[-1, OPEN_TIME]) + self.interval_ms
+        return int(self.candles[self.index, OPEN_TIME]) + self.tick * self.interval_ms // self.ticks
+
+    @property
+    def finished(self) -> bool:
+        return self.index >= self.candles.shape[0]
+
+    def advance(self) -> tuple[dict, bool]:
+        """
+        Проводит один тик текущей свечи
+
+        :return: :class:`tuple` (данные свечи потока, свеча закрыта)
+        """
+        candle = self.candles[self.index]
+        self.price = float(self.path[self.tick])
+        self.high = max(self.high, self.price)
+        self.low = min(self.low, self.price)
+        self.tick += 1
+        closed = self.tick == self.ticks
+        if closed:
+            self.high, self.low, self.volume = candle[HIGH], candle[LOW], candle[VOLUME]
+        else:
+            self.volume = candle[VOLUME] * self.tick / self.ticks
+        kline = self.kline(candle, self.price, self.high, self.low, self.volume, closed)
+        if closed:
+            self.index += 1
+            self.tick = 0
+            if not self.finished:
+                self.path = self.tick_path(self.index)
+                self.high = self.low = float(self.path[0])
+        return kline, closed
+
+    def kline(self, candle: numpy.ndarray, close_price: float, high_price: float, low_price: float, volume: float,
+              closed: bool) -> dict:
+        open_time = int(candle[OPEN_TIME])
+        return {'t': open_time, 'T': open_time + self.interval_ms - 1, 's': self.symbol, 'i': self.interval,
+                'f': 0, 'L': 0, 'o': f"{candle[OPEN]:.8g}", 'c': f"{close_price:.8g}", 'h': f"{high_price:.8g}",
+                'l': f"{low_price:.8g}", 'v': f"{volume:.8g}", 'n': 0, 'x': closed, 'q': '0', 'V': '0', 'Q': '0',
+                'B': '0'}
+
+    def klines(self, start_time: int = None, end_time: int = None, limit: int = 500) -> list[list]:
+        """
+        Возвращает закрытые свечи и текущую незакрытую свечу в формате ответа Binance
+
+        :param start_time: начало периода (время открытия)
+        :param end_time: окончание периода (время открытия)
+        :param limit: количество свечей
+
+        :return: :class:`list`
+        """
+        closed = self.candles[:min(self.index, self.candles.shape[0])]
+        # Текущая незакрытая свеча добавляется в конец ответа, как на площадке
+        live = not self.finished and (start_time is None or self.candles[self.index, OPEN_TIME] >= start_time) \
+            and (end_time is None or self.candles[self.index, OPEN_TIME] <= end_time)
+        first = int(numpy.searchsorted(closed[:, OPEN_TIME], start_time)) if start_time is not None else 0
+        last = int(numpy.searchsorted(closed[:, OPEN_TIME], end_time, side='right')) if end_time is not None \
+            else closed.shape[0]
+        # Форматируются только свечи, попадающие в ответ
+        if start_time is not None:
+            last = min(last, first + limit)
+        else:
+            first = max(first, last - limit + live)
+        result = [[int(row[OPEN_TIME]), f"{row[OPEN]:.8g}", f"{row[HIGH]:.8g}", f"{row[LOW]:.8g}",
+                   f"{row[CLOSE]:.8g}", f"{row[VOLUME]:.8g}", int(row[OPEN_TIME]) + self.interval_ms - 1]
+                  for row in closed[first:last]]
+        if live and len(result) < limit:
+            candle = self.candles[self.index]
+            result.append([int(candle[OPEN_TIME]), f"{candle[OPEN]:.8g}", f"{self.high:.8g}", f"{self.low:.8g}",
+                           f"{self.price:.8g}", f"{self.volume:.8g}", int(candle[OPEN_TIME]) + self.interval_ms - 1])
+        return result
+
+
+class SimulatedExchange:
+    """
+    Локальная имитация REST и потоков Binance для прогона стратегий без площадки
+    """
+    def __init__(self, markets: dict[str, SimulatedMarket], candle_seconds: float = 1.0, latency: float = 0.0,
+                 jitter: float = 0.0, seed: int = None):
+        """
+        Создает объект класса :class:`SimulatedExchange`.
+
+        .. Note:: Поддерживаются запросы, которые отправляют клиенты :class:`Binance` и :class:`AsyncBinance`:
+        свечи, рыночный ордер, переменяющийся стоп (`TRAILING_STOP_MARKET`, спотовый `STOP_LOSS_LIMIT` с
+        `trailingDelta`), пакет ордеров `batchOrders`, запрос и отмена ордера, открытые ордера, позиции
+        (`positionRisk`, по исполнениям ордеров открытого ключа) и ключ потока пользовательских данных. Объединенный поток `/stream`
+        передает свечи подписанных тикеров и события `ORDER_TRADE_UPDATE` ордеров открытого ключа, к которому
+        относится ключ потока. Подпись запросов не проверяется.
+
+        .. Note:: Время сервера (`time`) и время открытия свечей - время имитации: одна свеча интервала проигрывается
+        за ``candle_seconds`` секунд, поэтому время имитации идет быстрее реального. Клиенты отбирают закрытые свечи по
+        часам, синхронизированным с временем сервера (:class:`MarketClock`).
+
+        .. Note:: Задержка `latency` с разбросом `jitter` (секунды) добавляется к каждому ответу REST и к каждому
+        кадру потока. Кадры одного подключения отправляются по порядку, задержка между ними не накапливается.
+
+        :param markets: рынки по тикеру
+        :param candle_seconds: длительность проигрывания одной свечи в секундах
+        :param latency: средняя задержка
+        :param jitter: максимальное отклонение задержки
+        :param seed: начальное значение генератора задержек
+        """
+        self.markets = markets
+        self.candle_seconds = candle_seconds
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.order_ids = count(1)
+        # Открытые переменяющиеся стопы по идентификатору
+        self.orders: dict[int, dict] = {}
+        # Все принятые ордера по (открытый ключ, идентификатор клиента)
+        self.history: dict[tuple[str, str], dict] = {}
+        # Объем позиции со знаком направления и средняя цена входа по (открытый ключ, тикер)
+        self.positions: dict[tuple[str, str], tuple[float, float]] = {}
+        # Открытый ключ по ключу потока пользовательских данных
+        self.listen_keys: dict[str, str] = {}
+        # Подключения: очередь кадров и подписки
+        self.connections: dict[web.WebSocketResponse, dict] = {}
+        self.used_weight = 0
+        self.weight_minute = 0
+        self.app = web.Application()
+        for prefix in ('/fapi/v1', '/api/v3'):
+            self.app.router.add_get(f"{prefix}/time", self.get_time)
+            self.app.router.add_get(f"{prefix}/klines", self.get_klines)
+            self.app.router.add_post(f"{prefix}/order", self.post_order)
+            self.app.router.add_delete(f"{prefix}/order", self.delete_order)
+            self.app.router.add_get(f"{prefix}/order", self.get_order)
+            self.app.router.add_get(f"{prefix}/openOrders", self.get_open_orders)
+        self.app.router.add_post('/fapi/v1/batchOrders', self.post_batch_orders)
+        self.app.router.add_get('/fapi/v2/positionRisk', self.get_position_risk)
+        for path in ('/fapi/v1/listenKey', '/api/v3/userDataStream'):
+            self.app.router.add_post(path, self.post_listen_key)
+            self.app.router.add_put(path, self.put_listen_key)
+            self.app.router.add_delete(path, self.delete_listen_key)
+        self.app.router.add_get('/stream', self.stream)
+        self.app.on_startup.append(self.start_clock)
+
+    def delay(self) -> float:
+        return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+    async def respond(self, body: any, weight: int = 1) -> web.Response:
+        """
+        Формирует ответ REST с задержкой и заголовком использованного веса
+        """
+        minute = int(time.time() // 60)
+        if minute != self.weight_minute:
+            self.weight_minute, self.used_weight = minute, 0
+        self.used_weight += weight
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.delay())
+        return web.json_response(body, headers={'X-MBX-USED-WEIGHT-1M': str(self.used_weight)})
+
+    # Свечи
+
+    async def get_time(self, request: web.Request) -> web.Response:
+        # Время сервера - время имитации, которое идет быстрее реального (:class:`MarketClock`)
+        return await self.respond({'serverTime': max(market.time_ms for market in self.markets.values())})
+
+    async def get_klines(self, request: web.Request) -> web.Response:
+        market = self.markets.get(request.query.get('symbol', '').upper())
+        if market is None:
+            return error(-1121, 'Invalid symbol.')
+        if request.query.get('interval') != market.interval:
+            return error(-1120, 'Invalid interval.')
+        limit = min(int(request.query.get('limit', 500)), KLINES_MAX_LIMIT)
+        start_time = request.query.get('startTime')
+        end_time = request.query.get('endTime')
+        return await self.respond(market.klines(start_time=int(start_time) if start_time else None,
+                                                end_time=int(end_time) if end_time else None, limit=limit),
+                                  weight=5)
+
+    # Ордера
+
+    def place_order(self, query, api_key: str) -> dict:
+        """
+        Принимает ордер с параметрами запроса `query`
+
+        :return: :class:`dict` ответ ордера или ошибка (`code`, `msg`)
+        """
+        market = self.markets.get(query.get('symbol', '').upper())
+        if market is None:
+            return {'code': -1121, 'msg': 'Invalid symbol.'}
+        if query.get('side') not in ('BUY', 'SELL'):
+            return {'code': -1102, 'msg': "Mandatory parameter 'side' was not sent, was empty/null, or malformed."}
+        order_id = next(self.order_ids)
+        client_order_id = query.get('newClientOrderId') or f"sim{order_id}"
+        if any(order['clientOrderId'] == client_order_id and order['api_key'] == api_key
+               for order in self.orders.values()):
+            return {'code': -4116, 'msg': 'ClientOrderId is duplicated.'}
+        order = {'orderId': order_id, 'clientOrderId': client_order_id, 'symbol': market.symbol,
+                 'side': query['side'], 'type': query.get('type'), 'origQty': query.get('quantity', '0'),
+                 'api_key': api_key}
+        if order['type'] == 'TRAILING_STOP_MARKET' and 'callbackRate' in query:
+            order['callback'] = float(query['callbackRate']) / 100
+        elif order['type'] == 'STOP_LOSS_LIMIT' and 'trailingDelta' in query:
+            order['callback'] = float(query['trailingDelta']) / 10000
+        elif order['type'] != 'MARKET':
+            return {'code': -1116, 'msg': 'Invalid orderType.'}
+        self.history[(api_key, client_order_id)] = order
+        if order['type'] == 'MARKET':
+            self.fill(order, market.price)
+        else:
+            order['activation'] = float(query['activationPrice']) if 'activationPrice' in query else \
+                float(query['stopPrice']) if 'stopPrice' in query else None
+            order['extreme'] = market.price
+            order['status'] = 'NEW'
+            self.orders[order['orderId']] = order
+            self.publish(order, execution='NEW', price=0.0)
+        return self.order_response(order)
+
+    async def post_order(self, request: web.Request) -> web.Response:
+        response = self.place_order(request.query, api_key=request.headers.get('X-MBX-APIKEY', ''))
+        if 'code' in response:
+            return error(response['code'], response['msg'])
+        return await self.respond(response, weight=1)
+
+    async def post_batch_orders(self, request: web.Request) -> web.Response:
+        try:
+            orders = json.loads(request.query.get('batchOrders', ''))
+        except ValueError:
+            return error(-1130, 'Data sent for parameter \'batchOrders\' is not valid.')
+        if not isinstance(orders, list) or not 0 < len(orders) <= 5:
+            return error(-1130, 'Data sent for parameter \'batchOrders\' is not valid.')
+        api_key = request.headers.get('X-MBX-APIKEY', '')
+        return await self.respond([self.place_order(order, api_key=api_key) for order in orders], weight=5)
+
+    async def get_order(self, request: web.Request) -> web.Response:
+        api_key = request.headers.get('X-MBX-APIKEY', '')
+        if 'origClientOrderId' in request.query:
+            order = self.history.get((api_key, request.query['origClientOrderId']))
+        else:
+            order = next((order for order in self.history.values()
+                          if order['orderId'] == int(request.query.get('orderId', 0))), None)
+        if order is None or order['symbol'] != request.query.get('symbol', '').upper():
+            return error(-2013, 'Order does not exist.')
+        return await self.respond(self.order_response(order), weight=1)
+
+    async def delete_order(self, request: web.Request) -> web.Response:
+        order = self.orders.get(int(request.query.get('orderId', 0)))
+        if order is None or order['symbol'] != request.query.get('symbol', '').upper():
+            return error(-2011, 'Unknown order sent.')
+        del self.orders[order['orderId']]
+        order['status'] = 'CANCELED'
+        self.publish(order, execution='CANCELED', price=0.0)
+        return await self.respond(self.order_response(order), weight=1)
+
+    async def get_open_orders(self, request: web.Request) -> web.Response:
+        api_key = request.headers.get('X-MBX-APIKEY', '')
+        symbol = request.query.get('symbol', '').upper()
+        return await self.respond([self.order_response(order) for order in self.orders.values()
+                                   if order['api_key'] == api_key and (not symbol or order['symbol'] == symbol)],
+                                  weight=1 if symbol else 40)
+
+    async def get_position_risk(self, request: web.Request) -> web.Response:
+        api_key = request.headers.get('X-MBX-APIKEY', '')
+        symbol = request.query.get('symbol', '').upper()
+        symbols = [symbol] if symbol else list(self.markets)
+        result = []
+        for name in symbols:
+            amount, entry_price = self.positions.get((api_key, name), (0.0, 0.0))
+            result.append({'symbol': name, 'positionAmt': f"{amount:.8g}", 'entryPrice': f"{entry_price:.8g}",
+                           'markPrice': f"{self.markets[name].price:.8g}", 'positionSide': 'BOTH'})
+        return await self.respond(result, weight=5)
+
+    def order_response(self, order: dict) -> dict:
+        executed = order['origQty'] if order['status'] == 'FILLED' else '0'
+        return {'orderId': order['orderId'], 'symbol': order['symbol'], 'status': order['status'],
+                'clientOrderId': order['clientOrderId'], 'price': '0', 'avgPrice': f"{order.get('price', 0):.8g}",
+                'origQty': order['origQty'], 'executedQty': executed, 'type': order['type'], 'side': order['side'],
+                'updateTime': int(time.time() * 1000)}
+
+    def fill(self, order: dict, price: float):
+        order['status'] = 'FILLED'
+        order['price'] = price
+        # Позиция в одностороннем режиме: цена входа усредняется при увеличении и сбрасывается при развороте
+        key = (order['api_key'], order['symbol'])
+        amount, entry_price = self.positions.get(key, (0.0, 0.0))
+        quantity = float(order['origQty']) * (1 if order['side'] == 'BUY' else -1)
+        total = amount + quantity
+        if not total:
+            entry_price = 0.0
+        elif amount * quantity >= 0:
+            entry_price = (amount * entry_price + quantity * price) / total
+        elif amount * total < 0:
+            entry_price = price
+        self.positions[key] = (total, entry_price)
+        self.publish(order, execution='TRADE', price=price)
+
+    def check_stops(self, market: SimulatedMarket):
+        """
+        Сдвигает экстремумы переменяющихся стопов тикера и исполняет сработавшие по текущей цене
+        """
+        price = market.price
+        for order in [order for order in self.orders.values() if order['symbol'] == market.symbol]:
+            selling = order['side'] == 'SELL'
+            if order['activation'] is not None:
+                # Стоп начинает следовать за ценой после достижения цены активации
+                if (price < order['activation']) if selling else (price > order['activation']):
+                    continue
+                order['activation'] = None
+                order['extreme'] = price
+            order['extreme'] = max(order['extreme'], price) if selling else min(order['extreme'], price)
+            if (price <= order['extreme'] * (1 - order['callback'])) if selling else \
+                    (price >= order['extreme'] * (1 + order['callback'])):
+                del self.orders[order['orderId']]
+                self.fill(order, price)
+
+    # Ключ потока пользовательских данных
+
+    async def post_listen_key(self, request: web.Request) -> web.Response:
+        listen_key = secrets.token_hex(32)
+        self.listen_keys[listen_key] = request.headers.get('X-MBX-APIKEY', '')
+        return await self.respond({'listenKey': listen_key})
+
+    async def put_listen_key(self, request: web.Request) -> web.Response:
+        if request.query.get('listenKey') not in self.listen_keys:
+            return error(-1125, 'This listenKey does not exist.')
+        return await self.respond({})
+
+    async def delete_listen_key(self, request: web.Request) -> web.Response:
+        if self.listen_keys.pop(request.query.get('listenKey'), None) is None:
+            return error(-1125, 'This listenKey does not exist.')
+        return await self.respond({})
+
+    # Потоки
+
+    def publish(self, order: dict, execution: str, price: float):
+        """
+        Отправляет событие `ORDER_TRADE_UPDATE` во все подключения ключей потока открытого ключа ордера
+        """
+        now = int(time.time() * 1000)
+        filled = order['status'] == 'FILLED'
+        event = {'e': 'ORDER_TRADE_UPDATE', 'E': now, 'T': now,
+                 'o': {'s': order['symbol'], 'c': order['clientOrderId'], 'S': order['side'],
+                       'o': order['type'], 'f': 'GTC', 'q': order['origQty'], 'p': '0',
+                       'ap': f"{price:.8g}", 'sp': '0', 'x': execution, 'X': order['status'], 'i': order['orderId'],
+                       'l': order['origQty'] if filled else '0', 'z': order['origQty'] if filled else '0',
+                       'L': f"{price:.8g}", 'T': now, 'ot': order['type'],
+                       'cr': f"{order['callback'] * 100:.4g}" if 'callback' in order else '0'}}
+        for listen_key, api_key in self.listen_keys.items():
+            if api_key != order['api_key']:
+                continue
+            frame = json.dumps({'stream': listen_key, 'data': event}, separators=SEPARATORS)
+            for connection in self.connections.values():
+                if listen_key in connection['streams']:
+                    self.send(connection, frame)
+
+    def send(self, connection: dict, frame: str):
+        connection['queue'].put_nowait((time.monotonic() + self.delay(), frame))
+
+    async def sender(self, socket: web.WebSocketResponse, queue: asyncio.Queue):
+        """
+        Отправляет кадры подключения по порядку, выдерживая задержку каждого кадра от момента его формирования
+        """
+        while True:
+            deadline, frame = await queue.get()
+            wait = deadline - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            await socket.send_str(frame)
+
+    async def stream(self, request: web.Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        streams = set(filter(None, request.query.get('streams', '').split('/')))
+        if request.query.get('listenKey'):
+            streams.add(request.query['listenKey'])
+        queue = asyncio.Queue()
+        self.connections[socket] = {'streams': streams, 'queue': queue}
+        sender = asyncio.create_task(self.sender(socket, queue))
+        logger.info(f"Подключение к потокам: {', '.join(sorted(streams))}")
+        try:
+            async for message in socket:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            del self.connections[socket]
+            sender.cancel()
+        return socket
+
+    async def start_clock(self, app: web.Application):
+        app['clock'] = asyncio.create_task(self.clock())
+
+    async def clock(self):
+        """
+        Проигрывает свечи всех рынков: каждый тик рассылает кадры свечей и проверяет переменяющиеся стопы
+        """
+        ticks = max(market.ticks for market in self.markets.values())
+        step = self.candle_seconds / ticks
+        deadline = time.monotonic()
+        while not all(market.finished for market in self.markets.values()):
+            for market in self.markets.values():
+                if market.finished:
+                    continue
+                kline, closed = market.advance()
+                now = int(time.time() * 1000)
+                # Кадр сериализуется один раз для всех подписанных подключений
+                frame = json.dumps({'stream': market.stream,
+                                    'data': {'e': 'kline', 'E': now, 's': market.symbol, 'k': kline}},
+                                   separators=SEPARATORS)
+                for connection in self.connections.values():
+                    if market.stream in connection['streams']:
+                        self.send(connection, frame)
+                self.check_stops(market)
+            deadline += step
+            await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+        logger.info('История свечей проиграна полностью')
+
+    def run(self, host: str = '127.0.0.1', port: int = 8765):
+        web.run_app(self.app, host=host, port=port, print=None, access_log=None)
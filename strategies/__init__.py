@@ -1 +1,4 @@
-from .ema_cross_over import *
\ No newline at end of file
+from .ema_cross_over import *
+from .batch_signals import *
+from .snapshot import *
+from .user_data import *
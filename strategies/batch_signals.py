@@ -0,0 +1,106 @@
+from functools import partial
+
+import numpy
+
+from indicators import BatchCrossSignals, BatchEmaValue, BatchSignalState
+from monitoring import metrics
+from .ema_cross_over import EmaCrossOverState
+
+
+class BatchSignals:
+    """
+    Пакетное закрытие свечей и проверка сигналов состояний стратегии одного интервала
+    """
+    def __init__(self, states: list[EmaCrossOverState]):
+        """
+        Создает объект класса :class:`BatchSignals`.
+
+        .. Note:: Скользящие и окна подтверждения всех состояний хранятся только в одном :class:`BatchCrossSignals`,
+        строка - состояние: скользящие и состояние сигнала каждого состояния заменяются представлениями строки
+        (:class:`BatchEmaValue`, :class:`BatchSignalState`), поэтому снимки и проверка тиков состояния работают с
+        теми же значениями.
+
+        .. Note:: Тики незакрытых свечей приходят по каждому тикеру отдельно и проверяются состоянием
+        (:meth:`EmaCrossOverState.handle_kline`). Закрытые свечи откладываются, пока не закроются свечи всех
+        состояний интервала, после чего скользящие всех состояний фиксируются и сигналы проверяются одним вызовом
+        :meth:`BatchCrossSignals.close` и :meth:`BatchCrossSignals.evaluate`. Если закрытая свеча какого-либо тикера
+        не пришла, отложенные свечи проводятся по первому тику следующей свечи любого тикера интервала.
+
+        :param states: загруженные или восстановленные состояния с одинаковыми интервалом и окном подтверждения
+        """
+        self.states = states
+        self.batch = BatchCrossSignals(short_periods=[state.short_ema for state in states],
+                                       long_periods=[state.long_ema for state in states],
+                                       confirmation=states[0].signal_state.confirmation)
+        for row, state in enumerate(states):
+            short_ema = BatchEmaValue(self.batch.ema, row=row, column=int(self.batch.short_columns[row]))
+            long_ema = BatchEmaValue(self.batch.ema, row=row, column=int(self.batch.long_columns[row]))
+            short_ema.value = state.short_ema_indicator.value
+            long_ema.value = state.long_ema_indicator.value
+            signal_state = BatchSignalState(self.batch, row=row, capacity=state.signal_state.capacity)
+            signal_state.restore(state.signal_state.state())
+            state.short_ema_indicator, state.long_ema_indicator = short_ema, long_ema
+            state.signal_state = signal_state
+        # Отложенные закрытые свечи по строке и время их открытия
+        self.pending: dict[int, dict] = {}
+        self.pending_time = None
+
+    def handler(self, ticker: str):
+        """
+        Возвращает обработчик данных свечи тикера для всех его состояний
+
+        :param ticker: тикер
+
+        :return: функция с аргументом данных свечи
+        """
+        rows = [row for row, state in enumerate(self.states) if state.ticker.upper() == ticker.upper()]
+        return partial(self.handle_kline, rows)
+
+    def handle_kline(self, rows: list[int], kline: dict):
+        # Тик следующей свечи или повтор закрытой свечи проводит отложенные свечи
+        if self.pending and (kline['t'] != self.pending_time or rows[0] in self.pending):
+            self.flush()
+        if not kline['x']:
+            for row in rows:
+                self.states[row].handle_kline(kline)
+            return
+        for row in rows:
+            self.pending[row] = kline
+        self.pending_time = kline['t']
+        if len(self.pending) == len(self.states):
+            self.flush()
+
+    def flush(self):
+        """
+        Фиксирует скользящие и проверяет сигналы по отложенным закрытым свечам
+        """
+        if not self.pending:
+            return
+        start = metrics.now()
+        rows = numpy.fromiter(self.pending, dtype=numpy.int64, count=len(self.pending))
+        klines = list(self.pending.values())
+        self.pending.clear()
+        prices = numpy.array([float(kline['c']) for kline in klines])
+        for row, kline in zip(rows.tolist(), klines):
+            metrics.record('queue', start - kline.get('received_ns', start))
+            self.states[row].store_candle(open_time=kline['t'], open_price=float(kline['o']),
+                                          high_price=float(kline['h']), low_price=float(kline['l']),
+                                          close_price=float(kline['c']), volume=float(kline['v']))
+        self.batch.close(prices, rows)
+        for row in rows.tolist():
+            self.states[row].candle_closed()
+        decision = metrics.now()
+        buy, sell = self.batch.evaluate(prices, rows)
+        metrics.record('indicator', metrics.now() - decision)
+        for row, kline, price, state_buy, state_sell in zip(rows.tolist(), klines, prices.tolist(), buy.tolist(),
+                                                           sell.tolist()):
+            state = self.states[row]
+            state.received_ns = kline.get('received_ns', start)
+            state.last_price = price
+            state.candles.set_live(column='close', value=price)
+            # Пока предыдущий запрос на вход исполняется, сигналы не проверяются
+            if not state.order_pending:
+                state.enter(buy=state_buy, sell=state_sell)
+        metrics.since('signal', decision)
+        metrics.since('kline_handler', start)
+        metrics.count('klines', rows.shape[0])
@@ -1,29 +1,42 @@
-import json
+import asyncio
 import logging
-from threading import Thread, Timer
+from threading import RLock, Thread
 import time
 import traceback
 
+import aiohttp
 import numpy
 from websocket import WebSocketApp
 
-from exchanges import Binance
-from indicators import ema
+from events import (EVENT_CANCEL, EVENT_FILL, EVENT_ORDER, EVENT_POSITION_RESET, EVENT_SIGNAL, ORDER_TYPE_CODES,
+                    SIDES, EventJournal, EventPipeline, FrameRecorder, StreamIngest)
+from exchanges import AsyncBinance, Binance
+from indicators import CrossSignalState, StreamingEma
 from keys import API_KEY, SECRET_KEY
+from market_data import INTERVAL_MILLISECONDS, CandleBuffer, KlineHistory, check_interval, klines_to_array, market_clock
+from monitoring import metrics
+from .snapshot import StateSnapshot, snapshot_path, snapshot_writer
+from .user_data import ListenKeyMixin, close_session, stream_url
 
 logger = logging.getLogger('app.strategies.ema_cross_over')
 
 
-class EmaCrossOver(WebSocketApp):
+class EmaCrossOverState:
     def __init__(self, ticker: str, interval: str, accuracy: int, short_ema: int, long_ema: int, quantity: float,
-                 future: bool = False):
+                 client: Binance, async_client: AsyncBinance, loop: asyncio.AbstractEventLoop,
+                 history: KlineHistory = None, pipeline: EventPipeline = None, confirmation: int = 120,
+                 snapshot: StateSnapshot = None, journal: EventJournal = None):
         """
-        Стратегия основанная на пересечении экспоненциальных скользящих средних.
-        Период скользящих, объем позиции и тайм фрейм задается пользователем.
-        Стоп выставляется автоматически на уровень ближайшего последнего максимума/минимума,
-        с учетом 2% проскальзывания.
+        Состояние стратегии пересечения скользящих по одной торговой паре без собственного подключения.
+        Получает сообщения через :meth:`handle_kline` и :meth:`handle_order_update`, поэтому клиенты, цикл событий и
+        подключение к потоку могут быть общими для многих торговых пар (:class:`MultiSymbolRunner`).
 
-        Для изменения уровня проскальзывания передайте соответсвующий параметр в функцию, размещающую стоп ордер
+        .. Note:: При наличии снимка состояние сохраняется после каждой закрытой свечи и изменения позиции. На старте
+        состояние восстанавливается из снимка и догружаются только пропущенные свечи, после чего владелец клиента
+        сверяет позицию с открытыми ордерами (:meth:`reconcile`).
+
+        .. Note:: При наличии журнала сигналы, ордера, исполнения, отмены стопа и сбросы позиции записываются в него
+        записями фиксированной длины (:class:`EventJournal`) вместо вывода данных ордеров в лог.
 
         :param ticker: тикер торговой пары
         :param interval: тайм фрейм
@@ -31,259 +44,673 @@ class EmaCrossOver(WebSocketApp):
         :param short_ema: период короткой скользящей
         :param long_ema: период длинной скользящей
         :param quantity: объем позиции
+        :param client: клиент торговой площадки
+        :param async_client: асинхронный клиент торговой площадки
+        :param loop: цикл событий асинхронного клиента, работающий в отдельном потоке
+        :param history: локальный кэш исторических свечей
+        :param pipeline: конвейер событий, при его наличии ордера отправляются в стадии исполнения
+        :param confirmation: количество значений реального времени, подтверждающих направление до пересечения
+        :param snapshot: снимок состояния для быстрого перезапуска
+        :param journal: журнал торговых событий
         """
         self.ticker: str = ticker
-        # Клиент
-        self.client = Binance(api_key=API_KEY, secret_key=SECRET_KEY, is_future=future)
-        # Ключ потока пользовательских данных
-        self.listen_key = self.get_listen_key()
-        logger.info(self.listen_key)
-        # Имена потоков
+        self.client = client
+        self.async_client = async_client
+        self.loop = loop
+        # Таймаут ожидания ответа на ордер в секундах
+        self.order_timeout: float = 5
+        # Количество повторных отправок ордера и начальная задержка между ними в секундах
+        self.order_attempts: int = 5
+        self.retry_delay: float = 0.5
+        self.history = history
+        self.pipeline = pipeline
+        self.snapshot = snapshot
+        self.journal = journal
+        # Тикер в формате записи журнала
+        self.journal_symbol = ticker.upper().encode()
+        # Состояние восстановлено из снимка
+        self.restored = False
+        # Время открытия последней обработанной закрытой свечи
+        self.last_candle_time = None
+        # Запрос на вход в позицию ожидает исполнения
+        self.order_pending = False
+        # Отметки времени приема последнего тика и принятия решения о входе (:data:`metrics`)
+        self.received_ns = 0
+        self.signal_ns = 0
+        # Последняя цена реального времени и цена последнего сигнала
+        self.last_price = 0.0
+        self.signal_price = 0.0
+        # Идентификаторы клиента ордера входа и стопа последнего запроса
+        self.client_order_ids = (None, None)
+        # Имя потока свечей
         self.candles_stream = f"{self.ticker.lower()}@kline_{interval}"
-        stream_names: list[str] = [self.listen_key, self.candles_stream]
-        # Создание строки подключения
-        if future:
-            url = f"wss://fstream-auth.binance.com/stream?streams={'/'.join(name for name in stream_names)}" \
-                  f"&listenKey={self.listen_key}"
-        else:
-            url = f"wss://stream.binance.com:9443/stream?streams={self.listen_key}" \
-                  f"{'/'.join(name for name in stream_names)}"
-        super().__init__(url=url,
-                         on_open=self.on_open,
-                         on_message=self.on_message,
-                         on_error=self.on_error,
-                         on_close=self.on_close,
-                         on_ping=self.on_ping)
-        self.interval = interval
+        self.interval = check_interval(interval)
         self.accuracy: int = accuracy
         self.short_ema: int = short_ema
         self.long_ema: int = long_ema
         self.quantity: float = quantity
-        # Динамически обновляемые списки
-        self.close_prices = None
-        self.high_prices = None
-        self.low_prices = None
-        self.real_time_close_prices = None
-        self.previous_shor_list = []
-        self.previous_long_list = []
+        # Кольцевой буфер последних accuracy свечей
+        self.candles = CandleBuffer(capacity=accuracy)
+        # Окно подтверждения пересечения и ближайшие минимум/максимум
+        self.signal_state = CrossSignalState(confirmation=confirmation, capacity=accuracy)
         # Предыдущие значения скользящих для работы в режиме реального времени
         self.previous_short_value = None
         self.previous_long_value = None
+        # Потоковые скользящие, хранящие значение по последней закрытой свече
+        self.short_ema_indicator = StreamingEma(period=short_ema)
+        self.long_ema_indicator = StreamingEma(period=long_ema)
+        # Блокировка позиции и стопов: их изменяют цикл событий (ордера) и поток сигналов (обновления ордеров)
+        self.lock = RLock()
         # Информация об открытой позиции
         self.position: dict[str, any] = {'side': None, 'orderId': None}
         # Идентификатор стопа
         self.stop_order_id = None
+        # Идентификатор стопа предыдущей позиции, отмена которого при развороте еще не подтверждена
+        self.previous_stop_id = None
         # Стартовый запрос архива свечей
         self.get_start_data()
-        self.run_forever = self.run_forever(reconnect=10)
 
-    def __str__(self):
-        return f"Стратегия: Пересечение скользящих средних\n" \
-               f"Биржа: {self.client.exchange}\n" \
-               f"Url: {self.url}\n" \
-               f"Тикер: {self.ticker}\n" \
-               f"Рабочий объем: {self.quantity}\n" \
-               f"Тайм фрейм: {self.interval}\n" \
-               f"Точность: {self.quantity}\n" \
-               f"Короткая EMA: {self.short_ema}\n" \
-               f"Длинная EMA: {self.long_ema}\n" \
-               f"Архив цен закрытия: {self.close_prices}"
-
-    def on_open(self, ws):
-        logger.info('Бот запущен')
-        self.keep_alive_listen_key()
+    @property
+    def close_prices(self) -> numpy.ndarray:
+        return self.candles.view('close')
 
-    def on_error(self, ws, error):
-        logger.info(traceback.format_exc())
+    @property
+    def high_prices(self) -> numpy.ndarray:
+        return self.candles.view('high')
 
-    def on_close(self, ws, close_status_code, close_message):
-        self.close_listen_key()
-        logger.info('Бот остановлен')
-
-    def on_ping(self, ws, message):
-        logger.info('Получен пинг')
+    @property
+    def low_prices(self) -> numpy.ndarray:
+        return self.candles.view('low')
 
-    def on_message(self, ws, message):
-        message = json.loads(message)
-        # Фильтр потока пользовательских данных (обновление ордеров)
-        if message['stream'] == self.listen_key and message['data']['e'] == 'ORDER_TRADE_UPDATE':
+    def handle_order_update(self, order: dict):
+        with self.lock:
+            # Исполнения ордеров стратегии (подтверждение ордера входа может прийти позже исполнения)
+            if self.journal and order['x'] == 'TRADE':
+                entry = order['i'] == self.position['orderId'] or order['c'] == self.client_order_ids[0]
+                if entry or order['i'] == self.stop_order_id or order['c'] == self.client_order_ids[1]:
+                    self.journal.append_order(EVENT_FILL, order, reference=self.signal_price if entry else 0.0)
+            # Если стоп предыдущей позиции отменен или исполнен до подтверждения отмены
+            if order['i'] == self.previous_stop_id and order['X'] in ('CANCELED', 'FILLED', 'EXPIRED'):
+                logger.info(f"Стоп ордер {order['i']} предыдущей позиции: {order['X']}")
+                self.previous_stop_id = None
+                return
             # Если информация об отмене стоп ордера
-            if message['data']['o']['i'] == self.stop_order_id and message['data']['o']['X'] == 'CANCELED':
+            if order['i'] == self.stop_order_id and order['X'] == 'CANCELED':
                 logger.info(f"Стоп ордер {self.stop_order_id} отменён")
+                if self.journal:
+                    self.journal.append_order(EVENT_CANCEL, order)
                 self.stop_order_id = None
+                self.save_snapshot()
             # Если информация об исполнении стоп ордера
-            if message['data']['o']['ot'] == "TRAILING_STOP_MARKET" and message['data']['o']['X'] == 'FILLED':
+            if order['ot'] == "TRAILING_STOP_MARKET" and order['X'] == 'FILLED':
+                if self.journal:
+                    self.journal.append(EVENT_POSITION_RESET, self.journal_symbol,
+                                        side=SIDES.get(self.position['side'], 0),
+                                        order_id=self.position['orderId'] or 0, event_time=order['T'])
                 self.stop_order_id = None
                 self.position['side'] = None
                 self.position['orderId'] = None
-                logger.info(f"Сработал стоп:"
-                            f"\n{json.dumps(message['data']['o'], indent=2)}"
-                            f"\nДанные о позиции сброшены")
+                logger.info(f"Сработал стоп {order['i']}: {order['z']} по {order['ap']}, данные о позиции сброшены")
+                self.save_snapshot()
             # Если информация об ордере входа в позицию
-            if message['data']['o']['i'] == self.position['orderId'] and message['data']['o']['X'] == 'FILLED':
-                logger.info(f"Информация о {'покупке' if self.position['side'] == 'BUY' else 'продаже'}:"
-                            f"\n{json.dumps(message['data']['o'], indent=2)}")
-        # Фильтр потока свечей (обновление ордеров)
-        if message['stream'] == self.candles_stream:
-            if message['data']['k']['x']:
-                Thread(target=self.edit_data_arrays(data=message['data']['k']))
-            Thread(target=self.real_time_close_price(real_time_close_price=float(message['data']['k']['c'])))
+            if order['i'] == self.position['orderId'] and order['X'] == 'FILLED':
+                metrics.since('signal_to_fill', self.signal_ns)
+                logger.info(f"Исполнена {'покупка' if self.position['side'] == 'BUY' else 'продажа'} {order['i']}: "
+                            f"{order['z']} по {order['ap']}")
+
+    @property
+    def queue_depth(self) -> dict[str, int]:
+        return self.pipeline.depth() if self.pipeline else {}
+
+    def handle_kline(self, kline: dict):
+        start = metrics.now()
+        self.received_ns = kline.get('received_ns', start)
+        metrics.record('queue', start - self.received_ns)
+        if kline['x']:
+            self.edit_data_arrays(data=kline)
+        self.real_time_close_price(real_time_close_price=float(kline['c']))
+        metrics.since('kline_handler', start)
+        metrics.count('klines')
 
     def get_start_data(self):
-        # Получение списка свечей
-        candles = self.client.get_candles(ticker=self.ticker, interval=self.interval, limit=self.accuracy)
-        if (time.time() * 1000) < candles[-1][6]:
-            candles.pop()
-        numpy_candles = numpy.array(candles)
-        # Заполнение списка цен закрытия
-        self.close_prices = numpy_candles[:, 4].astype(float)
-        # Заполнение списка вершин
-        self.high_prices = numpy_candles[:, 2].astype(float)
-        # Заполнение списка низов
-        self.low_prices = numpy_candles[:, 3].astype(float)
+        if self.restore_snapshot():
+            return
+        if self.history:
+            # Дозагрузка в кэш только недостающих свечей, колонки читаются без копирования
+            columns = self.history.update(ticker=self.ticker, interval=self.interval, limit=self.accuracy)
+            self.candles.extend(numpy.column_stack([columns[name][-self.accuracy:]
+                                                    for name in ('open', 'high', 'low', 'close', 'volume')]))
+            self.last_candle_time = int(columns['open_time'][-1])
+        else:
+            # Получение списка свечей
+            candles = self.client.get_candles(ticker=self.ticker, interval=self.interval, limit=self.accuracy)
+            if market_clock.now_ms() < candles[-1][6]:
+                candles.pop()
+            # Заполнение буфера ценами открытия, вершин, низов, закрытия и объемами
+            self.candles.extend(numpy.array(candles)[:, 1:6].astype(float))
+            self.last_candle_time = int(candles[-1][0])
         # Заполнение списков последних значений
         # Для этого сначала получаем последние значения
-        self.previous_short_value = ema(close_prices=self.close_prices, period=self.short_ema)
-        self.previous_long_value = ema(close_prices=self.close_prices, period=self.long_ema)
-        # Используются три последних значения, чтобы избежать входа в точке ложного (кратковременного) пересечения
-        # Заполняется на старте, что бы не вышло ошибок при первой проверке пустого списка
-        # Так как они будут равны ни одно из условий проверки не выполнится
-        for i in range(120):
-            self.previous_shor_list.append(self.previous_short_value)
-            self.previous_long_list.append(self.previous_long_value)
+        self.previous_short_value = self.short_ema_indicator.seed(close_prices=self.close_prices)
+        self.previous_long_value = self.long_ema_indicator.seed(close_prices=self.close_prices)
+        # Используются последние значения, чтобы избежать входа в точке ложного (кратковременного) пересечения
+        # Окно заполняется на старте одинаковыми значениями стартовых скользящих
+        self.signal_state.seed(short_value=self.previous_short_value, long_value=self.previous_long_value)
+        self.signal_state.extend(high_prices=self.high_prices, low_prices=self.low_prices)
+
+    def warmup_klines(self) -> list[list]:
+        # Закрытые свечи окна в формате :meth:`Binance.get_candles` (стартовый архив для журнала кадров)
+        step = INTERVAL_MILLISECONDS[self.interval]
+        window = self.candles.window()
+        first = self.last_candle_time - (window.shape[0] - 1) * step
+        return [[first + index * step, *candle, first + (index + 1) * step - 1]
+                for index, candle in enumerate(window.tolist())]
+
+    def parameters(self) -> list:
+        # Параметры, при которых снимок состояния совместим со стратегией
+        return [self.ticker.upper(), self.interval, self.accuracy, self.short_ema, self.long_ema,
+                self.signal_state.confirmation]
+
+    def save_snapshot(self):
+        if not self.snapshot:
+            return
+        start = metrics.now()
+        with self.lock:
+            position, stop_order_id = dict(self.position), self.stop_order_id
+        # Запись на диск выполняет фоновый поток, в потоке сигналов только копируется состояние
+        self.snapshot.submit(arrays={'candles': self.candles.window()},
+                             values={'parameters': self.parameters(),
+                                     'last_candle_time': self.last_candle_time,
+                                     'short_ema_value': self.short_ema_indicator.value,
+                                     'long_ema_value': self.long_ema_indicator.value,
+                                     'signal_state': self.signal_state.state(),
+                                     'position': position,
+                                     'stop_order_id': stop_order_id})
+        metrics.since('snapshot', start)
+
+    def restore_snapshot(self) -> bool:
+        """
+        Восстанавливает состояние из снимка и догружает закрытые свечи, пропущенные за время остановки
+
+        :return: :class:`bool` состояние восстановлено, иначе требуется полная загрузка архива
+        """
+        loaded = self.snapshot.load() if self.snapshot else None
+        if not loaded:
+            return False
+        arrays, values = loaded
+        if values['parameters'] != self.parameters():
+            logger.info('Параметры снимка состояния не совпадают с параметрами стратегии')
+            return False
+        missed = self.missed_candles(last_candle_time=values['last_candle_time'])
+        if missed is None:
+            logger.info('Снимок состояния устарел: пропущено больше свечей, чем хранится в окне')
+            return False
+        self.candles.clear()
+        self.candles.extend(arrays['candles'])
+        self.short_ema_indicator.value = values['short_ema_value']
+        self.long_ema_indicator.value = values['long_ema_value']
+        self.signal_state.restore(values['signal_state'])
+        self.position = values['position']
+        self.stop_order_id = values['stop_order_id']
+        self.last_candle_time = values['last_candle_time']
+        # Пропущенные свечи проводятся так же, как закрытые свечи потока
+        for open_time, open_price, high_price, low_price, close_price, volume in missed:
+            self.push_candle(open_time=int(open_time), open_price=float(open_price), high_price=float(high_price),
+                             low_price=float(low_price), close_price=float(close_price), volume=float(volume))
+            self.signal_state.update(short_value=self.short_ema_indicator.value,
+                                     long_value=self.long_ema_indicator.value)
+        self.previous_short_value = self.short_ema_indicator.value
+        self.previous_long_value = self.long_ema_indicator.value
+        self.restored = True
+        logger.info(f"Состояние восстановлено из снимка, догружено свечей: {missed.shape[0]}")
+        return True
+
+    def missed_candles(self, last_candle_time: int) -> numpy.ndarray:
+        """
+        Возвращает закрытые свечи, открытые после `last_candle_time`
+
+        :param last_candle_time: время открытия последней обработанной свечи
+
+        :return: :class:`numpy.ndarray` ``(количество, 6)``: время открытия и OHLCV, или ``None``, если пропуск не
+            меньше окна стратегии
+        """
+        if self.history:
+            columns = self.history.update(ticker=self.ticker, interval=self.interval, limit=self.accuracy)
+            start = int(numpy.searchsorted(columns['open_time'], last_candle_time, side='right'))
+            candles = numpy.column_stack([columns[name][start:]
+                                          for name in ('open_time', 'open', 'high', 'low', 'close', 'volume')])
+        else:
+            klines = self.client.get_candles(ticker=self.ticker, interval=self.interval,
+                                             start_time=last_candle_time + 1, limit=self.accuracy + 1)
+            if klines and market_clock.now_ms() < klines[-1][6]:
+                klines.pop()
+            candles = klines_to_array(klines)[:, :6] if klines else numpy.empty((0, 6))
+        # Свечи должны продолжать окно без разрыва
+        if candles.shape[0] >= self.accuracy or \
+                (candles.shape[0] and candles[0, 0] != last_candle_time + INTERVAL_MILLISECONDS[self.interval]):
+            return None
+        return candles
+
+    def reconcile(self, open_orders: list[dict], positions: list[dict] = None):
+        """
+        Сверяет восстановленные позицию и стоп с позицией и открытыми ордерами площадки
+
+        .. Note:: При наличии позиций площадки (:meth:`Binance.get_positions`, фьючерсы) источник истины - объем
+        позиции тикера: если позиции в направлении стратегии нет, данные о позиции сбрасываются, а оставшийся стоп
+        отменяется; если позиция есть, а стопа нет среди открытых ордеров, стоп выставляется заново. Без позиций (спот)
+        позиция всегда защищена стопом, поэтому отсутствие стопа среди открытых ордеров означает, что за время
+        остановки стоп исполнился или был отменен и позиции нет. Ордера и позиции всех тикеров можно получить одним
+        запросом и передать всем состояниям.
+
+        :param open_orders: открытые ордера
+        :param positions: позиции площадки, ``None`` - сверка только по открытым ордерам
+        """
+        if not self.needs_reconcile:
+            return
+        ticker = self.ticker.upper()
+        order_ids = {order['orderId'] for order in open_orders if order['symbol'] == ticker}
+        stop_open = self.stop_order_id is not None and self.stop_order_id in order_ids
+        if positions is None:
+            held = stop_open
+        else:
+            amount = sum(float(position['positionAmt']) for position in positions if position['symbol'] == ticker)
+            held = amount * SIDES.get(self.position['side'], 0) > 0
+        if held and stop_open:
+            logger.info(f"Позиция {self.position['side']} и стоп ордер {self.stop_order_id} подтверждены")
+            return
+        if held:
+            logger.info(f"Стоп ордер {self.stop_order_id} не найден среди открытых ордеров, стоп позиции "
+                        f"{self.position['side']} выставляется заново")
+            self.rearm_stop()
+        else:
+            logger.info(f"Позиция {self.position['side']} не найдена на площадке, данные о позиции сброшены")
+            if stop_open:
+                self.client.cancel_order(ticker=self.ticker, order_id=self.stop_order_id)
+            with self.lock:
+                self.stop_order_id = None
+                self.position = {'side': None, 'orderId': None}
+        self.save_snapshot()
+
+    def rearm_stop(self):
+        # Стоп восстановленной позиции выставляется синхронным клиентом до приема кадров, повтор - с тем же
+        # идентификатором клиента после проверки, не принят ли ордер
+        stop_side = 'SELL' if self.position['side'] == 'BUY' else 'BUY'
+        client_order_id = self.client.new_client_order_id()
+        stop_order = {}
+        for attempt in range(self.order_attempts):
+            time.sleep(self.retry_delay * attempt)
+            if attempt:
+                stop_order = self.client.get_order(ticker=self.ticker, client_order_id=client_order_id)
+            if not stop_order.get('orderId'):
+                stop_order = self.client.trailing_stop_order(ticker=self.ticker, side=stop_side,
+                                                             quantity=self.quantity, trailing_delta=0.1,
+                                                             client_order_id=client_order_id)
+            if stop_order.get('orderId'):
+                break
+        with self.lock:
+            self.stop_order_id = stop_order.get('orderId')
+        if not self.stop_order_id:
+            logger.info(f"Стоп ордер {client_order_id} не подтвержден после {self.order_attempts} попыток, "
+                        f"позиция без защиты")
+            return
+        if self.journal:
+            self.journal.append(EVENT_ORDER, self.journal_symbol, side=SIDES[stop_side], order_id=self.stop_order_id,
+                                quantity=self.quantity, order_type=ORDER_TYPE_CODES.get(stop_order.get('type'), 0))
+        logger.info(f"Выставлен стоп ордер: {self.stop_order_id}")
+
+    @property
+    def needs_reconcile(self) -> bool:
+        return self.restored and bool(self.position['side'] or self.stop_order_id)
+
+    def push_candle(self, open_time: int, open_price: float, high_price: float, low_price: float,
+                    close_price: float, volume: float):
+        self.store_candle(open_time=open_time, open_price=open_price, high_price=high_price, low_price=low_price,
+                          close_price=close_price, volume=volume)
+        # Фиксация значений скользящих по закрытой свече
+        self.short_ema_indicator.update(close_price=close_price)
+        self.long_ema_indicator.update(close_price=close_price)
+
+    def store_candle(self, open_time: int, open_price: float, high_price: float, low_price: float,
+                     close_price: float, volume: float):
+        # Добавление закрытой свечи в буфер, самая старая вытесняется (храним только последние accuracy свечей).
+        # Скользящие не изменяются: их фиксирует :meth:`push_candle` или пакет (:class:`BatchSignals`)
+        self.candles.push(open_price=open_price,
+                          high_price=high_price,
+                          low_price=low_price,
+                          close_price=close_price,
+                          volume=volume)
+        self.signal_state.push_candle(high_price=high_price, low_price=low_price)
+        self.last_candle_time = open_time
 
     def edit_data_arrays(self, data: dict):
-        # Обеспечивая сдвиг данных, храним только последние accuracy свечей
-        # Удаление последнего элемента в списках закрытия, вершин и минимумов
-        self.close_prices = numpy.delete(self.close_prices, 0)
-        self.high_prices = numpy.delete(self.high_prices, 0)
-        self.low_prices = numpy.delete(self.low_prices, 0)
-        # Обновление данных (добавление в конец нового значения) в списках цен закрытия, вершин и минимумов
-        self.close_prices = numpy.append(self.close_prices, float(data['c']))
-        self.high_prices = numpy.append(self.high_prices, float(data['h']))
-        self.low_prices = numpy.append(self.low_prices, float(data['l']))
+        self.push_candle(open_time=data['t'],
+                         open_price=float(data['o']),
+                         high_price=float(data['h']),
+                         low_price=float(data['l']),
+                         close_price=float(data['c']),
+                         volume=float(data['v']))
+        self.candle_closed()
+
+    def candle_closed(self):
         if not self.position['side']:
             logger.info('Нет сигнала')
         else:
             logger.info(f"Открыта {'длинная' if self.position['side'] == 'BUY' else 'короткая'} позиция")
+        self.save_snapshot()
 
     def real_time_close_price(self, real_time_close_price: float):
-        # Изменение списка цен закрытия в режиме реального времени
-        self.real_time_close_prices = numpy.append(self.close_prices, real_time_close_price)
-        self.check_signal()
+        # Обновление слота текущей свечи без копирования окна
+        self.candles.set_live(column='close', value=real_time_close_price)
+        # Проверка сигнала по текущей цене незакрытой свечи
+        self.check_signal(close_price=real_time_close_price)
 
     def get_last_low(self):
-        array = numpy.flip(self.low_prices)
-        last_low = array[0]
-        for index in range(self.accuracy):
-            if array[index] > last_low:
-                return last_low
-            else:
-                last_low = array[index]
+        return self.signal_state.last_low()
 
     def get_last_high(self):
-        array = numpy.flip(self.high_prices)
-        last_high = array[0]
-        for index in range(self.accuracy):
-            if array[index] < last_high:
-                return last_high
-            else:
-                last_high = array[index]
-
-    def open_position(self, side: str):
-        # Если нет позиции
-        if not self.position['side']:
-            # Входим в рынок
+        return self.signal_state.last_high()
+
+    async def send_order(self, request, *args, **kwargs) -> dict:
+        # Ордер с таймаутом, ошибка запроса возвращается пустым ответом для повторной отправки. Ответ не в формате
+        # JSON (страница ошибки 5xx прокси или площадки) вызывает ValueError при разборе и тоже повторяется
+        try:
+            return await asyncio.wait_for(request(*args, **kwargs), timeout=self.order_timeout)
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as error:
+            logger.info(f"Ошибка отправки ордера: {error!r}")
+            return {}
+
+    async def resend_order(self, request, client_order_id: str, **kwargs) -> dict:
+        # Перед повторной отправкой проверяется, не принят ли ордер с тем же идентификатором клиента
+        order = await self.send_order(self.async_client.get_order, ticker=self.ticker, client_order_id=client_order_id)
+        if order.get('orderId'):
+            return order
+        return await self.send_order(request, ticker=self.ticker, client_order_id=client_order_id, **kwargs)
+
+    async def retry_order(self, order: dict, request, client_order_id: str, **kwargs) -> dict:
+        # Повторная отправка не больше order_attempts раз с нарастающей задержкой
+        for attempt in range(self.order_attempts):
+            if order.get('orderId'):
+                return order
+            await asyncio.sleep(self.retry_delay * attempt)
+            order = await self.resend_order(request, client_order_id=client_order_id, **kwargs)
+        return order
+
+    async def enter_position(self, side: str, stop_side: str):
+        """
+        Открывает позицию (двойным объемом при развороте) под защитой скользящего стопа: ордер входа и новый стоп
+        отправляются одним запросом (:meth:`AsyncBinance.protected_market_order`). Неуспешные ордера отправляются
+        повторно с теми же идентификаторами клиента, поэтому повтор не создает второй ордер. При развороте стоп
+        предыдущей позиции отменяется только после подтверждения входа: если вход не подтвержден, предыдущая позиция
+        остается под своим стопом
+        """
+        with self.lock:
+            reversal = bool(self.position['side'])
+            previous_stop_id = self.stop_order_id if reversal else None
+        if not reversal:
             quantity = self.quantity
         else:
-            # Встаем на разворот
             quantity = self.quantity * 2
             logger.info('Вход на разворот')
-            # Отменяем лимитный стоп предыдущей позиции
-            self.client.cancel_order(ticker=self.ticker, order_id=self.stop_order_id)
-
-        while True:
-            order = self.client.market_order(ticker=self.ticker, side=side, quantity=quantity)
-            # Проверка на случай возврата ошибки при выставлении ордера
-            if order.get('orderId'):
-                self.position['side'] = side
-                self.position['orderId'] = order['orderId']
-                break
-
-    def set_stop(self, side: str):
-        # Стоп выставляется в цикле, как защита от возможного отказа сервера, до тех пор пока ответ не будет получен
-        while self.stop_order_id is None:
-            stop_order = self.client.trailing_stop_order(ticker=self.ticker,
-                                                         side=side,
-                                                         quantity=self.quantity,
-                                                         trailing_delta=0.1)
-            # Проверка на случай возврата ошибки при выставлении ордера
+        client_order_id = self.async_client.new_client_order_id()
+        stop_client_order_id = self.async_client.new_client_order_id()
+        self.client_order_ids = (client_order_id, stop_client_order_id)
+        orders = await self.send_order(self.async_client.protected_market_order, ticker=self.ticker, side=side,
+                                       quantity=quantity, stop_side=stop_side, stop_quantity=self.quantity,
+                                       trailing_delta=0.1, client_order_id=client_order_id,
+                                       stop_client_order_id=stop_client_order_id)
+        order, stop_order = orders or ({}, {})
+        # Проверка на случай возврата ошибки при выставлении ордеров
+        order = await self.retry_order(order, self.async_client.market_order, client_order_id=client_order_id,
+                                       side=side, quantity=quantity)
+        if not order.get('orderId'):
+            logger.info(f"Ордер входа {client_order_id} не подтвержден после {self.order_attempts} попыток" +
+                        (f", позиция {self.position['side']} остается под стопом {previous_stop_id}"
+                         if previous_stop_id else ''))
+            # Стоп, принятый без ордера входа, не должен открыть позицию
             if stop_order.get('orderId'):
+                await self.send_order(self.async_client.cancel_order, ticker=self.ticker,
+                                      order_id=stop_order['orderId'])
+            return
+        with self.lock:
+            self.position['side'] = side
+            self.position['orderId'] = order['orderId']
+            # Стоп предыдущей позиции хранится до подтверждения отмены
+            if previous_stop_id:
+                self.stop_order_id = None
+                self.previous_stop_id = previous_stop_id
+        metrics.since('signal_to_ack', self.signal_ns)
+        if self.journal:
+            self.journal.append(EVENT_ORDER, self.journal_symbol, side=SIDES[side], order_id=order['orderId'],
+                                quantity=quantity, reference=self.signal_price, order_type=ORDER_TYPE_CODES['MARKET'])
+        stop_order = await self.retry_order(stop_order, self.async_client.trailing_stop_order,
+                                            client_order_id=stop_client_order_id, side=stop_side,
+                                            quantity=self.quantity, trailing_delta=0.1)
+        if stop_order.get('orderId'):
+            with self.lock:
                 self.stop_order_id = stop_order['orderId']
-                logger.info(f"Выставлен стоп ордер: {self.stop_order_id}")
+            metrics.since('signal_to_protected', self.signal_ns)
+            if self.journal:
+                self.journal.append(EVENT_ORDER, self.journal_symbol, side=SIDES[stop_side],
+                                    order_id=self.stop_order_id, quantity=self.quantity, reference=self.signal_price,
+                                    order_type=ORDER_TYPE_CODES.get(stop_order.get('type'), 0))
+            logger.info(f"Выставлен стоп ордер: {self.stop_order_id}")
+        else:
+            logger.info(f"Стоп ордер {stop_client_order_id} не подтвержден после {self.order_attempts} попыток, "
+                        f"позиция без защиты")
+        self.save_snapshot()
+        # Стоп предыдущей позиции направлен против новой позиции, поэтому отменяется и без нового стопа
+        for attempt in range(self.order_attempts):
+            if not self.previous_stop_id:
+                return
+            await asyncio.sleep(self.retry_delay * attempt)
+            if await self.cancel_stop(order_id=previous_stop_id, check=bool(attempt)):
+                logger.info(f"Стоп ордер {previous_stop_id} предыдущей позиции отменён")
+                with self.lock:
+                    self.previous_stop_id = None
+        if self.previous_stop_id:
+            logger.info(f"Отмена стопа {previous_stop_id} предыдущей позиции не подтверждена после "
+                        f"{self.order_attempts} попыток")
+
+    async def cancel_stop(self, order_id: int, check: bool = True) -> bool:
+        # Перед повторной отменой проверяется, не отменен и не исполнен ли стоп
+        if check:
+            order = await self.send_order(self.async_client.get_order, ticker=self.ticker, order_id=order_id)
+            if order.get('status') and order['status'] not in ('NEW', 'PARTIALLY_FILLED'):
+                return True
+        return await self.send_order(self.async_client.cancel_order, ticker=self.ticker, order_id=order_id) is True
+
+    def open_protected_position(self, side: str, stop_side: str):
+        # Запуск в цикле событий асинхронного клиента без ожидания: поток исполнения не блокируется ордерами одной
+        # торговой пары, признак ожидания снимается по завершении
+        future = asyncio.run_coroutine_threadsafe(self.enter_position(side=side, stop_side=stop_side), self.loop)
+        future.add_done_callback(self.position_entered)
+
+    def position_entered(self, future):
+        self.order_pending = False
+        if not future.cancelled() and future.exception():
+            error = future.exception()
+            logger.info(''.join(traceback.format_exception(type(error), error, error.__traceback__)))
+
+    def request_position(self, side: str, stop_side: str):
+        self.signal_ns = metrics.now()
+        metrics.record('receive_to_signal', self.signal_ns - self.received_ns)
+        metrics.count('signals')
+        self.signal_price = self.last_price
+        if self.journal:
+            self.journal.append(EVENT_SIGNAL, self.journal_symbol, side=SIDES[side], price=self.signal_price)
+        # Новые сигналы не проверяются, пока запрос не исполнен
+        self.order_pending = True
+        # Без конвейера ордера отправляются из текущего потока
+        if not self.pipeline:
+            self.open_protected_position(side=side, stop_side=stop_side)
+            return
+        self.pipeline.submit_execution(self.open_protected_position, side, stop_side)
 
     def is_down(self) -> bool:
-        # Проверка, чтобы три последних динамических значения были ниже
-        return all(a < b for a, b in zip(self.previous_shor_list, self.previous_long_list))
+        # Проверка, чтобы все значения окна подтверждения были ниже
+        return self.signal_state.is_down()
 
     def is_up(self) -> bool:
-        # Проверка, чтобы три последних динамических значения были выше
-        return all(a > b for a, b in zip(self.previous_shor_list, self.previous_long_list))
+        # Проверка, чтобы все значения окна подтверждения были выше
+        return self.signal_state.is_up()
 
-    def check_signal(self):
-        # Получаем последнее значения скользящих в режиме реального времени
-        last_short_value = ema(close_prices=self.real_time_close_prices, period=self.short_ema)
+    def check_entry(self, last_short_value: float, last_long_value: float):
+        # Сигнал: все значения окна подтверждения по одну сторону, текущее - по другую
+        self.enter(buy=self.is_down() and last_short_value > last_long_value,
+                   sell=self.is_up() and last_short_value < last_long_value)
+
+    def enter(self, buy: bool, sell: bool):
+        # Фильтруем действия в зависимости наличия открытой позиции
+        with self.lock:
+            side = self.position['side']
+        # Если позиции нет или позиция на продажу и есть сигнал на покупку
+        if side in ('SELL', None) and buy:
+            logger.info('Сигнал на покупку')
+            self.request_position(side='BUY', stop_side='SELL')
+        # Если позиции нет или позиция на покупку и есть сигнал на продажу
+        if side in ('BUY', None) and not self.order_pending and sell:
+            logger.info('Сигнал на продажу')
+            self.request_position(side='SELL', stop_side='BUY')
+
+    def check_signal(self, close_price: float):
+        start = metrics.now()
+        self.last_price = close_price
+        # Получаем последнее значения скользящих в режиме реального времени (без изменения зафиксированных значений)
+        last_short_value = self.short_ema_indicator.preview(close_price=close_price)
         # logger.debug(last_short_value)
-        last_long_value = ema(close_prices=self.real_time_close_prices, period=self.long_ema)
+        last_long_value = self.long_ema_indicator.preview(close_price=close_price)
         # logger.debug(last_long_value)
+        decision = metrics.now()
+        metrics.record('indicator', decision - start)
 
-        # Фильтруем действия в зависимости наличия открытой позиции
-        # Если позиции нет или позиция на продажу
-        if self.position['side'] in ('SELL', None):
-            # Проверяем есть ли сигнал на покупку
-            if self.is_down() and last_short_value > last_long_value:
-                logger.info('Сигнал на покупку')
-                self.open_position(side='BUY')
-                self.set_stop(side='SELL')
-        # Если позиции нет или позиция на покупку
-        if self.position['side'] in ('BUY', None):
-            # Проверяем есть ли сигнал на продажу
-            if self.is_up() and last_short_value < last_long_value:
-                logger.info('Сигнал на продажу')
-                self.open_position(side='SELL')
-                self.set_stop(side='BUY')
-
-        # Удаление последних значений в списках значений последних скользящих реального времени
-        del self.previous_shor_list[0]
-        del self.previous_long_list[0]
-        # Добавление в конец последних значений скользящих реального времени
-        self.previous_shor_list.append(last_short_value)
-        self.previous_long_list.append(last_long_value)
-
-    def get_listen_key(self) -> str:
-        response = self.client.get_listen_key()
-        if response['listenKey']:
-            return response['listenKey']
-        else:
-            logger.info('Ошибка получения ключа потока пользовательских данных')
-            self.close()
-
-    def keep_alive_listen_key(self):
-        logger.info('Отправка запроса на продление подключения к потоку пользовательских данных')
-        while True:
-            response = self.client.keep_alive_listen_key(self.listen_key)
-            # Обработка ответа
-            if response == {}:
-                logger.info('Продление подключения к потоку пользовательских данных подтверждено')
-                break
-            else:
-                logger.info('Ошибка продления подключения к потоку пользовательских данных')
-        Timer(interval=1800, function=self.keep_alive_listen_key).start()
-
-    def close_listen_key(self):
-        logger.info('Отправка уведомления об отключении от потока пользовательских данных')
-        response = self.client.close_listen_key(self.listen_key)
-        if response == {}:
-            logger.info('Отключение от потока пользовательских данных подтверждено')
-        else:
-            logger.info('Ошибка отключения от потока пользовательских данных')
+        # Пока предыдущий запрос на вход исполняется, сигналы не проверяются
+        if not self.order_pending:
+            self.check_entry(last_short_value=last_short_value, last_long_value=last_long_value)
+            metrics.since('signal', decision)
+
+        # Добавление последних значений скользящих реального времени в окно подтверждения
+        self.signal_state.update(short_value=last_short_value, long_value=last_long_value)
+
+
+class EmaCrossOver(ListenKeyMixin, EmaCrossOverState, WebSocketApp):
+    def __init__(self, ticker: str, interval: str, accuracy: int, short_ema: int, long_ema: int, quantity: float,
+                 future: bool = False, cache: bool = False, confirmation: int = 120, metrics_port: int = None,
+                 metrics_interval: float = None, record_path: str = None, snapshot: bool = False,
+                 journal_path: str = None):
+        """
+        Стратегия основанная на пересечении экспоненциальных скользящих средних.
+        Период скользящих, объем позиции и тайм фрейм задается пользователем.
+        Стоп выставляется автоматически на уровень ближайшего последнего максимума/минимума,
+        с учетом 2% проскальзывания.
+
+        Для изменения уровня проскальзывания передайте соответсвующий параметр в функцию, размещающую стоп ордер
+
+        :param ticker: тикер торговой пары
+        :param interval: тайм фрейм
+        :param accuracy: точность (количество свечей используемых при расчете EMA)
+        :param short_ema: период короткой скользящей
+        :param long_ema: период длинной скользящей
+        :param quantity: объем позиции
+        :param cache: загружать стартовый архив свечей через локальный кэш :class:`KlineHistory`
+        :param confirmation: количество значений реального времени, подтверждающих направление до пересечения
+        :param metrics_port: порт локального http сервера метрик задержек
+        :param metrics_interval: период вывода метрик задержек в лог в секундах
+        :param record_path: файл журнала сырых кадров потока (:class:`FrameRecorder`)
+        :param snapshot: сохранять снимки состояния и восстанавливаться из них при перезапуске (:class:`StateSnapshot`)
+        :param journal_path: файл журнала торговых событий (:class:`EventJournal`)
+        """
+        # Журнал сырых кадров для воспроизведения
+        self.recorder = FrameRecorder(path=record_path) if record_path else None
+        # Журнал сигналов, ордеров и исполнений
+        self.journal = EventJournal(path=journal_path) if journal_path else None
+        # Метрики задержек
+        if metrics_port:
+            metrics.start_server(port=metrics_port)
+        if metrics_interval:
+            metrics.start_dump(interval=metrics_interval)
+        # Клиент
+        self.client = Binance(api_key=API_KEY, secret_key=SECRET_KEY, is_future=future)
+        # Часы площадки для отбора закрытых свечей стартового архива
+        market_clock.sync(self.client)
+        # Асинхронный клиент и цикл событий для одновременной отправки ордеров
+        async_client = AsyncBinance(api_key=API_KEY, secret_key=SECRET_KEY, is_future=future)
+        loop = asyncio.new_event_loop()
+        Thread(target=loop.run_forever, daemon=True).start()
+        # Конвейер: поток подключения только передает события в стадии сигналов и исполнения
+        pipeline = EventPipeline()
+        # Ключ потока пользовательских данных
+        self.listen_key = self.get_listen_key()
+        logger.info(self.listen_key)
+        # Создание строки подключения
+        url = stream_url(stream_names=[self.listen_key, f"{ticker.lower()}@kline_{interval}"],
+                         listen_key=self.listen_key, future=future)
+        WebSocketApp.__init__(self,
+                              url=url,
+                              on_open=self.on_open,
+                              on_message=self.on_message,
+                              on_error=self.on_error,
+                              on_close=self.on_close,
+                              on_ping=self.on_ping)
+        EmaCrossOverState.__init__(self, ticker=ticker, interval=interval, accuracy=accuracy, short_ema=short_ema,
+                                   long_ema=long_ema, quantity=quantity, client=self.client,
+                                   async_client=async_client, loop=loop,
+                                   history=KlineHistory(client=self.client) if cache else None, pipeline=pipeline,
+                                   confirmation=confirmation,
+                                   snapshot=StateSnapshot(path=snapshot_path(ticker=ticker, interval=interval,
+                                                                             short_ema=short_ema, long_ema=long_ema,
+                                                                             future=future)) if snapshot else None,
+                                   journal=self.journal)
+        # Сверка восстановленной позиции с открытыми ордерами
+        if self.needs_reconcile:
+            self.reconcile(open_orders=self.client.get_open_orders(ticker=ticker),
+                           positions=self.client.get_positions(ticker=ticker) if future else None)
+        # Стартовый архив записывается перед кадрами, чтобы воспроизведение начиналось с того же окна
+        if self.recorder:
+            self.recorder.append_warmup(self.candles_stream, self.warmup_klines(),
+                                        parameters={'accuracy': accuracy, 'short_ema': short_ema,
+                                                    'long_ema': long_ema, 'quantity': quantity,
+                                                    'confirmation': confirmation})
+        # Прием кадров: маршрутизация по имени потока и объединение тиков при отставании
+        self.ingest = StreamIngest(pipeline=pipeline, listen_key=self.listen_key,
+                                   on_order_update=self.handle_order_update,
+                                   kline_handlers={self.candles_stream: [self.handle_kline]})
+        self.run_forever = self.run_forever(reconnect=10)
+
+    def __str__(self):
+        return f"Стратегия: Пересечение скользящих средних\n" \
+               f"Биржа: {self.client.exchange}\n" \
+               f"Url: {self.url}\n" \
+               f"Тикер: {self.ticker}\n" \
+               f"Рабочий объем: {self.quantity}\n" \
+               f"Тайм фрейм: {self.interval}\n" \
+               f"Точность: {self.quantity}\n" \
+               f"Короткая EMA: {self.short_ema}\n" \
+               f"Длинная EMA: {self.long_ema}\n" \
+               f"Архив цен закрытия: {self.close_prices}"
+
+    def on_open(self, ws):
+        logger.info('Бот запущен')
+        self.keep_alive_listen_key()
+
+    def on_error(self, ws, error):
+        logger.info(traceback.format_exc())
+
+    def on_close(self, ws, close_status_code, close_message):
+        self.close_listen_key()
+        self.save_snapshot()
+        snapshot_writer.flush()
+        # Запись оставшихся событий и кадров журналов
+        for journal in (self.journal, self.recorder):
+            if journal:
+                journal.close()
+        # Сессия асинхронного клиента закрывается в его цикле событий
+        close_session(self.async_client, self.loop)
+        logger.info('Бот остановлен')
+
+    def on_ping(self, ws, message):
+        logger.info('Получен пинг')
+
+    def on_message(self, ws, message):
+        if self.recorder:
+            self.recorder.append(message)
+        self.ingest.on_frame(message)
@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+from threading import Condition, Lock, Thread
+import zipfile
+
+import numpy
+
+from constants import STATE_SNAPSHOT_DIR
+
+logger = logging.getLogger('app.strategies.snapshot')
+
+
+def snapshot_path(ticker: str, interval: str, short_ema: int, long_ema: int, future: bool,
+                  root: str = STATE_SNAPSHOT_DIR) -> str:
+    """
+    Формирует путь файла снимка состояния стратегии
+
+    :param ticker: тикер
+    :param interval: интервал свечей
+    :param short_ema: период короткой скользящей
+    :param long_ema: период длинной скользящей
+    :param future: фьючерсный рынок
+    :param root: корневой каталог снимков
+
+    :return: :class:`str`
+    """
+    return os.path.join(root, 'futures' if future else 'spot', f"{ticker.upper()}_{interval}_{short_ema}_{long_ema}.npz")
+
+
+class StateSnapshot:
+    """
+    Снимок состояния стратегии на локальном диске
+    """
+    def __init__(self, path: str):
+        """
+        Создает объект класса :class:`StateSnapshot`.
+
+        .. Note:: Массивы (окно свечей) сохраняются в формате ``.npz`` без сжатия, скалярные значения - одной строкой
+        JSON в том же файле. Запись выполняется во временный файл, который сбрасывается на диск до атомарной замены,
+        поэтому при прерывании записи или отключении питания остается предыдущий целый снимок. :meth:`submit`
+        передает снимок фоновому потоку записи (:data:`snapshot_writer`).
+
+        :param path: файл снимка
+        """
+        self.path = path
+        self.lock = Lock()
+
+    def save(self, arrays: dict[str, numpy.ndarray], values: dict[str, any]):
+        """
+        Сохраняет снимок
+
+        :param arrays: массивы по имени
+        :param values: скалярные значения, сериализуемые в JSON
+        """
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            temporary = f"{self.path}.tmp"
+            with open(temporary, 'wb') as file:
+                numpy.savez(file, values=numpy.array(json.dumps(values)), **arrays)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temporary, self.path)
+
+    def submit(self, arrays: dict[str, numpy.ndarray], values: dict[str, any]):
+        """
+        Сохраняет снимок в фоновом потоке (:meth:`SnapshotWriter.submit`). Массивы и значения не должны изменяться
+        после передачи
+
+        :param arrays: массивы по имени
+        :param values: скалярные значения, сериализуемые в JSON
+        """
+        snapshot_writer.submit(snapshot=self, arrays=arrays, values=values)
+
+    def load(self) -> tuple[dict[str, numpy.ndarray], dict[str, any]]:
+        """
+        Загружает снимок
+
+        :return: :class:`tuple` (массивы, скалярные значения) или ``None``, если снимка нет или он поврежден
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with numpy.load(self.path) as data:
+                values = json.loads(str(data['values']))
+                arrays = {name: data[name] for name in data.files if name != 'values'}
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as error:
+            logger.info(f"Снимок состояния {self.path} не прочитан: {error!r}")
+            return None
+        return arrays, values
+
+
+class SnapshotWriter:
+    """
+    Фоновая запись снимков состояния
+    """
+    def __init__(self):
+        """
+        Создает объект класса :class:`SnapshotWriter`.
+
+        .. Note:: Снимок сохраняется после каждой закрытой свечи и изменения позиции, поэтому запись на диск вынесена
+        из потока сигналов в один фоновый поток на процесс. :meth:`submit` только заменяет ожидающий снимок файла:
+        если предыдущий снимок еще не записан, записывается только последний, так как он содержит всё состояние.
+        Перед остановкой ожидающие снимки дописываются :meth:`flush`.
+        """
+        self.pending: dict[str, tuple[StateSnapshot, dict[str, numpy.ndarray], dict[str, any]]] = {}
+        self.condition = Condition()
+        self.thread = None
+        self.writing = False
+        self.written = 0
+        self.coalesced = 0
+
+    def submit(self, snapshot: StateSnapshot, arrays: dict[str, numpy.ndarray], values: dict[str, any]):
+        """
+        Ставит снимок в очередь записи, заменяя незаписанный снимок того же файла
+
+        :param snapshot: снимок состояния
+        :param arrays: массивы по имени
+        :param values: скалярные значения, сериализуемые в JSON
+        """
+        with self.condition:
+            if snapshot.path in self.pending:
+                self.coalesced += 1
+            self.pending[snapshot.path] = (snapshot, arrays, values)
+            if self.thread is None:
+                self.thread = Thread(target=self.work, name='snapshot-writer', daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Ожидает записи всех снимков
+
+        :param timeout: максимальное время ожидания в секундах
+
+        :return: :class:`bool` все снимки записаны
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.writing, timeout)
+
+    def work(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                snapshot, arrays, values = self.pending.pop(next(iter(self.pending)))
+                self.writing = True
+            try:
+                snapshot.save(arrays=arrays, values=values)
+                self.written += 1
+            except OSError as error:
+                logger.info(f"Снимок состояния {snapshot.path} не сохранен: {error!r}")
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
+
+
+# Общий поток записи снимков процесса
+snapshot_writer = SnapshotWriter()
@@ -0,0 +1,78 @@
+import asyncio
+from concurrent.futures import TimeoutError
+import logging
+from threading import Timer
+
+from constants import BINANCE_FUTURES_STREAM_URL, BINANCE_SPOT_STREAM_URL
+
+logger = logging.getLogger('app.strategies.user_data')
+
+
+def stream_url(stream_names: list[str], listen_key: str, future: bool) -> str:
+    """
+    Формирует строку подключения к объединенному потоку (combined stream)
+
+    :param stream_names: имена потоков, включая ключ потока пользовательских данных
+    :param listen_key: ключ потока пользовательских данных
+    :param future: подключение к фьючерсному рынку
+
+    :return: :class:`str`
+    """
+    if future:
+        return f"{BINANCE_FUTURES_STREAM_URL}/stream?streams={'/'.join(name for name in stream_names)}" \
+               f"&listenKey={listen_key}"
+    return f"{BINANCE_SPOT_STREAM_URL}/stream?streams={'/'.join(name for name in stream_names)}"
+
+
+def close_session(async_client, loop: asyncio.AbstractEventLoop, timeout: float = 5.0):
+    """
+    Закрывает сессию асинхронного клиента в цикле событий, в котором она создана. Ордера, еще ожидающие ответа,
+    завершаются ошибкой соединения
+
+    :param async_client: асинхронный клиент торговой площадки (:class:`AsyncBinance`)
+    :param loop: цикл событий клиента, работающий в отдельном потоке
+    :param timeout: максимальное время ожидания в секундах
+    """
+    try:
+        asyncio.run_coroutine_threadsafe(async_client.close(), loop).result(timeout=timeout)
+    except TimeoutError:
+        logger.info(f"Сессия асинхронного клиента не закрыта за {timeout} с")
+
+
+class ListenKeyMixin:
+    """
+    Управление ключом потока пользовательских данных для подключений :class:`WebSocketApp`.
+    Требует атрибуты ``client`` и ``listen_key``
+    """
+    def get_listen_key(self) -> str:
+        response = self.client.get_listen_key()
+        if response['listenKey']:
+            return response['listenKey']
+        else:
+            logger.info('Ошибка получения ключа потока пользовательских данных')
+            self.close()
+
+    def keep_alive_listen_key(self):
+        logger.info('Отправка запроса на продление подключения к потоку пользовательских данных')
+        while True:
+            response = self.client.keep_alive_listen_key(self.listen_key)
+            # Обработка ответа
+            if response == {}:
+                logger.info('Продление подключения к потоку пользовательских данных подтверждено')
+                break
+            else:
+                logger.info('Ошибка продления подключения к потоку пользовательских данных')
+        # Таймер продления не задерживает завершение процесса и отменяется при отключении
+        self.keep_alive_timer = Timer(interval=1800, function=self.keep_alive_listen_key)
+        self.keep_alive_timer.daemon = True
+        self.keep_alive_timer.start()
+
+    def close_listen_key(self):
+        if getattr(self, 'keep_alive_timer', None):
+            self.keep_alive_timer.cancel()
+        logger.info('Отправка уведомления об отключении от потока пользовательских данных')
+        response = self.client.close_listen_key(self.listen_key)
+        if response == {}:
+            logger.info('Отключение от потока пользовательских данных подтверждено')
+        else:
+            logger.info('Ошибка отключения от потока пользовательских данных')
@@ -0,0 +1,59 @@
+from market_data import CandleAggregator
+
+MINUTE = 60_000
+
+
+def kline(minute: int, price: float, closed: bool = True) -> dict:
+    open_time = minute * MINUTE
+    return {'t': open_time, 'T': open_time + MINUTE - 1, 's': 'ETHUSDT', 'i': '1m', 'o': price, 'h': price + 1,
+            'l': price - 1, 'c': price + 0.5, 'v': 1.0, 'x': closed}
+
+
+def aggregator(bars: list) -> CandleAggregator:
+    result = CandleAggregator(ticker='ETHUSDT', base_interval='1m')
+    result.subscribe(interval='5m', handler=bars.append)
+    return result
+
+
+def test_bucket_closes_with_last_base_candle():
+    bars = []
+    candles = aggregator(bars)
+    for minute in range(5):
+        candles.handle_kline(kline(minute, price=100 + minute))
+    assert [bar['x'] for bar in bars] == [False, False, False, False, True]
+    closed = bars[-1]
+    assert (closed['t'], closed['T']) == (0, 5 * MINUTE - 1)
+    assert (closed['o'], closed['h'], closed['l'], closed['c'], closed['v']) == (100, 105, 99, 104.5, 5.0)
+
+
+def test_bucket_closes_on_next_bucket_after_gap():
+    bars = []
+    candles = aggregator(bars)
+    for minute in (0, 1, 2):
+        candles.handle_kline(kline(minute, price=100 + minute))
+    # Свечи 3-5 пропущены: свеча 0-4 закрывается накопленными значениями при переходе к следующему интервалу
+    candles.handle_kline(kline(6, price=200, closed=False))
+    closed, current = bars[-2:]
+    assert closed['x'] and (closed['t'], closed['o'], closed['h'], closed['l'], closed['c'], closed['v']) == \
+        (0, 100, 103, 99, 102.5, 3.0)
+    assert not current['x'] and (current['t'], current['o'], current['c']) == (5 * MINUTE, 200, 200.5)
+
+
+def test_live_ticks_do_not_accumulate():
+    bars = []
+    candles = aggregator(bars)
+    candles.handle_kline(kline(0, price=100))
+    candles.handle_kline(kline(1, price=150, closed=False))
+    candles.handle_kline(kline(1, price=90, closed=False))
+    assert (bars[-1]['h'], bars[-1]['l'], bars[-1]['v']) == (101, 89, 2.0)
+    candles.handle_kline(kline(1, price=95))
+    assert (bars[-1]['h'], bars[-1]['l'], bars[-1]['c'], bars[-1]['v']) == (101, 94, 95.5, 2.0)
+
+
+def test_seed_resumes_partial_bucket():
+    bars = []
+    candles = aggregator(bars)
+    candles.seed([[minute * MINUTE, 100, 101, 99, 100.5, 1.0, (minute + 1) * MINUTE - 1] for minute in range(5, 8)])
+    candles.handle_kline(kline(8, price=110))
+    candles.handle_kline(kline(9, price=120))
+    assert bars[-1]['x'] and (bars[-1]['t'], bars[-1]['o'], bars[-1]['h'], bars[-1]['v']) == (5 * MINUTE, 100, 121, 5.0)
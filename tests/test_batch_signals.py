@@ -0,0 +1,58 @@
+import json
+
+from benchmarks.run import kline_frames, make_state
+from benchmarks.stubs import StubBinance, start_loop
+from strategies import BatchSignals
+
+TICKERS = ['ETHUSDT', 'BTCUSDT', 'BNBUSDT']
+PERIODS = [(6, 12), (5, 20)]
+
+
+def recorded_states(client, loop, decisions: list) -> list:
+    states = []
+    for ticker in TICKERS:
+        for short_ema, long_ema in PERIODS:
+            state = make_state(ticker, client, loop, short_ema=short_ema, long_ema=long_ema, confirmation=5)
+            row = len(states)
+            state.enter = lambda buy, sell, row=row: decisions.append((row, buy, sell)) if buy or sell else None
+            states.append(state)
+    return states
+
+
+def test_batch_matches_per_state_signals():
+    client, loop = StubBinance(), start_loop()
+    expected, actual = [], []
+    single = recorded_states(client, loop, expected)
+    batched = recorded_states(client, loop, actual)
+    batch = BatchSignals(batched)
+    handlers = {ticker: batch.handler(ticker) for ticker in TICKERS}
+    streams = {ticker: [json.loads(frame)['data']['k'] for frame in kline_frames(ticker, '1m', 1500, closed_every=7,
+                                                                                  seed=seed)]
+               for seed, ticker in enumerate(TICKERS)}
+    for index in range(1500):
+        for ticker in TICKERS:
+            kline = dict(streams[ticker][index], t=index // 7)
+            for state in single:
+                if state.ticker == ticker:
+                    state.handle_kline(kline)
+            handlers[ticker](kline)
+    batch.flush()
+    assert expected and sorted(expected) == sorted(actual)
+    for one, many in zip(single, batched):
+        assert one.signal_state.state() == many.signal_state.state()
+        assert abs(one.short_ema_indicator.value - many.short_ema_indicator.value) < 1e-9
+        assert abs(one.long_ema_indicator.value - many.long_ema_indicator.value) < 1e-9
+        assert (one.candles.window() == many.candles.window()).all()
+
+
+def test_missing_close_is_flushed_by_next_bar():
+    client, loop = StubBinance(), start_loop()
+    states = [make_state(ticker, client, loop) for ticker in TICKERS[:2]]
+    batch = BatchSignals(states)
+    first, second = batch.handler(TICKERS[0]), batch.handler(TICKERS[1])
+    kline = json.loads(kline_frames(TICKERS[0], '1m', 1, closed_every=1)[0])['data']['k']
+    first(dict(kline, t=1))
+    assert batch.pending
+    second(dict(kline, t=2, x=False))
+    assert not batch.pending
+    assert states[0].last_candle_time == 1
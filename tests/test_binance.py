@@ -0,0 +1,25 @@
+import time
+
+from exchanges import Binance
+
+# Пример подписи из документации Binance (SIGNED Endpoint Examples)
+SECRET_KEY = 'NhqPtmdSJYdKjVHjA7PZj4Mge3R5YNiP1e3UZjInClVN65XAbvqqM6A7H5fATj0j'
+PARAMS = {'symbol': 'LTCBTC', 'side': 'BUY', 'type': 'LIMIT', 'timeInForce': 'GTC', 'quantity': 1, 'price': 0.1,
+          'recvWindow': 5000}
+TIMESTAMP = 1499827319559
+SIGNATURE = 'c8db56825ae71d6d79447849e617115f4a920fa2acdcab2b053c4b2838bd6b71'
+
+
+def test_sign_query_known_vector(monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: (TIMESTAMP + 0.5) / 1000)
+    client = Binance(api_key='key', secret_key=SECRET_KEY, is_future=True)
+    query = client.sign_query(dict(PARAMS))
+    assert query == ('symbol=LTCBTC&side=BUY&type=LIMIT&timeInForce=GTC&quantity=1&price=0.1&recvWindow=5000'
+                     f"&timestamp={TIMESTAMP}&signature={SIGNATURE}")
+
+
+def test_sign_query_quotes_unsafe_values(monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: TIMESTAMP / 1000)
+    client = Binance(api_key='key', secret_key=SECRET_KEY, is_future=True)
+    query = client.sign_query({'batchOrders': '[{"side":"BUY"}]', 'symbol': 'ETHUSDT'})
+    assert query.startswith('batchOrders=%5B%7B%22side%22%3A%22BUY%22%7D%5D&symbol=ETHUSDT&timestamp=')
@@ -0,0 +1,172 @@
+import asyncio
+import json
+
+import aiohttp
+import pytest
+
+from benchmarks.run import make_state
+from benchmarks.stubs import StubBinance
+
+
+class FlakyBinance(StubBinance):
+    """
+    Клиент-заглушка, запросы которого завершаются ошибкой заданное количество раз
+    """
+    def __init__(self, failures: dict[str, int] = None, rejects: dict[str, int] = None):
+        """
+        :param failures: количество ошибок соединения по имени метода
+        :param rejects: количество ответов с ошибкой площадки по имени метода
+        """
+        super().__init__()
+        self.failures = dict(failures or {})
+        self.rejects = dict(rejects or {})
+        self.calls: dict[str, int] = {}
+        self.accepted: dict[str, dict] = {}
+
+    def call(self, name: str, result):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.failures.get(name):
+            self.failures[name] -= 1
+            raise aiohttp.ClientError(f"{name} failed")
+        if self.rejects.get(name):
+            self.rejects[name] -= 1
+            return {'code': -1001, 'msg': 'Internal error'}
+        return result()
+
+    def accept(self, order: dict) -> dict:
+        self.accepted[order['clientOrderId']] = order
+        return order
+
+    def market_order(self, **kwargs) -> dict:
+        return self.call('market_order', lambda: self.accept(StubBinance.market_order(self, **kwargs)))
+
+    def trailing_stop_order(self, **kwargs) -> dict:
+        return self.call('trailing_stop_order', lambda: self.accept(StubBinance.trailing_stop_order(self, **kwargs)))
+
+    def protected_market_order(self, ticker: str, side: str, quantity: float, stop_side: str, stop_quantity: float,
+                               trailing_delta: float, client_order_id: str = None,
+                               stop_client_order_id: str = None) -> tuple[dict, dict]:
+        orders = self.call('protected_market_order', lambda: (
+            self.accept(StubBinance.market_order(self, ticker=ticker, side=side, quantity=quantity,
+                                                 client_order_id=client_order_id)),
+            self.accept(StubBinance.trailing_stop_order(self, ticker=ticker, side=stop_side, quantity=stop_quantity,
+                                                        trailing_delta=trailing_delta,
+                                                        client_order_id=stop_client_order_id))))
+        # Ошибка площадки возвращается в ответе обоих ордеров, как в :meth:`AsyncBinance.protected_market_order`
+        return orders if isinstance(orders, tuple) else (orders, orders)
+
+    def cancel_order(self, **kwargs) -> bool:
+        return self.call('cancel_order', lambda: True)
+
+    def get_order(self, ticker: str, order_id: int = None, client_order_id: str = None) -> dict:
+        self.calls['get_order'] = self.calls.get('get_order', 0) + 1
+        return self.accepted.get(client_order_id) or {'code': -2013, 'msg': 'Order does not exist.'}
+
+
+def entered_state(client: FlakyBinance, side: str = 'BUY'):
+    state = make_state('ETHUSDT', client, loop=None)
+    state.retry_delay = 0
+    asyncio.run(state.enter_position(side=side, stop_side='SELL' if side == 'BUY' else 'BUY'))
+    return state
+
+
+def test_enter_position():
+    client = FlakyBinance()
+    state = entered_state(client)
+    assert state.position['side'] == 'BUY' and state.position['orderId']
+    assert state.stop_order_id
+    assert client.calls == {'protected_market_order': 1}
+
+
+def test_enter_position_retries_failed_request():
+    # Запрос входа со стопом не отправлен: ордера отправляются по отдельности с теми же идентификаторами клиента
+    client = FlakyBinance(failures={'protected_market_order': 1})
+    state = entered_state(client)
+    assert state.position['side'] == 'BUY' and state.stop_order_id
+    assert (client.calls['market_order'], client.calls['trailing_stop_order']) == (1, 1)
+    assert set(client.accepted) == set(state.client_order_ids)
+
+
+def test_enter_position_does_not_resend_accepted_order():
+    # Ордер входа принят, но ответ потерян: повтор находит его по идентификатору клиента
+    client = FlakyBinance(failures={'protected_market_order': 1})
+    client.accepted['stub-1'] = {'orderId': 100, 'status': 'FILLED'}
+    state = entered_state(client)
+    assert state.position['orderId'] == 100
+    assert 'market_order' not in client.calls
+
+
+def test_enter_position_without_stop():
+    # Стоп отклоняется при каждой попытке: позиция открыта, повторов не больше order_attempts
+    client = FlakyBinance(rejects={'protected_market_order': 1, 'trailing_stop_order': 100})
+    state = entered_state(client)
+    assert state.position['side'] == 'BUY' and state.stop_order_id is None
+    assert client.calls['trailing_stop_order'] == state.order_attempts
+
+
+def test_enter_position_gives_up_on_entry():
+    client = FlakyBinance(failures={'protected_market_order': 1, 'market_order': 100})
+    state = entered_state(client)
+    assert state.position == {'side': None, 'orderId': None}
+    assert client.calls['market_order'] == state.order_attempts
+    assert 'trailing_stop_order' not in client.calls
+
+@pytest.mark.parametrize('failures', [0, 1, 3])
+def test_reversal_cancels_previous_stop(failures):
+    client = FlakyBinance()
+    state = entered_state(client, side='BUY')
+    previous_stop_id = state.stop_order_id
+    client.failures['cancel_order'] = failures
+    asyncio.run(state.enter_position(side='SELL', stop_side='BUY'))
+    assert state.position['side'] == 'SELL' and state.stop_order_id not in (None, previous_stop_id)
+    assert state.previous_stop_id is None
+    assert client.calls['cancel_order'] == failures + 1
+
+
+def test_reversal_keeps_unconfirmed_stop():
+    client = FlakyBinance()
+    state = entered_state(client, side='BUY')
+    previous_stop_id = state.stop_order_id
+    client.failures['cancel_order'] = 100
+    asyncio.run(state.enter_position(side='SELL', stop_side='BUY'))
+    assert state.position['side'] == 'SELL' and state.stop_order_id
+    assert state.previous_stop_id == previous_stop_id
+
+
+def test_failed_reversal_keeps_previous_stop():
+    # Вход на разворот не подтвержден: стоп предыдущей позиции не отменяется
+    client = FlakyBinance()
+    state = entered_state(client, side='BUY')
+    position, previous_stop_id = dict(state.position), state.stop_order_id
+    client.failures.update(protected_market_order=1, market_order=100)
+    asyncio.run(state.enter_position(side='SELL', stop_side='BUY'))
+    assert state.position == position
+    assert state.stop_order_id == previous_stop_id and state.previous_stop_id is None
+    assert 'cancel_order' not in client.calls
+
+
+def test_rejected_entry_cancels_accepted_stop():
+    # Стоп принят в пакетном запросе без ордера входа: стоп отменяется
+    client = FlakyBinance(rejects={'market_order': 100})
+    client.protected_market_order = lambda **kwargs: ({'code': -2019, 'msg': 'Margin is insufficient.'},
+                                                      {'orderId': 77, 'status': 'NEW'})
+    state = entered_state(client)
+    assert state.position == {'side': None, 'orderId': None} and state.stop_order_id is None
+    assert client.calls['cancel_order'] == 1
+
+
+def test_enter_position_retries_non_json_response():
+    # Страница ошибки вместо JSON: ордера отправляются повторно, как при ошибке соединения
+    client = FlakyBinance(failures={'protected_market_order': 1})
+    stop_order = client.trailing_stop_order
+    responses = iter([json.JSONDecodeError('Expecting value', '<html>502 Bad Gateway</html>', 0)])
+
+    def trailing_stop_order(**kwargs):
+        error = next(responses, None)
+        if error:
+            raise error
+        return stop_order(**kwargs)
+
+    client.trailing_stop_order = trailing_stop_order
+    state = entered_state(client)
+    assert state.position['side'] == 'BUY' and state.stop_order_id
@@ -0,0 +1,55 @@
+import pytest
+
+from events import EVENT_FILL, EVENT_SIGNAL, EventJournal, read_journal
+from events.journal import JOURNAL_HEADER, RECORD
+
+
+def write(path, count: int, start: int = 0):
+    journal = EventJournal(path=str(path))
+    for index in range(start, start + count):
+        journal.append(EVENT_SIGNAL, b'ETHUSDT', side=1, order_id=index, price=3000.0 + index)
+    journal.close()
+
+
+def test_round_trip(tmp_path):
+    path = tmp_path / 'journal.bin'
+    journal = EventJournal(path=str(path))
+    journal.append(EVENT_SIGNAL, b'ETHUSDT', side=1, price=3000.5)
+    journal.append_order(EVENT_FILL, {'s': 'ETHUSDT', 'S': 'SELL', 'i': 42, 'L': '3001.25', 'l': '0.5', 'T': 1700,
+                                      'ot': 'TRAILING_STOP_MARKET', 'X': 'FILLED'}, reference=3000.5)
+    journal.close()
+    records = read_journal(str(path))
+    assert records.shape == (2,)
+    assert records['kind'].tolist() == [EVENT_SIGNAL, EVENT_FILL]
+    assert records['symbol'].tolist() == [b'ETHUSDT', b'ETHUSDT']
+    assert records['side'].tolist() == [1, -1]
+    fill = records[1]
+    assert (fill['order_id'], fill['price'], fill['quantity'], fill['reference'], fill['event_time']) == \
+        (42, 3001.25, 0.5, 3000.5, 1700)
+    assert (fill['order_type'], fill['status']) == (4, 3)
+
+
+def test_reopen_appends(tmp_path):
+    path = tmp_path / 'journal.bin'
+    write(path, count=3)
+    write(path, count=2, start=3)
+    assert read_journal(str(path))['order_id'].tolist() == [0, 1, 2, 3, 4]
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    path = tmp_path / 'journal.bin'
+    write(path, count=3)
+    # Незавершенная запись аварийной остановки
+    with open(path, 'ab') as file:
+        file.write(b'\x01' * (RECORD.size // 2))
+    write(path, count=1, start=3)
+    assert path.stat().st_size == JOURNAL_HEADER.size + 4 * RECORD.size
+    assert read_journal(str(path))['order_id'].tolist() == [0, 1, 2, 3]
+
+
+def test_foreign_file_is_rejected(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'NOTAJOURNAL' + b'\x00' * 64)
+    with pytest.raises(ValueError):
+        EventJournal(path=str(path))
+    assert path.read_bytes().startswith(b'NOTAJOURNAL')
@@ -0,0 +1,39 @@
+import json
+
+import numpy
+import pytest
+
+from market_data import KLINE_COLUMNS, check_interval, klines_from_json, klines_to_array, synthetic_klines
+
+
+def test_klines_from_json_matches_json_decode():
+    klines = synthetic_klines(50)
+    body = json.dumps(klines, separators=(',', ':')).encode('utf-8')
+    candles = klines_from_json(body)
+    assert candles.shape == (50, len(KLINE_COLUMNS))
+    numpy.testing.assert_array_equal(candles, klines_to_array(json.loads(body)))
+
+
+def test_klines_from_json_full_binance_rows():
+    # Ответ площадки: 12 полей, часть чисел строками, лишние поля отбрасываются
+    body = ('[[1499040000000,"0.01634790","0.80000000","0.01575800","0.01577100","148976.11427815",1499644799999,'
+            '"2434.19055334",308,"1756.87402397","28.46694368","0"],'
+            '[1499644800000,"0.01577100","0.01600000","0.01500000","0.01590000","100.5",1500249599999,'
+            '"10.0",20,"5.0","0.1","0"]]')
+    candles = klines_from_json(body)
+    assert candles.shape == (2, 7)
+    assert candles[0].tolist() == [1499040000000, 0.0163479, 0.8, 0.015758, 0.015771, 148976.11427815, 1499644799999]
+    assert candles[1, 4] == 0.0159
+
+
+@pytest.mark.parametrize('body', [b'[]', b' [ ] ', '[]'])
+def test_klines_from_json_empty(body):
+    assert klines_from_json(body).shape == (0, 7)
+
+
+def test_check_interval():
+    assert check_interval('5m') == '5m'
+    with pytest.raises(ValueError, match='1M'):
+        check_interval('1M')
+    with pytest.raises(ValueError):
+        check_interval('2m')
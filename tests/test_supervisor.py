@@ -0,0 +1,29 @@
+from runners.supervisor import shard_symbols
+
+
+def symbols(*tickers) -> list[dict]:
+    return [{'ticker': ticker, 'interval': '1m'} for ticker in tickers]
+
+
+def test_shard_symbols_keeps_ticker_together():
+    shards = shard_symbols(symbols('ETHUSDT', 'btcusdt', 'ethusdt', 'BNBUSDT', 'BTCUSDT', 'ETHUSDT'), shards=2)
+    assert len(shards) == 2
+    for shard in shards:
+        tickers = {parameters['ticker'].upper() for parameters in shard}
+        assert all(not tickers & {other['ticker'].upper() for other in rest}
+                   for rest in shards if rest is not shard)
+    assert sorted(len(shard) for shard in shards) == [3, 3]
+
+
+def test_shard_symbols_independent_of_order():
+    pairs = symbols('ETHUSDT', 'BTCUSDT', 'BNBUSDT', 'ETHUSDT', 'XRPUSDT')
+    shards = shard_symbols(pairs, shards=3)
+    reversed_shards = shard_symbols(pairs[::-1], shards=3)
+    assert [sorted(parameters['ticker'] for parameters in shard) for shard in shards] == \
+        [sorted(parameters['ticker'] for parameters in shard) for shard in reversed_shards]
+
+
+def test_shard_symbols_limits_shards_to_tickers():
+    assert len(shard_symbols(symbols('ETHUSDT', 'ETHUSDT', 'BTCUSDT'), shards=8)) == 2
+    assert shard_symbols(symbols('ETHUSDT'), shards=0) == [symbols('ETHUSDT')]
+    assert shard_symbols([], shards=4) == []